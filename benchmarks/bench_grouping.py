@@ -0,0 +1,87 @@
+"""
+Benchmark of the article grouping engine against the previous pairwise implementation.
+
+Generates synthetic articles with random dates and locations and compares the runtime of
+`grouping.group_articles` by date alone with the original O(n²) grouping, checking that both produce
+the same groups on date-sorted input. The runtime of grouping by date and location is reported as well.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_grouping --sizes 1000 2000 4000 8000 --legacy-max 8000
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+import grouping
+
+
+def legacy_group_articles(articles, window_days=grouping.DATE_WINDOW_DAYS):
+    """
+    The original grouping: compares every article with every later one.
+    """
+    groups = []
+    used = set()
+    for i, article1 in enumerate(articles):
+        if i in used:
+            continue
+        current_group = [article1[0]]
+        for j, article2 in enumerate(articles[i + 1 :], start=i + 1):
+            if j in used:
+                continue
+            if abs((article2[1] - article1[1]).days) <= window_days:
+                current_group.append(article2[0])
+                used.add(j)
+        groups.append(current_group)
+        used.add(i)
+    return groups
+
+
+def synthetic_articles(n, seed=42, span_days=3650):
+    """
+    Generate `n` article tuples with dates spread over `span_days` days and locations around the Mediterranean.
+    """
+    rng = random.Random(seed)
+    start = date(2014, 1, 1)
+    return [
+        (
+            article_id,
+            start + timedelta(days=rng.randrange(span_days)),
+            None, None, None, None,
+            rng.uniform(30.0, 45.0),
+            rng.uniform(-10.0, 36.0),
+        )
+        for article_id in range(1, n + 1)
+    ]
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 4000, 8000, 100000])
+    parser.add_argument("--legacy-max", type=int, default=8000, help="largest size to run the O(n²) grouping on")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'articles':>10} {'groups':>8} {'sweep (s)':>10} {'pairwise (s)':>13} {'speedup':>8} {'geo sweep (s)':>14}")
+    for n in args.sizes:
+        articles = synthetic_articles(n, args.seed)
+        groups, sweep_seconds = timed(grouping.group_articles, articles, grouping.DATE_WINDOW_DAYS, None)
+        _, geo_seconds = timed(grouping.group_articles, articles)
+        if n <= args.legacy_max:
+            in_date_order = sorted(articles, key=lambda a: (a[1], a[0]))
+            legacy_groups, legacy_seconds = timed(legacy_group_articles, in_date_order)
+            assert legacy_groups == groups, "sweep and pairwise grouping disagree"
+            legacy = f"{legacy_seconds:13.4f} {legacy_seconds / sweep_seconds:7.0f}x"
+        else:
+            legacy = f"{'-':>13} {'-':>8}"
+        print(f"{n:>10} {len(groups):>8} {sweep_seconds:10.4f} {legacy} {geo_seconds:14.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark of article ingestion: `insert_article` per row against `insert_articles_bulk`.
+
+Inserts synthetic articles into the database configured by the PG* environment variables and reports
+articles per second for `insert_article`, for `insert_articles_bulk` with and without the detection of
+duplicates, and for `fingerprint_articles`, which fingerprints the articles bulk loaded without it. Run it
+against a throwaway database only; the inserted articles are deleted again at the end.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_ingestion --single 200 --bulk 100000
+"""
+import argparse
+import contextlib
+import io
+import random
+import time
+from datetime import date, timedelta
+
+import psycopg2
+
+import db_operations
+
+
+WORDS = ["boat", "migrants", "coast", "guard", "rescue", "sea", "missing", "survivors", "night", "route"]
+
+
+def text_pool(rng, words, size=64):
+    """
+    Pre-generate texts, so that generating articles does not dominate the measured time.
+    """
+    return [" ".join(rng.choice(WORDS) for _ in range(words)) for _ in range(size)]
+
+
+def synthetic_article(rng, pools):
+    titles, summaries, paragraphs = pools
+    words = WORDS
+    return {
+        "title": rng.choice(titles).capitalize(),
+        "summary": rng.choice(summaries),
+        "website": f"https://news.example.org/{rng.getrandbits(64):x}",
+        # Contents are combined from paragraphs, so that articles are distinct, as the duplicate detection
+        # would otherwise record most of them as duplicates
+        "content": " ".join(rng.choice(paragraphs) for _ in range(5)),
+        "keywords": rng.sample(words, 3),
+        "date": date(2014, 1, 1) + timedelta(days=rng.randrange(3650)),
+        "number_dead": rng.randrange(50),
+        "number_missing": rng.randrange(50),
+        "number_survivors": rng.randrange(200),
+        "country_of_origin": "Libya",
+        "region_of_origin": "North Africa",
+        "cause_of_death": "Drowning",
+        "region_of_incident": "Mediterranean",
+        "country_of_incident": "Italy",
+        "location_of_incident": "Mediterranean Sea",
+        "latitude": round(rng.uniform(30.0, 45.0), 6),
+        "longitude": round(rng.uniform(-10.0, 36.0), 6),
+    }
+
+
+def max_article_id():
+    conn = psycopg2.connect(**db_operations.params)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COALESCE(MAX(article_id), 0) FROM articles")
+        return cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def delete_articles_after(article_id):
+    conn = psycopg2.connect(**db_operations.params)
+    try:
+        cursor = conn.cursor()
+        # The duplicates recorded for the articles are deleted with them
+        cursor.execute("DELETE FROM articles WHERE article_id > %s", (article_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--single", type=int, default=200, help="articles to insert one by one")
+    parser.add_argument("--bulk", type=int, default=100000, help="articles to insert in bulk")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    pools = (text_pool(rng, 8), text_pool(rng, 40), text_pool(rng, 80, size=256))
+    start_id = max_article_id()
+    try:
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(args.single):
+                db_operations.insert_article(synthetic_article(rng, pools))
+        single_rate = args.single / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            db_operations.insert_articles_bulk(synthetic_article(rng, pools) for _ in range(args.bulk))
+        bulk_rate = args.bulk / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        fingerprinted = db_operations.fingerprint_articles()
+        fingerprint_rate = fingerprinted / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            db_operations.insert_articles_bulk((synthetic_article(rng, pools) for _ in range(args.bulk)),
+                                               deduplicate=True)
+        dedup_rate = args.bulk / (time.perf_counter() - started)
+    finally:
+        delete_articles_after(start_id)
+
+    print(f"insert_article:                         {single_rate:10.0f} articles/s")
+    print(f"insert_articles_bulk:                   {bulk_rate:10.0f} articles/s ({bulk_rate / single_rate:.0f}x)")
+    print(f"fingerprint_articles:                   {fingerprint_rate:10.0f} articles/s")
+    print(f"insert_articles_bulk(deduplicate=True): {dedup_rate:10.0f} articles/s ({dedup_rate / single_rate:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark of response serialization: FastAPI's `jsonable_encoder` + `JSONResponse` against `main.encode_json`.
+
+Fetches pages of articles and incidents from the database configured by the PG* environment variables,
+as the list endpoints do, and reports rows per second and megabytes per second for both paths. Only the
+encoding is measured, not the query.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_serialization --rows 1000 --repeat 20
+"""
+import argparse
+import asyncio
+import time
+
+import asyncpg
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import main as api
+
+
+def fastapi_path(key, rows):
+    """
+    The previous path: records turned into dicts, walked by `jsonable_encoder`, then encoded by `json.dumps`.
+    """
+    return JSONResponse(jsonable_encoder({key: [dict(row) for row in rows], "next": None})).body
+
+
+def orjson_path(key, rows):
+    return api.encode_json({key: rows, "next": None})
+
+
+def measure(encode, key, rows, repeat):
+    body = encode(key, rows)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        encode(key, rows)
+    elapsed = time.perf_counter() - start
+    return len(rows) * repeat / elapsed, len(body) * repeat / elapsed / 1e6
+
+
+async def fetch(table, columns, key, limit):
+    connection = await asyncpg.connect()
+    try:
+        await api.init_connection(connection)
+        return await connection.fetch(f"SELECT {', '.join(columns)} FROM {table} ORDER BY {key} LIMIT $1", limit)
+    finally:
+        await connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=api.MAX_PAGE_SIZE, help="rows per response")
+    parser.add_argument("--repeat", type=int, default=20, help="encodings per measurement")
+    args = parser.parse_args()
+
+    for table, columns, key in (("articles", api.ARTICLES_COLUMNS, "article_id"),
+                                ("incidents", api.INCIDENTS_COLUMNS, "incident_id")):
+        rows = asyncio.run(fetch(table, columns, key, args.rows))
+        if not rows:
+            print(f"{table}: no rows, skipped")
+            continue
+        assert api.encode_json({table: rows}) == api.encode_json({table: [dict(row) for row in rows]})
+        baseline, baseline_mb = measure(fastapi_path, table, rows, args.repeat)
+        fast, fast_mb = measure(orjson_path, table, rows, args.repeat)
+        print(f"{table} ({len(rows)} rows per response)")
+        print(f"  jsonable_encoder + json: {baseline:12,.0f} rows/s {baseline_mb:8.1f} MB/s")
+        print(f"  orjson from records:     {fast:12,.0f} rows/s {fast_mb:8.1f} MB/s  ({fast / baseline:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
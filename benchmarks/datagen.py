@@ -0,0 +1,213 @@
+"""
+Seeded generator of realistic articles, incidents and mappings for benchmarks.
+
+The generator draws incidents around the hotspots of the main migration routes, with skewed casualty
+numbers, and reports each incident in one or more articles whose dates, locations and numbers deviate
+slightly from the incident, as news reports do. The same seed always produces the same data, so runs
+are comparable between commits.
+
+`load` replaces the contents of the database configured by the PG* environment variables with the
+generated data. Run it against a throwaway database only, e.g. the one of benchmarks/docker-compose.yml.
+
+Usage (from the repository root):
+    python -m benchmarks.datagen --articles 100000 --seed 42
+"""
+import argparse
+import contextlib
+import io
+import random
+import time
+from datetime import date, timedelta
+
+import db_operations
+from db_operations import INCIDENT_INSERT_COLUMNS, CopyReader
+
+
+VOCABULARY = ["boat", "migrants", "coast", "guard", "rescue", "sea", "missing", "survivors", "night", "route",
+    "shipwreck", "capsized", "dinghy", "smugglers", "border", "desert", "truck", "train", "river", "crossing",
+    "hypothermia", "dehydration", "drowned", "bodies", "recovered", "asylum", "refugees", "navy", "ngo",
+    "vessel", "search", "operation", "authorities", "investigation", "island", "harbour", "weather", "storm",
+]
+
+# Hotspots of incidents: region, country, location, latitude, longitude, spread in degrees, weight
+HOTSPOTS = [
+    ("Mediterranean", "Italy", "Central Mediterranean", 35.5, 14.0, 2.5, 30),
+    ("Mediterranean", "Greece", "Aegean Sea", 37.8, 26.0, 1.2, 12),
+    ("Mediterranean", "Spain", "Alboran Sea", 36.0, -3.5, 1.0, 8),
+    ("Northern Africa", "Libya", "Sahara Desert", 26.0, 14.0, 4.0, 10),
+    ("Western Africa", "Spain", "Atlantic route to the Canary Islands", 27.5, -16.0, 2.0, 10),
+    ("Europe", "France", "English Channel", 50.9, 1.6, 0.4, 5),
+    ("Americas", "United States", "US-Mexico border", 31.5, -108.0, 4.0, 15),
+    ("Americas", "Panama", "Darien Gap", 8.3, -77.6, 0.6, 5),
+    ("South-eastern Asia", "Malaysia", "Andaman Sea", 8.0, 96.0, 2.5, 3),
+    ("Western Asia", "Yemen", "Gulf of Aden", 12.5, 46.0, 1.5, 2),
+]
+CAUSES = [("Drowning", 50), ("Harsh environmental conditions", 15), ("Vehicle accident", 10),
+          ("Violence", 8), ("Sickness", 7), ("Mixed or unknown", 10)]
+ORIGINS = [("Northern Africa", "Libya"), ("Western Africa", "Guinea"), ("Eastern Africa", "Eritrea"),
+           ("Southern Asia", "Afghanistan"), ("Western Asia", "Syria"), ("Central America", "Honduras"),
+           ("South America", "Venezuela"), ("Northern Africa", "Morocco")]
+FIRST_DATE = date(2014, 1, 1)
+SPAN_DAYS = 3650
+
+
+def casualties(rng, mean):
+    """
+    A heavy-tailed number of people: most incidents are small, a few are very large.
+    """
+    return int((rng.paretovariate(1.6) - 1) * mean)
+
+
+def generate_incident(rng):
+    region, country, location, latitude, longitude, spread, _ = rng.choices(
+        HOTSPOTS, weights=[hotspot[-1] for hotspot in HOTSPOTS])[0]
+    origin_region, origin_country = rng.choice(ORIGINS)
+    incident = {
+        "verified": rng.random() < 0.9,
+        "date": FIRST_DATE + timedelta(days=rng.randrange(SPAN_DAYS)),
+        "number_dead": casualties(rng, 6),
+        "number_missing": casualties(rng, 4),
+        "number_survivors": casualties(rng, 20),
+        "country_of_origin": origin_country,
+        "region_of_origin": origin_region,
+        "cause_of_death": rng.choices([cause for cause, _ in CAUSES], weights=[weight for _, weight in CAUSES])[0],
+        "region_of_incident": region,
+        "country_of_incident": country,
+        "location_of_incident": location,
+        "latitude": round(max(min(rng.gauss(latitude, spread), 89.0), -89.0), 6),
+        "longitude": round(max(min(rng.gauss(longitude, spread), 179.0), -179.0), 6),
+    }
+    incident["title"] = f"{incident['number_dead']} dead, {incident['number_missing']} missing: {location}"
+    return incident
+
+
+def report(rng, incident, pools):
+    """
+    An article about an incident, with the deviations of a news report.
+    """
+    titles, summaries, contents = pools
+    article = dict(incident)
+    del article["verified"]
+    article["title"] = f"{rng.choice(titles).capitalize()} near {incident['location_of_incident']}"
+    article["summary"] = rng.choice(summaries)
+    article["content"] = rng.choice(contents)
+    article["website"] = f"https://news.example.org/{rng.getrandbits(64):x}"
+    article["keywords"] = rng.sample(VOCABULARY, 4)
+    article["date"] = incident["date"] + timedelta(days=rng.choice([0, 0, 0, 1, 1, 2]))
+    # Reports place the incident within a few kilometres and round the numbers
+    article["latitude"] = round(incident["latitude"] + rng.gauss(0, 0.05), 6)
+    article["longitude"] = round(incident["longitude"] + rng.gauss(0, 0.05), 6)
+    for column in ("number_dead", "number_missing", "number_survivors"):
+        if rng.random() < 0.3:
+            article[column] = max(article[column] + rng.randint(-2, 2), 0)
+    if rng.random() < 0.02:
+        article["latitude"] = article["longitude"] = None
+    return article
+
+
+def generate(articles, seed=42):
+    """
+    Generate incidents, the articles reporting them and the mapping between both.
+
+    Args:
+        articles (int): The number of articles to generate.
+        seed (int): The seed of the random generator.
+
+    Returns:
+        tuple: The list of incidents, a generator of the articles in article ID order, and a generator
+               of (incident_id, article_id) pairs. IDs are numbered from 1 in generation order.
+    """
+    rng = random.Random(seed)
+    # Texts are drawn from pools, so that generating articles does not dominate the load time
+    pools = ([" ".join(rng.choice(VOCABULARY) for _ in range(6)) for _ in range(256)],
+             [" ".join(rng.choice(VOCABULARY) for _ in range(40)) for _ in range(256)],
+             [" ".join(rng.choice(VOCABULARY) for _ in range(400)) for _ in range(256)])
+    incidents = []
+    reports = []
+    remaining = articles
+    while remaining > 0:
+        # Most incidents are reported once or twice, a few by many outlets
+        count = min(1 + int(rng.expovariate(1 / 1.5)), remaining)
+        incidents.append(generate_incident(rng))
+        reports.append(count)
+        remaining -= count
+    incidents.sort(key=lambda incident: incident["date"])
+
+    def article_rows():
+        article_rng = random.Random(seed + 1)
+        for incident, count in zip(incidents, reports):
+            for _ in range(count):
+                yield report(article_rng, incident, pools)
+
+    def mapping_rows():
+        article_id = 0
+        for incident_id, count in enumerate(reports, start=1):
+            for _ in range(count):
+                article_id += 1
+                yield {"incident_id": incident_id, "article_id": article_id}
+
+    return incidents, article_rows(), mapping_rows()
+
+
+def load(articles, seed=42):
+    """
+    Replace the articles, incidents and mapping of the database with generated data.
+
+    The articles are inserted with `db_operations.insert_articles_bulk`, the incidents and the mapping
+    with COPY, and the queue of `process_articles` is emptied as if it had processed all articles.
+    The contents are drawn from a small pool, so duplicate detection is off: every article is inserted.
+
+    Args:
+        articles (int): The number of articles to generate.
+        seed (int): The seed of the random generator.
+
+    Returns:
+        dict: The number of generated rows per table and the time taken in seconds.
+    """
+    started = time.perf_counter()
+    incidents, article_rows, mapping_rows = generate(articles, seed)
+    with db_operations.connection() as conn, conn.cursor() as cursor:
+        cursor.execute("TRUNCATE mapping, incidents, unprocessed_articles, article_duplicates, articles RESTART IDENTITY")
+        conn.commit()
+    with contextlib.redirect_stdout(io.StringIO()):
+        article_ids = db_operations.insert_articles_bulk(article_rows)
+        db_operations.fingerprint_articles()
+    incident_columns = ["incident_id", *INCIDENT_INSERT_COLUMNS]
+    with db_operations.connection() as conn, conn.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY incidents ({', '.join(incident_columns)}) FROM STDIN",
+            CopyReader(({"incident_id": incident_id, **incident} for incident_id, incident in enumerate(incidents, start=1)),
+                       incident_columns),
+            size=db_operations.COPY_BUFFER_SIZE,
+        )
+        cursor.execute("SELECT setval(pg_get_serial_sequence('incidents', 'incident_id'), %s)", (max(len(incidents), 1),))
+        cursor.copy_expert(
+            "COPY mapping (incident_id, article_id) FROM STDIN",
+            CopyReader(mapping_rows, ["incident_id", "article_id"]),
+            size=db_operations.COPY_BUFFER_SIZE,
+        )
+        cursor.execute("TRUNCATE unprocessed_articles")
+        db_operations.notify_change(cursor, "incidents")
+        conn.commit()
+        cursor.execute("ANALYZE articles")
+        cursor.execute("ANALYZE incidents")
+        cursor.execute("ANALYZE mapping")
+        conn.commit()
+    return {
+        "articles": len(article_ids),
+        "incidents": len(incidents),
+        "mapping": len(article_ids),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=100000, help="articles to generate, 1k to 1M")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    print(load(args.articles, args.seed))
+
+
+if __name__ == "__main__":
+    main()
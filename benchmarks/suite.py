@@ -0,0 +1,391 @@
+"""
+Load and regression benchmark suite of the backend.
+
+One run:
+1. loads seeded synthetic articles, incidents and mappings (see `benchmarks.datagen`),
+2. times `group_articles` over all articles, a full `process_articles` run, a build of the snapshots
+   and an incremental reprocessing job run through the API,
+3. starts the API with uvicorn and sends concurrent requests to every endpoint of main.py,
+   measuring p50/p90/p99 latency and throughput,
+4. writes the results as JSON, so that runs of different commits can be compared with `--compare`.
+
+The database is wiped, so the suite refuses to run against a database whose name does not start with
+'bench' unless `--force` is given. Start a throwaway one with benchmarks/docker-compose.yml.
+Loading is dominated by the full-text indexing of the articles: about 1 ms per article.
+
+Usage (from the repository root):
+    docker compose -f benchmarks/docker-compose.yml up -d
+    export PGHOST=localhost PGPORT=55432 PGUSER=postgres PGPASSWORD=postgres PGDATABASE=bench
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.suite --articles 100000 --concurrency 16 --requests 500 --output results.json
+    python -m benchmarks.suite --compare baseline.json results.json
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+import db_operations
+import main as api
+import migrations
+import snapshots
+from benchmarks import datagen
+
+
+# Requests of the endpoints streaming whole tables, which take far longer than the others
+EXPORT_REQUESTS = 5
+SERVER_START_TIMEOUT = 30
+JOB_TIMEOUT = 3600
+# Routes exercised once per run instead of under load, see `run_reprocess_job`
+SINGLE_REQUEST_ROUTES = {"/jobs/reprocess"}
+
+
+def page_cursor(rng, last_id):
+    return api.encode_cursor(rng.randrange(last_id)) if last_id else None
+
+
+def bbox(rng, zoom):
+    """
+    A viewport around one of the hotspots of the generated incidents.
+    """
+    _, _, _, latitude, longitude, _, _ = rng.choice(datagen.HOTSPOTS)
+    half = 180.0 / 2 ** zoom
+    return {"west": max(longitude - half, -180), "east": min(longitude + half, 180),
+            "south": max(latitude - half / 2, -90), "north": min(latitude + half / 2, 90), "zoom": zoom}
+
+
+# Name, route, request builder and whether the endpoint writes. Builders take a random generator and the
+# number of articles and incidents, and return the method, URL, query parameters and JSON body of a request.
+ENDPOINTS = [
+    ("root", "/", lambda rng, ctx: ("GET", "/", None, None), False),
+    ("cache_stats", "/cache/stats", lambda rng, ctx: ("GET", "/cache/stats", None, None), False),
+    ("metrics", "/metrics", lambda rng, ctx: ("GET", "/metrics", None, None), False),
+    ("healthz", "/healthz", lambda rng, ctx: ("GET", "/healthz", None, None), False),
+    ("readyz", "/readyz", lambda rng, ctx: ("GET", "/readyz", None, None), False),
+    ("snapshots", "/snapshots", lambda rng, ctx: ("GET", "/snapshots", None, None), False),
+    ("job_status", "/jobs/{job_id}", lambda rng, ctx: ("GET", f"/jobs/{ctx['job_id']}", None, None), False),
+    ("snapshot_redirect", "/snapshots/{file_name}", lambda rng, ctx: (
+        "GET", f"/snapshots/{rng.choice(list(ctx['snapshots']))}.json", None, None), False),
+    ("snapshot_file", "/snapshots/{file_name}", lambda rng, ctx: (
+        "GET", "/snapshots/{}.{}.json".format(*rng.choice(list(ctx["snapshots"].items()))), None, None), False),
+    ("articles_page", "/articles", lambda rng, ctx: (
+        "GET", "/articles", {"cursor": page_cursor(rng, ctx["articles"])} if ctx["articles"] else None, None), False),
+    ("articles_filtered", "/articles", lambda rng, ctx: (
+        "GET", "/articles", {"country": rng.choice(datagen.HOTSPOTS)[1], "relevant": "true",
+                             "date_from": str(datagen.FIRST_DATE + datetime.timedelta(days=rng.randrange(datagen.SPAN_DAYS))),
+                             "fields": "title,date,country_of_incident"}, None), False),
+    ("articles_search", "/articles/search", lambda rng, ctx: (
+        "GET", "/articles/search", {"q": " ".join(rng.sample(datagen.VOCABULARY, 2)), "limit": 20}, None), False),
+    ("article_by_id", "/articles/{article_id}", lambda rng, ctx: (
+        "GET", f"/articles/{rng.randint(1, ctx['articles'])}", None, None), False),
+    ("incidents_page", "/incidents", lambda rng, ctx: (
+        "GET", "/incidents", {"cursor": page_cursor(rng, ctx["incidents"])} if ctx["incidents"] else None, None), False),
+    ("incidents_filtered", "/incidents", lambda rng, ctx: (
+        "GET", "/incidents", {"cause_of_death": rng.choice(datagen.CAUSES)[0], "verified": "true",
+                              "fields": "title,date,latitude,longitude"}, None), False),
+    ("incidents_by_ids", "/incidents", lambda rng, ctx: (
+        "GET", "/incidents", {"ids": ",".join(str(rng.randint(1, ctx["incidents"])) for _ in range(50))}, None), False),
+    ("incidents_bbox_clusters", "/incidents/bbox", lambda rng, ctx: (
+        "GET", "/incidents/bbox", bbox(rng, rng.randint(2, api.CLUSTER_MAX_ZOOM)), None), False),
+    ("incidents_bbox_points", "/incidents/bbox", lambda rng, ctx: (
+        "GET", "/incidents/bbox", bbox(rng, api.CLUSTER_MAX_ZOOM + 2), None), False),
+    ("incident_by_id", "/incidents/{incident_id}", lambda rng, ctx: (
+        "GET", f"/incidents/{rng.randint(1, ctx['incidents'])}", None, None), False),
+    ("stats", "/stats", lambda rng, ctx: (
+        "GET", "/stats", {"include_unverified": rng.choice(["true", "false"])}, None), False),
+    ("export_articles", "/export/articles", lambda rng, ctx: (
+        "GET", "/export/articles", {"format": "ndjson", "fields": "title,date,website"}, None), False),
+    ("export_incidents", "/export/incidents", lambda rng, ctx: (
+        "GET", "/export/incidents", {"format": rng.choice(["ndjson", "csv"])}, None), False),
+    ("article_relevant", "/articles/{article_id}/relevant", lambda rng, ctx: (
+        "GET", f"/articles/{rng.randint(1, ctx['articles'])}/relevant", None, None), True),
+    ("article_irrelevant", "/articles/{article_id}/irrelevant", lambda rng, ctx: (
+        "GET", f"/articles/{rng.randint(1, ctx['articles'])}/irrelevant", None, None), True),
+    ("articles_relevance", "/articles/relevance", lambda rng, ctx: (
+        "POST", "/articles/relevance", None,
+        {"ids": [rng.randint(1, ctx["articles"]) for _ in range(100)], "relevant": rng.random() < 0.5}), True),
+    ("incident_verified", "/incidents/{incident_id}/verified", lambda rng, ctx: (
+        "GET", f"/incidents/{rng.randint(1, ctx['incidents'])}/verified", None, None), True),
+    ("incident_unverified", "/incidents/{incident_id}/unverified", lambda rng, ctx: (
+        "GET", f"/incidents/{rng.randint(1, ctx['incidents'])}/unverified", None, None), True),
+    ("incidents_verification", "/incidents/verification", lambda rng, ctx: (
+        "POST", "/incidents/verification", None,
+        {"ids": [rng.randint(1, ctx["incidents"]) for _ in range(100)], "verified": rng.random() < 0.5}), True),
+]
+
+
+def uncovered_routes():
+    """
+    Returns:
+        list: The routes of main.py that no entry of `ENDPOINTS` exercises.
+    """
+    covered = {route for _, route, _, _ in ENDPOINTS} | SINGLE_REQUEST_ROUTES
+    return sorted(route.path for route in api.app.routes
+                  if getattr(route, "include_in_schema", False) and route.path not in covered)
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+async def load_endpoint(client, build, ctx, requests, concurrency, seed):
+    """
+    Send `requests` requests built by `build` with `concurrency` requests in flight.
+
+    Returns:
+        dict: The latency percentiles in milliseconds, the throughput in requests per second and the
+              number of failed requests (HTTP errors and bodies reporting an error).
+    """
+    rng = random.Random(seed)
+    calls = [build(rng, ctx) for _ in range(requests)]
+    latencies = []
+    errors = 0
+    counter = itertools.count()
+
+    async def worker():
+        nonlocal errors
+        for index in counter:
+            if index >= len(calls):
+                return
+            method, url, query, body = calls[index]
+            started = time.perf_counter()
+            response = await client.request(method, url, params=query, json=body)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400 or response.content.startswith(b'{"error"'):
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p90_ms": round(percentile(latencies, 0.90) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+    }
+
+
+async def load_endpoints(base_url, ctx, args):
+    results = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=300) as client:
+        # Reads first, so that the writes do not interfere with them
+        for name, _, build, writes in sorted(ENDPOINTS, key=lambda endpoint: endpoint[3]):
+            if args.only and name not in args.only:
+                continue
+            exports = name.startswith("export_")
+            requests = EXPORT_REQUESTS if exports else args.requests
+            concurrency = min(args.concurrency, requests)
+            await load_endpoint(client, build, ctx, min(args.warmup, requests), concurrency, args.seed - 1)
+            results[name] = await load_endpoint(client, build, ctx, requests, concurrency, args.seed)
+            result = results[name]
+            print(f"{name:<26} {result['throughput_rps']:>9.1f} req/s  p50 {result['p50_ms']:>9.2f} ms  "
+                  f"p99 {result['p99_ms']:>9.2f} ms  errors {result['errors']}")
+    return results
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def api_server(no_cache, snapshot_dir):
+    """
+    Run main.py with uvicorn in a subprocess until the block exits, serving the snapshots of `snapshot_dir`.
+
+    Yields:
+        str: The base URL of the server.
+    """
+    port = free_port()
+    env = dict(os.environ, SNAPSHOT_DIR=snapshot_dir)
+    if no_cache:
+        env["CACHE_MAX_ENTRIES"] = "0"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=root, env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while True:
+            try:
+                httpx.get(base_url + "/", timeout=1).raise_for_status()
+                break
+            except httpx.HTTPError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("The API server did not start")
+                time.sleep(0.2)
+        yield base_url
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def run_reprocess_job(base_url):
+    """
+    Run an incremental reprocessing job through the API and wait for it to finish.
+
+    Returns:
+        tuple: The ID of the job and the seconds from the request to its completion.
+    """
+    started = time.perf_counter()
+    response = httpx.post(base_url + "/jobs/reprocess", json={"full": False}, timeout=30)
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+    deadline = time.monotonic() + JOB_TIMEOUT
+    while True:
+        job = httpx.get(f"{base_url}/jobs/{job_id}", timeout=30).json()
+        if job["status"] == "failed":
+            raise RuntimeError(f"Reprocessing job failed: {job['error']}")
+        if job["status"] == "succeeded":
+            return job_id, time.perf_counter() - started
+        if time.monotonic() > deadline:
+            raise RuntimeError("Reprocessing job did not finish")
+        time.sleep(0.2)
+
+
+def time_processing():
+    """
+    Time the grouping engine alone and a full `process_articles` run.
+
+    Returns:
+        dict: The runtimes in seconds and the number of incidents created.
+    """
+    articles = db_operations.get_articles()
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        db_operations.group_articles(articles)
+        group_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        db_operations.process_articles(full=True)
+        process_seconds = time.perf_counter() - started
+    return {
+        "articles": len(articles),
+        "group_articles_s": round(group_seconds, 3),
+        "process_articles_full_s": round(process_seconds, 3),
+    }
+
+
+def row_counts():
+    with db_operations.connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT (SELECT count(*) FROM articles), (SELECT count(*) FROM incidents), version()")
+        articles, incidents, version = cursor.fetchone()
+    return {"articles": articles, "incidents": incidents, "postgres": version}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    database = db_operations.params.get("dbname") or ""
+    if not database.startswith("bench") and not args.force:
+        sys.exit(f"Refusing to wipe database {database!r}; use a database named bench* or pass --force")
+    uncovered = uncovered_routes()
+    if uncovered:
+        print(f"Routes without a benchmark: {', '.join(uncovered)}")
+    with contextlib.redirect_stdout(io.StringIO()):
+        migrations.migrate()
+    results = {"meta": {
+        "commit": git_commit(),
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "args": vars(args),
+    }}
+    if not args.skip_load:
+        results["load"] = datagen.load(args.articles, args.seed)
+        print(f"Loaded {results['load']}")
+    if not args.skip_processing:
+        results["processing"] = time_processing()
+        print(f"Processing {results['processing']}")
+    ctx = row_counts()
+    results["meta"]["database"] = ctx
+    with tempfile.TemporaryDirectory(prefix="bench-snapshots-") as snapshot_dir:
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            snapshots.build(snapshot_dir, force=True)
+        results.setdefault("processing", {})["snapshots_build_s"] = round(time.perf_counter() - started, 3)
+        print(f"Built snapshots in {results['processing']['snapshots_build_s']} s")
+        ctx["snapshots"] = {name: snapshot["hash"] for name, snapshot in snapshots.read_manifest(snapshot_dir).items()}
+        with api_server(args.no_cache, snapshot_dir) as base_url:
+            ctx["job_id"], job_seconds = run_reprocess_job(base_url)
+            results["processing"]["reprocess_job_s"] = round(job_seconds, 3)
+            results["endpoints"] = asyncio.run(load_endpoints(base_url, ctx, args))
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+    print(f"Results written to {args.output}")
+
+
+def compare(baseline_path, current_path, threshold):
+    """
+    Print the change of every metric between two result files.
+
+    Returns:
+        int: The number of regressions larger than `threshold` (a fraction).
+    """
+    with open(baseline_path) as baseline_file, open(current_path) as current_file:
+        baseline, current = json.load(baseline_file), json.load(current_file)
+    rows = [(f"processing.{key}", value, current.get("processing", {}).get(key), False)
+            for key, value in baseline.get("processing", {}).items() if key.endswith("_s")]
+    for name, metrics in baseline.get("endpoints", {}).items():
+        for key, higher_is_better in (("p50_ms", False), ("p99_ms", False), ("throughput_rps", True)):
+            rows.append((f"{name}.{key}", metrics[key], current.get("endpoints", {}).get(name, {}).get(key), higher_is_better))
+    regressions = 0
+    for name, before, after, higher_is_better in rows:
+        if after is None or not before:
+            print(f"{name:<44} {before:>12} {'missing':>12}")
+            continue
+        change = (after - before) / before
+        regressed = change < -threshold if higher_is_better else change > threshold
+        regressions += regressed
+        print(f"{name:<44} {before:>12} {after:>12} {change:>+8.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=100000, help="articles to generate, 1k to 1M")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight")
+    parser.add_argument("--only", nargs="+", help="names of the endpoints to benchmark")
+    parser.add_argument("--no-cache", action="store_true", help="disable the response cache of the API")
+    parser.add_argument("--skip-load", action="store_true", help="keep the data of the previous run")
+    parser.add_argument("--skip-processing", action="store_true", help="do not time process_articles")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--force", action="store_true", help="run against a database not named bench*")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative change reported as regression")
+    args = parser.parse_args()
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,16 @@
+import asyncio
 import asyncpg
 import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+from itertools import islice
 import psycopg2
-from psycopg2.extras import DictCursor
+from psycopg2.pool import ThreadedConnectionPool
+
+import dedup
+import grouping
 
 """
 This file contains functions to interact with the PostgreSQL database for debugging and administration.
@@ -15,9 +24,814 @@ params = {
     "dbname": os.environ.get("PGDATABASE"),
 }
 
+# Size of the shared connection pools
+POOL_MIN_SIZE = int(os.environ.get("PGPOOL_MIN_SIZE", 1))
+POOL_MAX_SIZE = int(os.environ.get("PGPOOL_MAX_SIZE", 10))
+
+
+# Column definitions of the tables, in table order.
+# These are the single source of truth for the schema and for the columns the API may select.
+ARTICLES_COLUMNS = {
+    "article_id": "SERIAL PRIMARY KEY",
+    "title": "VARCHAR(255)",
+    "summary": "TEXT",
+    "website": "VARCHAR(2048)",  # URL of the website
+    "content": "TEXT",  # Content of the website URL
+    "keywords": "TEXT[]",  # List of keywords, using PostgreSQL array type
+    "date": "DATE",
+    "number_dead": "INTEGER",
+    "number_missing": "INTEGER",
+    "number_survivors": "INTEGER",
+    "country_of_origin": "VARCHAR(255)",
+    "region_of_origin": "VARCHAR(255)",
+    "cause_of_death": "TEXT",
+    "region_of_incident": "VARCHAR(255)",
+    "country_of_incident": "VARCHAR(255)",
+    "location_of_incident": "TEXT",
+    "latitude": "DECIMAL(9,6)",
+    "longitude": "DECIMAL(9,6)",
+    "relevant": "BOOLEAN DEFAULT TRUE",
+}
+
+INCIDENTS_COLUMNS = {
+    "incident_id": "SERIAL PRIMARY KEY",
+    "title": "VARCHAR(255)",
+    "verified": "BOOLEAN",
+    "date": "DATE",
+    "number_dead": "INTEGER",
+    "number_missing": "INTEGER",
+    "number_survivors": "INTEGER",
+    "country_of_origin": "VARCHAR(255)",
+    "region_of_origin": "VARCHAR(255)",
+    "cause_of_death": "TEXT",
+    "region_of_incident": "VARCHAR(255)",
+    "country_of_incident": "VARCHAR(255)",
+    "location_of_incident": "TEXT",
+    "latitude": "DECIMAL(9,6)",
+    "longitude": "DECIMAL(9,6)",
+}
+
+
+def create_table_sql(table_name, columns):
+    """
+    Build the CREATE TABLE statement for a table from its column definitions.
+
+    Args:
+        table_name (str): The name of the table.
+        columns (dict): A mapping of column name to column type and constraints.
+
+    Returns:
+        str: The CREATE TABLE statement.
+    """
+    column_sql = ",\n    ".join(f"{name} {definition}" for name, definition in columns.items())
+    return f"""
+    CREATE TABLE IF NOT EXISTS {table_name} (
+    {column_sql}
+);
+    """
+
+
+# Secondary indexes of each table, by name. The filter columns of the API are indexed together with the
+# primary key, so that filtered pages are read in key order; the minority value of the boolean flags
+# gets a partial index. The mapping primary key starts with incident_id, so lookups by article need their own.
+TABLE_INDEXES = {
+    "articles": {
+        "articles_date_idx": "(date, article_id)",
+        "articles_country_of_incident_idx": "(country_of_incident, article_id)",
+        "articles_region_of_incident_idx": "(region_of_incident, article_id)",
+        "articles_cause_of_death_idx": "(cause_of_death, article_id)",
+        "articles_irrelevant_idx": "(article_id) WHERE NOT relevant",
+    },
+    "incidents": {
+        "incidents_date_idx": "(date, incident_id)",
+        "incidents_country_of_incident_idx": "(country_of_incident, incident_id)",
+        "incidents_region_of_incident_idx": "(region_of_incident, incident_id)",
+        "incidents_cause_of_death_idx": "(cause_of_death, incident_id)",
+        "incidents_unverified_idx": "(incident_id) WHERE NOT verified",
+        "incidents_location_idx": "(latitude, longitude)",
+    },
+    "mapping": {
+        "mapping_article_id_idx": "(article_id, incident_id)",
+    },
+}
+
+
+def create_indexes_sql(table_name, indexes):
+    """
+    Build the CREATE INDEX statements of the secondary indexes of a table.
+
+    Args:
+        table_name (str): The name of the table.
+        indexes (dict): A mapping of index name to index definition, e.g. `TABLE_INDEXES[table_name]`.
+
+    Returns:
+        str: The CREATE INDEX statements.
+    """
+    return "".join(f"""
+    CREATE INDEX IF NOT EXISTS {name} ON {table_name} {definition};"""
+                   for name, definition in indexes.items())
+
+
+# Columns of an article provided by the scraper, in the order `insert_article` and `insert_articles_bulk` write them
+ARTICLE_INSERT_COLUMNS = [
+    "title", "summary", "website", "content", "keywords", "date", "number_dead", "number_missing",
+    "number_survivors", "country_of_origin", "region_of_origin", "cause_of_death", "region_of_incident",
+    "country_of_incident", "location_of_incident", "latitude", "longitude",
+]
+
+# Columns of the fingerprint of an article, computed at ingestion, see `dedup.fingerprint`
+FINGERPRINT_COLUMNS = ["website_key", "content_hash", "minhash", "lsh_buckets"]
+
+# Columns of an incident, in the order `insert_incident` writes them
+INCIDENT_INSERT_COLUMNS = [
+    "title", "verified", "date", "number_dead", "number_missing", "number_survivors", "country_of_origin",
+    "region_of_origin", "cause_of_death", "region_of_incident", "country_of_incident", "location_of_incident",
+    "latitude", "longitude",
+]
+
+INSERT_ARTICLE_SQL = f"""
+    INSERT INTO articles ({", ".join(ARTICLE_INSERT_COLUMNS + FINGERPRINT_COLUMNS)})
+    VALUES ({", ".join(["%s"] * len(ARTICLE_INSERT_COLUMNS + FINGERPRINT_COLUMNS))})
+"""
+INSERT_INCIDENT_SQL = f"""
+    INSERT INTO incidents ({", ".join(INCIDENT_INSERT_COLUMNS)})
+    VALUES ({", ".join(["%s"] * len(INCIDENT_INSERT_COLUMNS))})
+    RETURNING incident_id
+"""
+INSERT_MAPPING_SQL = "INSERT INTO mapping (incident_id, article_id) VALUES (%s, %s)"
+MAPPING_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS mapping (
+    incident_id INTEGER REFERENCES incidents(incident_id),
+    article_id INTEGER REFERENCES articles(article_id),
+    PRIMARY KEY (incident_id, article_id)
+);
+"""
+DELETE_INCIDENTS_SQL = "TRUNCATE mapping, incidents RESTART IDENTITY"
+# The incidents in date ranges, given as arrays of their first and last dates
+INCIDENTS_IN_RANGES_SQL = """
+    SELECT incident_id, date, cause_of_death, location_of_incident, country_of_incident, region_of_incident,
+    latitude, longitude
+    FROM unnest(%s::date[], %s::date[]) AS r(first_date, last_date)
+    JOIN incidents ON date BETWEEN r.first_date AND r.last_date
+"""
+
+# The stubs of the articles of an incident, aggregated into a JSON array so that an incident
+# and its articles are fetched in one query. Correlated on the incident row aliased `i`.
+INCIDENT_ARTICLES_SQL = """
+    COALESCE((
+        SELECT json_agg(json_build_object(
+            'article_id', a.article_id, 'website', a.website, 'title', a.title, 'date', a.date
+        ) ORDER BY a.article_id)
+        FROM mapping m JOIN articles a ON a.article_id = m.article_id
+        WHERE m.incident_id = i.incident_id
+    ), '[]') AS articles
+"""
+
+# Channel on which committed writes are announced, so running API instances can drop cached responses
+CHANGES_CHANNEL = "table_changes"
+
+
+_sync_pool = None
+_sync_pool_slots = threading.BoundedSemaphore(POOL_MAX_SIZE)
+_sync_pool_lock = threading.Lock()
+_async_pool = None
+_async_pool_lock = asyncio.Lock()
+
+
+def sync_pool():
+    """
+    Return the connection pool shared by the functions of this file, creating it on first use.
+
+    Returns:
+        ThreadedConnectionPool: The shared pool, safe to use from several threads.
+    """
+    global _sync_pool
+    with _sync_pool_lock:
+        if _sync_pool is None or _sync_pool.closed:
+            _sync_pool = ThreadedConnectionPool(POOL_MIN_SIZE, POOL_MAX_SIZE, **params)
+        return _sync_pool
+
+
+@contextmanager
+def connection():
+    """
+    Borrow a connection from the shared pool.
+
+    Waits for a free connection if all `POOL_MAX_SIZE` connections are in use. Uncommitted work is
+    rolled back when the connection is returned, and broken connections are discarded.
+
+    Yields:
+        connection: A psycopg2 connection.
+    """
+    with _sync_pool_slots:
+        pool = sync_pool()
+        conn = pool.getconn()
+        try:
+            yield conn
+        finally:
+            broken = conn.closed != 0
+            if not broken:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+            pool.putconn(conn, close=broken)
+
+
+async def async_pool():
+    """
+    Return the asyncpg connection pool shared by the async functions of this file, creating it on first use.
+
+    Concurrent first calls wait for the one creating the pool, instead of creating a pool each.
+
+    Returns:
+        asyncpg.Pool: The shared pool.
+    """
+    global _async_pool
+    if _async_pool is None:
+        async with _async_pool_lock:
+            if _async_pool is None:
+                async_params = {key: value for key, value in params.items() if key != "dbname"}
+                _async_pool = await asyncpg.create_pool(
+                    **async_params, database=params["dbname"], min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE
+                )
+    return _async_pool
+
+
+def close_pool():
+    """
+    Close the shared connection pool, e.g. at the end of a script.
+    """
+    global _sync_pool
+    with _sync_pool_lock:
+        if _sync_pool is not None:
+            _sync_pool.closeall()
+            _sync_pool = None
+
+
+async def close_async_pool():
+    """
+    Close the shared asyncpg connection pool.
+    """
+    global _async_pool
+    async with _async_pool_lock:
+        if _async_pool is not None:
+            await _async_pool.close()
+            _async_pool = None
+
+
+def numbered_placeholders(sql):
+    """
+    Convert the %s placeholders of a psycopg2 query into asyncpg's $1, $2, ...
+
+    Args:
+        sql (str): The query with %s placeholders.
+
+    Returns:
+        str: The query with numbered placeholders.
+    """
+    parts = sql.split("%s")
+    return parts[0] + "".join(f"${number}{part}" for number, part in enumerate(parts[1:], start=1))
+
+
+def async_values(record, columns):
+    """
+    Extract the values of a record for an asyncpg query. Unlike psycopg2, asyncpg needs dates as date objects.
+
+    Args:
+        record (dict): The article or incident data.
+        columns (list): The columns to extract, in query order.
+
+    Returns:
+        list: The values of the columns.
+    """
+    values = [record[column] for column in columns]
+    if "date" in columns and isinstance(record["date"], str):
+        values[columns.index("date")] = date.fromisoformat(record["date"])
+    return values
+
+
+# Per-table change counters. A statement-level trigger bumps the counter of a table on every write,
+# so the API can derive ETags from them without querying the tables themselves.
+TABLE_VERSIONS_SQL = """
+    CREATE TABLE IF NOT EXISTS table_versions (
+    table_name TEXT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+    CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO table_versions (table_name, version) VALUES (TG_TABLE_NAME, 1)
+        ON CONFLICT (table_name) DO UPDATE SET version = table_versions.version + 1;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+
+def install_version_trigger(cursor, table_name):
+    """
+    Attach the change counter trigger to a table and bump its version.
+
+    The version is bumped here as well, so that recreating a table never reuses an ETag of its previous contents.
+
+    Args:
+        cursor: The cursor of the transaction that creates the table.
+        table_name (str): The name of the table.
+
+    Returns:
+        None
+    """
+    cursor.execute(TABLE_VERSIONS_SQL)
+    cursor.execute(
+        f"""
+        DROP TRIGGER IF EXISTS {table_name}_version ON {table_name};
+        CREATE TRIGGER {table_name}_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table_name}
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+        """
+    )
+    cursor.execute(
+        """
+        INSERT INTO table_versions (table_name, version) VALUES (%s, 1)
+        ON CONFLICT (table_name) DO UPDATE SET version = table_versions.version + 1
+        """,
+        (table_name,),
+    )
+
+
+# Map clustering: the number of incidents and their totals per cell of a latitude/longitude grid,
+# for every zoom level up to CLUSTER_MAX_ZOOM. At zoom z a cell spans 360 / 2^(z + GRID_CELLS_PER_TILE_LOG2)
+# degrees, i.e. a map tile is divided into 2^GRID_CELLS_PER_TILE_LOG2 cells per side.
+CLUSTER_MAX_ZOOM = 12
+GRID_CELLS_PER_TILE_LOG2 = 3
+
+
+def grid_cell_size(zoom):
+    """
+    Returns:
+        float: The edge length in degrees of a cell of the incident grid at a zoom level.
+    """
+    return 360.0 / 2 ** (zoom + GRID_CELLS_PER_TILE_LOG2)
+
+
+def incident_grid_delta_sql(rows):
+    """
+    Build the statement applying a set of added and removed incidents to the incident grid.
+
+    Args:
+        rows (str): The relation holding the incidents, with a `sign` column of 1 for added
+            and -1 for removed incidents, see `signed_rows_sql`.
+
+    Returns:
+        str: The INSERT ... ON CONFLICT statement.
+    """
+    size = f"(360.0 / 2 ^ (z.zoom + {GRID_CELLS_PER_TILE_LOG2}))"
+    return f"""
+        INSERT INTO incident_grid AS g (zoom, cell_x, cell_y, incidents, number_dead, number_missing, sum_latitude, sum_longitude)
+        SELECT z.zoom, floor((r.longitude + 180) / {size})::int, floor((r.latitude + 90) / {size})::int,
+               sum(r.sign), COALESCE(sum(r.sign * r.number_dead), 0), COALESCE(sum(r.sign * r.number_missing), 0),
+               sum(r.sign * r.latitude), sum(r.sign * r.longitude)
+        FROM {rows} r CROSS JOIN generate_series(0, {CLUSTER_MAX_ZOOM}) AS z (zoom)
+        WHERE r.latitude IS NOT NULL AND r.longitude IS NOT NULL
+        GROUP BY 1, 2, 3
+        ORDER BY 1, 2, 3
+        ON CONFLICT (zoom, cell_x, cell_y) DO UPDATE SET
+            incidents = g.incidents + EXCLUDED.incidents,
+            number_dead = g.number_dead + EXCLUDED.number_dead,
+            number_missing = g.number_missing + EXCLUDED.number_missing,
+            sum_latitude = g.sum_latitude + EXCLUDED.sum_latitude,
+            sum_longitude = g.sum_longitude + EXCLUDED.sum_longitude;
+    """
+
+
+def signed_rows_sql(rows, sign):
+    """
+    Tag the incidents of a relation as added (sign 1) or removed (sign -1), for the delta statements of the rollups.
+
+    Returns:
+        str: The subquery adding the `sign` column.
+    """
+    return f"(SELECT r.*, {sign} AS sign FROM {rows} r)"
+
+
+def rollup_triggers_sql(table_name, delta_sql, columns, backfilled=None):
+    """
+    Build the trigger function and statement-level triggers keeping a rollup of the 'incidents' table up to date.
+
+    The triggers use transition tables, so a statement touching many incidents updates the rollup with
+    one statement. Updates only move the incidents whose rolled up columns changed. The delta statement
+    upserts the rollup rows in key order, so that concurrent writers lock them in the same order and
+    cannot deadlock. Emptied rollup rows are deleted through a partial index.
+
+    Args:
+        table_name (str): The name of the rollup table, with an 'incidents' count column.
+        delta_sql (callable): Builds the statement applying a relation of signed incidents, see `signed_rows_sql`.
+        columns (list): The columns of the 'incidents' table the rollup depends on.
+        backfilled (str, optional): A subquery returning the highest incident ID rolled up so far, while the
+            rollup is backfilled. The triggers then ignore the incidents above it, which the backfill adds.
+
+    Returns:
+        str: The CREATE INDEX, CREATE FUNCTION and CREATE TRIGGER statements.
+    """
+    old = ", ".join(f"o.{column}" for column in columns)
+    new = ", ".join(f"n.{column}" for column in columns)
+    old_rows, new_rows = "old_rows", "new_rows"
+    if backfilled is not None:
+        old_rows = f"(SELECT * FROM old_rows WHERE incident_id <= {backfilled})"
+        new_rows = f"(SELECT * FROM new_rows WHERE incident_id <= {backfilled})"
+    changed = f"""(
+        SELECT o.*, -1 AS sign FROM {old_rows} o JOIN {new_rows} n ON n.incident_id = o.incident_id
+        WHERE ({old}) IS DISTINCT FROM ({new})
+        UNION ALL
+        SELECT n.*, 1 AS sign FROM {old_rows} o JOIN {new_rows} n ON n.incident_id = o.incident_id
+        WHERE ({old}) IS DISTINCT FROM ({new})
+    )"""
+    events = {
+        "insert": "REFERENCING NEW TABLE AS new_rows",
+        "update": "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+        "delete": "REFERENCING OLD TABLE AS old_rows",
+        "truncate": "",
+    }
+    triggers = "".join(f"""
+    DROP TRIGGER IF EXISTS {table_name}_{event} ON incidents;
+    CREATE TRIGGER {table_name}_{event} AFTER {event.upper()} ON incidents
+        {transition} FOR EACH STATEMENT EXECUTE FUNCTION update_{table_name}();""" for event, transition in events.items())
+    return f"""
+    CREATE INDEX IF NOT EXISTS {table_name}_empty_idx ON {table_name} (incidents) WHERE incidents <= 0;
+
+    CREATE OR REPLACE FUNCTION update_{table_name}() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            {delta_sql(signed_rows_sql(new_rows, 1))}
+        ELSIF TG_OP = 'DELETE' THEN
+            {delta_sql(signed_rows_sql(old_rows, -1))}
+        ELSIF TG_OP = 'UPDATE' THEN
+            {delta_sql(changed)}
+        ELSE
+            TRUNCATE {table_name};
+        END IF;
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            DELETE FROM {table_name} WHERE incidents <= 0;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+{triggers}
+"""
+
+
+def incident_grid_sql(backfilled=None):
+    """
+    Build the statements creating the incident grid and its triggers.
+
+    Args:
+        backfilled (str, optional): See `rollup_triggers_sql`.
+
+    Returns:
+        str: The statements.
+    """
+    return f"""
+    CREATE TABLE IF NOT EXISTS incident_grid (
+    zoom SMALLINT,
+    cell_x INTEGER,
+    cell_y INTEGER,
+    incidents INTEGER NOT NULL,
+    number_dead INTEGER NOT NULL,
+    number_missing INTEGER NOT NULL,
+    sum_latitude NUMERIC NOT NULL,
+    sum_longitude NUMERIC NOT NULL,
+    PRIMARY KEY (zoom, cell_y, cell_x)
+);
+{rollup_triggers_sql("incident_grid", incident_grid_delta_sql, ["latitude", "longitude", "number_dead", "number_missing"],
+                      backfilled)}
+"""
+
+
+INCIDENT_GRID_SQL = incident_grid_sql()
+
+
+def install_incident_grid(cursor):
+    """
+    Create the incident grid with the triggers keeping it up to date, and fill it from the existing incidents.
+
+    Args:
+        cursor: The cursor of the transaction.
+
+    Returns:
+        None
+    """
+    cursor.execute(INCIDENT_GRID_SQL)
+    cursor.execute("TRUNCATE incident_grid")
+    cursor.execute(incident_grid_delta_sql(signed_rows_sql("incidents", 1)))
+
+
+# Dimensions of the incident statistics, with the expression grouping an incident along each
+STATS_DIMENSIONS = {
+    "month": "to_char(r.date, 'YYYY-MM')",
+    "region_of_incident": "r.region_of_incident",
+    "country_of_incident": "r.country_of_incident",
+    "cause_of_death": "r.cause_of_death",
+}
+STATS_MEASURES = ["number_dead", "number_missing", "number_survivors"]
+
+
+def incident_stats_delta_sql(rows):
+    """
+    Build the statement applying a set of added and removed incidents to the incident statistics.
+
+    Args:
+        rows (str): The relation holding the incidents, with a `sign` column of 1 for added
+            and -1 for removed incidents, see `signed_rows_sql`.
+
+    Returns:
+        str: The INSERT ... ON CONFLICT statement.
+    """
+    dimensions = ", ".join(f"('{name}', {expression}::text)" for name, expression in STATS_DIMENSIONS.items())
+    measures = ", ".join(STATS_MEASURES)
+    sums = ", ".join(f"COALESCE(sum(r.sign * r.{measure}), 0)" for measure in STATS_MEASURES)
+    updates = ", ".join(f"{measure} = s.{measure} + EXCLUDED.{measure}" for measure in STATS_MEASURES)
+    return f"""
+        INSERT INTO incident_stats AS s (dimension, value, verified, incidents, {measures})
+        SELECT d.dimension, COALESCE(d.value, ''), COALESCE(r.verified, FALSE), sum(r.sign), {sums}
+        FROM {rows} r CROSS JOIN LATERAL (VALUES {dimensions}) AS d (dimension, value)
+        GROUP BY 1, 2, 3
+        ORDER BY 1, 2, 3
+        ON CONFLICT (dimension, value, verified) DO UPDATE SET incidents = s.incidents + EXCLUDED.incidents, {updates};
+    """
+
+
+def incident_stats_sql(backfilled=None):
+    """
+    Build the statements creating the incident statistics and their triggers.
+
+    Args:
+        backfilled (str, optional): See `rollup_triggers_sql`.
+
+    Returns:
+        str: The statements.
+    """
+    return f"""
+    CREATE TABLE IF NOT EXISTS incident_stats (
+    dimension TEXT,
+    value TEXT,
+    verified BOOLEAN,
+    incidents INTEGER NOT NULL,
+    number_dead BIGINT NOT NULL,
+    number_missing BIGINT NOT NULL,
+    number_survivors BIGINT NOT NULL,
+    PRIMARY KEY (dimension, value, verified)
+);
+{rollup_triggers_sql("incident_stats", incident_stats_delta_sql, ["verified", "date", *STATS_MEASURES, "region_of_incident", "country_of_incident", "cause_of_death"],
+                      backfilled)}
+"""
+
+
+# Totals of the incidents per value of each of `STATS_DIMENSIONS`, split by the `verified` flag.
+# Incidents without a value are counted under the empty string.
+INCIDENT_STATS_SQL = incident_stats_sql()
+
+
+def install_incident_stats(cursor):
+    """
+    Create the incident statistics with the triggers keeping them up to date, and fill them from the existing incidents.
+
+    Args:
+        cursor: The cursor of the transaction.
+
+    Returns:
+        None
+    """
+    cursor.execute(INCIDENT_STATS_SQL)
+    cursor.execute("TRUNCATE incident_stats")
+    cursor.execute(incident_stats_delta_sql(signed_rows_sql("incidents", 1)))
+
+
+# Text search configuration of the article search
+SEARCH_CONFIG = "english"
+
+# Full-text search over the articles. The 'search_vector' column is kept out of `ARTICLES_COLUMNS`, so it is
+# never returned by the API; a row trigger recomputes it whenever one of the searched columns changes.
+ARTICLE_SEARCH_SQL = f"""
+    ALTER TABLE articles ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+    CREATE OR REPLACE FUNCTION update_article_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('{SEARCH_CONFIG}', COALESCE(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('{SEARCH_CONFIG}', COALESCE(array_to_string(NEW.keywords, ' '), '')), 'B') ||
+            setweight(to_tsvector('{SEARCH_CONFIG}', COALESCE(NEW.summary, '')), 'C') ||
+            setweight(to_tsvector('{SEARCH_CONFIG}', COALESCE(NEW.content, '')), 'D');
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS articles_search_vector ON articles;
+    CREATE TRIGGER articles_search_vector BEFORE INSERT OR UPDATE OF title, summary, content, keywords ON articles
+        FOR EACH ROW EXECUTE FUNCTION update_article_search_vector();
+"""
+ARTICLE_SEARCH_INDEXES = {"articles_search_idx": "USING GIN (search_vector)"}
+# Touching a searched column fires the trigger
+BACKFILL_ARTICLE_SEARCH_SQL = "UPDATE articles SET title = title WHERE search_vector IS NULL"
+
+
+def install_article_search(cursor):
+    """
+    Add the full-text search column, trigger and index to the 'articles' table, and fill the column
+    of the existing articles.
+
+    Args:
+        cursor: The cursor of the transaction.
+
+    Returns:
+        None
+    """
+    cursor.execute(ARTICLE_SEARCH_SQL)
+    cursor.execute(BACKFILL_ARTICLE_SEARCH_SQL)
+    cursor.execute(create_indexes_sql("articles", ARTICLE_SEARCH_INDEXES))
+
+
+# Fingerprints of the articles for the detection of duplicates at ingestion, see `dedup`. Like 'search_vector',
+# the columns are kept out of `ARTICLES_COLUMNS`. Duplicates are not inserted into 'articles' but recorded in
+# 'article_duplicates', linked to their original.
+ARTICLE_DEDUP_SQL = """
+    ALTER TABLE articles
+        ADD COLUMN IF NOT EXISTS website_key TEXT,
+        ADD COLUMN IF NOT EXISTS content_hash BYTEA,
+        ADD COLUMN IF NOT EXISTS minhash BYTEA,
+        ADD COLUMN IF NOT EXISTS lsh_buckets BIGINT[];
+
+    CREATE TABLE IF NOT EXISTS article_duplicates (
+    duplicate_id SERIAL PRIMARY KEY,
+    article_id INTEGER NOT NULL REFERENCES articles(article_id) ON DELETE CASCADE,
+    website VARCHAR(2048),
+    title VARCHAR(255),
+    date DATE,
+    match TEXT NOT NULL,
+    similarity REAL NOT NULL,
+    detected_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
+# The exact-match keys get B-tree indexes, the LSH buckets of all bands one GIN index, whose posting lists
+# are compressed, so a lookup costs a few index pages whatever the number of articles. Without fastupdate,
+# new entries go straight into the index instead of a pending list that every lookup would scan.
+# Articles are never fingerprinted with NULL buckets, so the articles still to fingerprint get a partial index.
+ARTICLE_DEDUP_INDEXES = {
+    "articles": {
+        "articles_website_key_idx": "(website_key)",
+        "articles_content_hash_idx": "(content_hash)",
+        "articles_lsh_buckets_idx": "USING GIN (lsh_buckets) WITH (fastupdate = off)",
+        "articles_unfingerprinted_idx": "(article_id) WHERE lsh_buckets IS NULL",
+    },
+    "article_duplicates": {
+        "article_duplicates_article_id_idx": "(article_id)",
+    },
+}
+# The stored articles sharing a website key, content hash or LSH bucket with a batch of new articles. Every
+# bucket is looked up on its own: the planner estimates an overlap with thousands of buckets to match most
+# rows, and would check the overlap row by row instead of using the index.
+DUPLICATE_CANDIDATES_SQL = f"""
+    SELECT article_id, {", ".join(FINGERPRINT_COLUMNS)} FROM articles
+    WHERE article_id IN (
+        SELECT article_id FROM articles WHERE website_key = ANY(%s::text[])
+        UNION ALL
+        SELECT article_id FROM articles WHERE content_hash = ANY(%s::bytea[])
+        UNION ALL
+        SELECT article_id FROM articles, unnest(%s::bigint[]) AS bucket WHERE lsh_buckets && ARRAY[bucket]
+    )
+    ORDER BY article_id
+"""
+INSERT_DUPLICATES_SQL = """
+    INSERT INTO article_duplicates (article_id, website, title, date, match, similarity)
+    SELECT * FROM unnest(%s::int[], %s::varchar[], %s::varchar[], %s::date[], %s::text[], %s::real[])
+"""
+# Key of the advisory lock held by a transaction looking up and inserting articles, so that concurrent
+# ingestions do not both insert the same article
+DEDUP_LOCK_ID = 7312
+# Number of articles looked up and inserted per round trip
+DEDUP_CHUNK_SIZE = 5000
+
+
+def install_article_dedup(cursor):
+    """
+    Add the fingerprint columns and their indexes to the 'articles' table, and create the
+    'article_duplicates' table. The fingerprints of existing articles are filled by migration 8.
+
+    Args:
+        cursor: The cursor of the transaction.
+
+    Returns:
+        None
+    """
+    cursor.execute(ARTICLE_DEDUP_SQL)
+    for table_name, indexes in ARTICLE_DEDUP_INDEXES.items():
+        cursor.execute(create_indexes_sql(table_name, indexes))
+
+
+# Key/value state of the incremental `process_articles` runs before migration 9, which held the greatest
+# processed article ID
+PROCESSING_STATE_SQL = """
+    CREATE TABLE IF NOT EXISTS processing_state (
+    key TEXT PRIMARY KEY,
+    value BIGINT NOT NULL
+);
+"""
+
+# The articles not processed by `process_articles` yet. A statement trigger queues every inserted article
+# in the transaction inserting it, so an article is queued exactly when it is committed. Article IDs are
+# reserved before the commit, so a high-water mark of processed IDs would skip the articles of a slow
+# transaction that commits after a run processed greater IDs.
+ARTICLE_QUEUE_SQL = """
+    CREATE TABLE IF NOT EXISTS unprocessed_articles (
+    article_id INTEGER PRIMARY KEY REFERENCES articles(article_id) ON DELETE CASCADE
+);
+
+    CREATE OR REPLACE FUNCTION queue_articles() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO unprocessed_articles (article_id) SELECT article_id FROM new_rows;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS articles_queue ON articles;
+    CREATE TRIGGER articles_queue AFTER INSERT ON articles
+        REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION queue_articles();
+"""
+
+# Key of the advisory lock held during a `process_articles` run, so that only one run happens at a time
+PROCESSING_LOCK_ID = 7311
+# The steps of a `process_articles` run, in order
+PROCESSING_STEPS = ("fetch", "match", "group", "write")
 
-def pool():
-    return asyncpg.create_pool(**params)
+
+class ProcessingLocked(Exception):
+    """
+    Raised by `process_articles` when another run holds the processing lock.
+    """
+
+
+@contextmanager
+def processing_lock():
+    """
+    Hold the advisory lock of `process_articles` for the duration of the block.
+
+    The lock is held by a dedicated connection outside the shared pool, so that the run can use all pool
+    connections, even with `POOL_MAX_SIZE` 1, and is released if the process dies.
+
+    Raises:
+        ProcessingLocked: If another session holds the lock.
+    """
+    conn = psycopg2.connect(**params)
+    try:
+        # Autocommit keeps the lock connection from idling in a transaction for the whole run
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", (PROCESSING_LOCK_ID,))
+            if not cursor.fetchone()[0]:
+                raise ProcessingLocked("Articles are already being processed")
+            try:
+                yield
+            finally:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (PROCESSING_LOCK_ID,))
+    finally:
+        conn.close()
+
+
+def notify_change(cursor, table_name, item_id=None):
+    """
+    Announce a change of a table on `CHANGES_CHANNEL`.
+
+    The notification is delivered when the surrounding transaction commits, and is dropped on rollback.
+    Changes of the 'mapping' table are announced as changes of the incidents they belong to.
+
+    Args:
+        cursor: The cursor of the transaction that made the change.
+        table_name (str): The name of the changed table.
+        item_id (int, optional): The primary key of the changed row, or None if many rows changed.
+
+    Returns:
+        None
+    """
+    cursor.execute("SELECT pg_notify(%s, %s)", (CHANGES_CHANNEL, change_payload(table_name, item_id)))
+
+
+async def notify_change_async(connection, table_name, item_id=None):
+    """
+    Announce a change of a table on `CHANGES_CHANNEL` from an asyncpg transaction, see `notify_change`.
+    """
+    await connection.execute("SELECT pg_notify($1, $2)", CHANGES_CHANNEL, change_payload(table_name, item_id))
+
+
+def change_payload(table_name, item_id=None):
+    """
+    Build the payload of a change notification.
+
+    Returns:
+        str: The changed table, followed by ':' and the primary key of the changed row if a single row changed.
+    """
+    if table_name == "mapping":
+        table_name = "incidents"
+    return table_name if item_id is None else f"{table_name}:{item_id}"
 
 
 def delete_table(table_name):
@@ -27,60 +841,140 @@ def delete_table(table_name):
         table_name (str): The name of the table to be deleted.
     Returns:
         None
-    Raises:
-        Exception: If an error occurs while deleting the table.
+    Raises:
+        Exception: If an error occurs while deleting the table.
+    """
+    try:
+        with connection() as conn, conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE {table_name}")
+            notify_change(cursor, table_name)
+            conn.commit()
+            print("Table deleted successfully")
+    except Exception as e:
+        print("An error occurred:", e)
+
+
+def create_mapping_table():
+    """
+    Creates a mapping table in the database that maps incident IDs to article IDs.
+
+    This function executes an SQL query to create a table named 'mapping' with two columns:
+    - incident_id: INTEGER, a foreign key referencing the 'incident_id' column in the 'incidents' table.
+    - article_id: INTEGER, a foreign key referencing the 'article_id' column in the 'articles' table.
+    The primary key of the table is a combination of incident_id and article_id.
+
+    Raises:
+        Exception: If an error occurs while executing the SQL query.
+
+    Returns:
+        None
+    """
+    try:
+        with connection() as conn, conn.cursor() as cursor:
+            cursor.execute(MAPPING_TABLE_SQL)
+            cursor.execute(create_indexes_sql("mapping", TABLE_INDEXES["mapping"]))
+            install_version_trigger(cursor, "mapping")
+            conn.commit()
+            print("Mapping Table created successfully")
+    except Exception as e:
+        print("An error occurred:", e)
+
+
+def create_table_versions():
+    """
+    Installs the change counters on the existing 'articles', 'incidents' and 'mapping' tables.
+
+    Tables created with the create_*_table functions already have them, so this is only needed
+    for databases created before the counters existed.
+
+    Returns:
+        None
+    """
+    try:
+        with connection() as conn, conn.cursor() as cursor:
+            for table_name in ("articles", "incidents", "mapping"):
+                install_version_trigger(cursor, table_name)
+            conn.commit()
+            print("Table versions created successfully")
+    except Exception as e:
+        print("An error occurred:", e)
+
+
+def create_indexes():
+    """
+    Creates the secondary indexes of `TABLE_INDEXES` on the existing 'articles', 'incidents' and 'mapping' tables.
+
+    Tables created with the create_*_table functions already have them, so this is only needed
+    for databases created before the indexes existed.
+
+    Returns:
+        None
+    """
+    try:
+        with connection() as conn, conn.cursor() as cursor:
+            for table_name, indexes in TABLE_INDEXES.items():
+                cursor.execute(create_indexes_sql(table_name, indexes))
+            conn.commit()
+            print("Indexes created successfully")
+    except Exception as e:
+        print("An error occurred:", e)
+
+
+def create_incident_grid():
+    """
+    Creates the incident grid used for map clustering on an existing 'incidents' table.
+
+    The 'incidents' table created with `create_incidents_table` already has it, so this is only needed
+    for databases created before the grid existed.
+
+    Returns:
+        None
+    """
+    try:
+        with connection() as conn, conn.cursor() as cursor:
+            install_incident_grid(cursor)
+            conn.commit()
+            print("Incident grid created successfully")
+    except Exception as e:
+        print("An error occurred:", e)
+
+
+def create_incident_stats():
+    """
+    Creates the incident statistics served by the '/stats' endpoint on an existing 'incidents' table.
+
+    The 'incidents' table created with `create_incidents_table` already has them, so this is only needed
+    for databases created before the statistics existed.
+
+    Returns:
+        None
     """
-    conn = None
     try:
-        conn = psycopg2.connect(**params)
-        cursor = conn.cursor()
-        cursor.execute(f"DROP TABLE {table_name}")
-        conn.commit()
-        print("Table deleted successfully")
+        with connection() as conn, conn.cursor() as cursor:
+            install_incident_stats(cursor)
+            conn.commit()
+            print("Incident statistics created successfully")
     except Exception as e:
         print("An error occurred:", e)
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
 
 
-def create_mapping_table():
+def create_article_search():
     """
-    Creates a mapping table in the database that maps incident IDs to article IDs.
+    Creates the full-text search used by the '/articles/search' endpoint on an existing 'articles' table.
 
-    This function executes an SQL query to create a table named 'mapping' with two columns:
-    - incident_id: INTEGER, a foreign key referencing the 'incident_id' column in the 'incidents' table.
-    - article_id: INTEGER, a foreign key referencing the 'article_id' column in the 'articles' table.
-    The primary key of the table is a combination of incident_id and article_id.
-
-    Raises:
-        Exception: If an error occurs while executing the SQL query.
+    The 'articles' table created with `create_articles_table` already has it, so this is only needed
+    for databases created before the search existed.
 
     Returns:
         None
     """
-    create_mapping_table_sql = """
-    CREATE TABLE mapping (
-    incident_id INTEGER REFERENCES incidents(incident_id),
-    article_id INTEGER REFERENCES articles(article_id),
-    PRIMARY KEY (incident_id, article_id)
-);
-    """
-    conn = None
-    # Connect to the PostgreSQL database
     try:
-        conn = psycopg2.connect(**params)
-        cursor = conn.cursor()
-        cursor.execute(create_mapping_table_sql)
-        conn.commit()
-        print("Mapping Table created successfully")
+        with connection() as conn, conn.cursor() as cursor:
+            install_article_search(cursor)
+            conn.commit()
+            print("Article search created successfully")
     except Exception as e:
         print("An error occurred:", e)
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
 
 
 def create_articles_table():
@@ -95,43 +989,19 @@ def create_articles_table():
     Returns:
         None
     """
-    create_articles_table_sql = """
-    CREATE TABLE articles (
-    article_id SERIAL PRIMARY KEY,
-    title VARCHAR(255),
-    summary TEXT,
-    website VARCHAR(2048),  -- URL of the website
-    content TEXT,           -- Content of the website URL
-    keywords TEXT[],        -- List of keywords, using PostgreSQL array type
-    date DATE,
-    number_dead INTEGER,
-    number_missing INTEGER,
-    number_survivors INTEGER,
-    country_of_origin VARCHAR(255),
-    region_of_origin VARCHAR(255),
-    cause_of_death TEXT, 
-    region_of_incident VARCHAR(255),
-    country_of_incident VARCHAR(255),
-    location_of_incident TEXT,
-    latitude DECIMAL(9,6),
-    longitude DECIMAL(9,6),
-    relevant BOOLEAN DEFAULT TRUE
-);
-    """
-    conn = None
-    # Connect to the PostgreSQL database
+    create_articles_table_sql = create_table_sql("articles", ARTICLES_COLUMNS)
     try:
-        conn = psycopg2.connect(**params)
-        cursor = conn.cursor()
-        cursor.execute(create_articles_table_sql)
-        conn.commit()
-        print("Articles Table created successfully")
+        with connection() as conn, conn.cursor() as cursor:
+            cursor.execute(create_articles_table_sql)
+            cursor.execute(create_indexes_sql("articles", TABLE_INDEXES["articles"]))
+            install_version_trigger(cursor, "articles")
+            install_article_search(cursor)
+            install_article_dedup(cursor)
+            cursor.execute(ARTICLE_QUEUE_SQL)
+            conn.commit()
+            print("Articles Table created successfully")
     except Exception as e:
         print("An error occurred:", e)
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
 
 
 def create_incidents_table():
@@ -161,49 +1031,29 @@ def create_incidents_table():
     Returns:
     None
     """
-    create_table_sql = """
-    CREATE TABLE incidents (
-    incident_id SERIAL PRIMARY KEY,
-    title VARCHAR(255),
-    verified BOOLEAN,
-    date DATE,
-    number_dead INTEGER,
-    number_missing INTEGER,
-    number_survivors INTEGER,
-    country_of_origin VARCHAR(255),
-    region_of_origin VARCHAR(255),
-    cause_of_death TEXT, 
-    region_of_incident VARCHAR(255),
-    country_of_incident VARCHAR(255),
-    location_of_incident TEXT,
-    latitude DECIMAL(9,6),
-    longitude DECIMAL(9,6)
-);
-    """
-    conn = None
-    # Connect to the PostgreSQL database
+    incidents_table_sql = create_table_sql("incidents", INCIDENTS_COLUMNS)
     try:
-        # Connect to the database
-        conn = psycopg2.connect(**params)
-        cursor = conn.cursor()
-        # Execute the SQL commands
-        cursor.execute(create_table_sql)
-        # Commit the changes in the database
-        conn.commit()
-        print("Incidents Table created successfully")
+        with connection() as conn, conn.cursor() as cursor:
+            # Execute the SQL commands
+            cursor.execute(incidents_table_sql)
+            cursor.execute(create_indexes_sql("incidents", TABLE_INDEXES["incidents"]))
+            install_version_trigger(cursor, "incidents")
+            install_incident_grid(cursor)
+            install_incident_stats(cursor)
+            # Commit the changes in the database
+            conn.commit()
+            print("Incidents Table created successfully")
     except Exception as e:
         print("An error occurred:", e)
-    finally:
-        # Closing the connection
-        if conn:
-            cursor.close()
-            conn.close()
 
 
 def insert_article(article):
     """
     Insert an article into the 'articles' table in the database.
 
+    If the article is a duplicate of a stored article, it is recorded in 'article_duplicates' instead,
+    see `insert_articles_rows`.
+
     Args:
         article (dict): A dictionary containing the article data.
 
@@ -214,41 +1064,243 @@ def insert_article(article):
         None
     """
     try:
-        conn = psycopg2.connect(**params)
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            INSERT INTO articles (title, summary, website, content, keywords, date, number_dead, number_missing, number_survivors, country_of_origin, region_of_origin, cause_of_death, region_of_incident, country_of_incident, location_of_incident, latitude, longitude) 
-            VALUES (%s,%s,%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """,
-            (
-                article["title"],
-                article["summary"],
-                article["website"],
-                article["content"],
-                article["keywords"],
-                article["date"],
-                article["number_dead"],
-                article["number_missing"],
-                article["number_survivors"],
-                article["country_of_origin"],
-                article["region_of_origin"],
-                article["cause_of_death"],
-                article["region_of_incident"],
-                article["country_of_incident"],
-                article["location_of_incident"],
-                article["latitude"],
-                article["longitude"],
-            ),
-        )
-        conn.commit()
-        print("Record inserted successfully")
+        with connection() as conn, conn.cursor() as cursor:
+            article_ids, duplicates = insert_articles_rows(cursor, [article])
+            if not duplicates:
+                notify_change(cursor, "articles")
+            conn.commit()
+            if duplicates:
+                print(f"Duplicate of article {article_ids[0]} recorded")
+            else:
+                print("Record inserted successfully")
     except Exception as e:
         print("An error occurred:", e)
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
+
+
+def copy_value(value):
+    """
+    Encode a value for PostgreSQL's COPY text format.
+
+    Args:
+        value: The value of a column, None for NULL. Lists are encoded as array literals.
+
+    Returns:
+        str: The encoded value.
+    """
+    if value is None:
+        return "\\N"
+    if isinstance(value, (bytes, memoryview)):
+        # bytea in hex format; the backslash itself is escaped for COPY
+        return "\\\\x" + bytes(value).hex()
+    if isinstance(value, (list, tuple)):
+        elements = []
+        for element in value:
+            if element is None:
+                elements.append("NULL")
+            else:
+                elements.append('"' + str(element).replace("\\", "\\\\").replace('"', '\\"') + '"')
+        value = "{" + ",".join(elements) + "}"
+    elif not isinstance(value, str):
+        # numbers and dates never contain characters that need escaping
+        return str(value)
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+# Number of characters handed to COPY per read
+COPY_BUFFER_SIZE = 1 << 16
+
+
+class CopyReader:
+    """
+    A file-like object that encodes rows for COPY ... FROM STDIN as they are read.
+
+    Rows are pulled from the iterable only when the database asks for more data,
+    so a generator of rows is never held in memory as a whole.
+    """
+
+    def __init__(self, rows, columns):
+        self.rows = iter(rows)
+        self.columns = columns
+        self.buffer = ""
+
+    def read(self, size=-1):
+        parts = [self.buffer]
+        length = len(self.buffer)
+        while size < 0 or length < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            line = "\t".join(copy_value(row.get(column)) for column in self.columns) + "\n"
+            parts.append(line)
+            length += len(line)
+        data = "".join(parts)
+        if size < 0:
+            size = len(data)
+        self.buffer = data[size:]
+        return data[:size]
+
+    readline = read
+
+
+def insert_articles_bulk(articles, deduplicate=False):
+    """
+    Insert many articles into the 'articles' table in one transaction.
+
+    The articles are streamed into 'articles' with COPY ... FROM STDIN in chunks, which avoids a round trip
+    and a commit per article, see `insert_articles_rows`.
+
+    Args:
+        articles (iterable): Dictionaries containing the article data, as for `insert_article`.
+            Missing keys are stored as NULL. May be a generator.
+        deduplicate (bool): Whether to record duplicates in 'article_duplicates' instead of inserting them.
+            Looking for duplicates costs most of the time of a bulk load, so it is off by default; the
+            articles are then fingerprinted later, by `fingerprint_articles`.
+
+    Raises:
+        Exception: If an error occurs while inserting the records. No article is inserted in that case.
+
+    Returns:
+        list: The article IDs of the articles, in the order of the input. A duplicate has the ID of its original.
+    """
+    with connection() as conn, conn.cursor() as cursor:
+        article_ids, duplicates = insert_articles_rows(cursor, articles, deduplicate)
+        if len(article_ids) > duplicates:
+            notify_change(cursor, "articles")
+        conn.commit()
+    print(f"{len(article_ids) - duplicates} records inserted successfully, {duplicates} duplicates recorded")
+    return article_ids
+
+
+def insert_articles_rows(cursor, articles, deduplicate=True):
+    """
+    Insert articles as part of the caller's transaction, recording duplicates instead of inserting them.
+
+    The articles are handled in chunks of `DEDUP_CHUNK_SIZE`, so a generator is never held in memory. Every
+    chunk is fingerprinted, see `dedup.fingerprints`, and the stored articles sharing a website key, content
+    hash or LSH bucket with one of its articles are fetched with one indexed query. Every article is then
+    compared to these candidates and to the articles before it in the chunk, see `dedup.DuplicateIndex`.
+    The originals are copied into 'articles' together with their fingerprints, the duplicates are recorded
+    in 'article_duplicates' with the ID of their original.
+
+    To look for duplicates, the transaction takes `DEDUP_LOCK_ID` once the first chunk is fingerprinted and
+    holds it until it ends, so that concurrent ingestions see each other's articles. Without looking for
+    duplicates, no lock is taken and the articles are copied without fingerprints, which
+    `fingerprint_articles` calculates later.
+
+    Args:
+        cursor: The cursor of the transaction.
+        articles (iterable): Dictionaries containing the article data, as for `insert_article`. May be a generator.
+        deduplicate (bool): Whether to look for duplicates.
+
+    Returns:
+        tuple: The article IDs of the articles, in the order of the input, where a duplicate has the ID of
+               its original, and the number of duplicates.
+    """
+    columns = ["article_id", *ARTICLE_INSERT_COLUMNS, *(FINGERPRINT_COLUMNS if deduplicate else [])]
+    articles = iter(articles)
+    article_ids = []
+    duplicates = []
+    locked = False
+    for chunk in iter(lambda: list(islice(articles, DEDUP_CHUNK_SIZE)), []):
+        index = dedup.DuplicateIndex()
+        fingerprints = [{}] * len(chunk)
+        if deduplicate:
+            fingerprints = dedup.fingerprints((article.get("website"), article.get("content")) for article in chunk)
+            if not locked:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", (DEDUP_LOCK_ID,))
+                locked = True
+            cursor.execute(DUPLICATE_CANDIDATES_SQL, dedup.lookup_keys(fingerprints))
+            for row in cursor.fetchall():
+                index.add(row[0], dict(zip(FINGERPRINT_COLUMNS, row[1:])))
+        # IDs are reserved for the whole chunk, so that originals can be found within the chunk;
+        # the IDs of duplicates are left unused
+        cursor.execute("SELECT nextval(pg_get_serial_sequence('articles', 'article_id')) FROM generate_series(1, %s)",
+                       (len(chunk),))
+        reserved_ids = [row[0] for row in cursor.fetchall()]
+        originals = []
+        for article, fingerprint, article_id in zip(chunk, fingerprints, reserved_ids):
+            match = index.find(fingerprint) if deduplicate else None
+            if match is None:
+                if deduplicate:
+                    index.add(article_id, fingerprint)
+                originals.append({**article, **fingerprint, "article_id": article_id})
+                article_ids.append(article_id)
+            else:
+                duplicates.append((article, *match))
+                article_ids.append(match[0])
+        cursor.copy_expert(
+            f"COPY articles ({', '.join(columns)}) FROM STDIN",
+            CopyReader(originals, columns),
+            size=COPY_BUFFER_SIZE,
+        )
+    if duplicates:
+        cursor.execute(INSERT_DUPLICATES_SQL, (
+            [original_id for _, original_id, _, _ in duplicates],
+            [article.get("website") for article, _, _, _ in duplicates],
+            [article.get("title") for article, _, _, _ in duplicates],
+            [article.get("date") for article, _, _, _ in duplicates],
+            [match for _, _, match, _ in duplicates],
+            [score for _, _, _, score in duplicates],
+        ))
+    return article_ids, len(duplicates)
+
+
+def store_fingerprints(cursor, rows):
+    """
+    Fingerprint stored articles as part of the caller's transaction.
+
+    The fingerprints are calculated in Python, so they are copied into a temporary table and the articles
+    are updated from it with one statement.
+
+    Args:
+        cursor: The cursor of the transaction.
+        rows (list): The (article_id, website, content) tuples of the articles.
+
+    Returns:
+        int: The number of updated articles.
+    """
+    columns = ["article_id", *FINGERPRINT_COLUMNS]
+    fingerprints = dedup.fingerprints((website, content) for _, website, content in rows)
+    cursor.execute("""
+        CREATE TEMP TABLE article_fingerprints (
+        article_id INTEGER, website_key TEXT, content_hash BYTEA, minhash BYTEA, lsh_buckets BIGINT[]
+        ) ON COMMIT DROP
+    """)
+    cursor.copy_expert(f"COPY article_fingerprints ({', '.join(columns)}) FROM STDIN",
+                       CopyReader(({"article_id": row[0], **fingerprint} for row, fingerprint in zip(rows, fingerprints)),
+                                  columns),
+                       size=COPY_BUFFER_SIZE)
+    cursor.execute(f"""
+        UPDATE articles a SET {", ".join(f"{column} = f.{column}" for column in FINGERPRINT_COLUMNS)}
+        FROM article_fingerprints f WHERE a.article_id = f.article_id
+    """)
+    return cursor.rowcount
+
+
+def fingerprint_articles():
+    """
+    Fingerprint the articles inserted without looking for duplicates, see `insert_articles_bulk`, so that
+    the articles inserted after them are compared with them.
+
+    The articles are fingerprinted in batches of `DEDUP_CHUNK_SIZE`, each in its own transaction. Articles
+    locked by a concurrent call are skipped.
+
+    Returns:
+        int: The number of fingerprinted articles.
+    """
+    fingerprinted = 0
+    while True:
+        with connection() as conn, conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT article_id, website, content FROM articles WHERE lsh_buckets IS NULL "
+                "ORDER BY article_id LIMIT %s FOR UPDATE SKIP LOCKED",
+                (DEDUP_CHUNK_SIZE,),
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                return fingerprinted
+            fingerprinted += store_fingerprints(cursor, rows)
+            conn.commit()
 
 
 def insert_incident(incident):
@@ -280,41 +1332,29 @@ def insert_incident(incident):
         Exception: If an error occurs during the insertion process.
     """
     try:
-        conn = psycopg2.connect(**params)
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            INSERT INTO incidents (title,verified, date, number_dead, number_missing, number_survivors, country_of_origin, region_of_origin, cause_of_death, region_of_incident, country_of_incident, location_of_incident, latitude, longitude) 
-            VALUES (%s,%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING incident_id
-            """,
-            (
-                incident["title"],
-                incident["verified"],
-                incident["date"],
-                incident["number_dead"],
-                incident["number_missing"],
-                incident["number_survivors"],
-                incident["country_of_origin"],
-                incident["region_of_origin"],
-                incident["cause_of_death"],
-                incident["region_of_incident"],
-                incident["country_of_incident"],
-                incident["location_of_incident"],
-                incident["latitude"],
-                incident["longitude"],
-            ),
-        )
-        incident_id = cursor.fetchone()[0]
-        conn.commit()
-        print("Record inserted successfully")
-        return incident_id
+        with connection() as conn, conn.cursor() as cursor:
+            incident_id = insert_incident_row(cursor, incident)
+            notify_change(cursor, "incidents")
+            conn.commit()
+            print("Record inserted successfully")
+            return incident_id
     except Exception as e:
         print("An error occurred:", e)
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
+
+
+def insert_incident_row(cursor, incident):
+    """
+    Inserts an incident record as part of the caller's transaction.
+
+    Args:
+        cursor: The cursor of the transaction.
+        incident (dict): A dictionary containing the details of the incident, see `insert_incident`.
+
+    Returns:
+        int: The incident ID of the inserted record.
+    """
+    cursor.execute(INSERT_INCIDENT_SQL, [incident[column] for column in INCIDENT_INSERT_COLUMNS])
+    return cursor.fetchone()[0]
 
 
 def insert_mapping(incident_id, article_id):
@@ -329,23 +1369,13 @@ def insert_mapping(incident_id, article_id):
     None
     """
     try:
-        conn = psycopg2.connect(**params)
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            INSERT INTO mapping (incident_id, article_id) 
-            VALUES (%s, %s)
-            """,
-            (incident_id, article_id),
-        )
-        conn.commit()
-        print("Record inserted successfully")
+        with connection() as conn, conn.cursor() as cursor:
+            cursor.execute(INSERT_MAPPING_SQL, (incident_id, article_id))
+            notify_change(cursor, "mapping", incident_id)
+            conn.commit()
+            print("Record inserted successfully")
     except Exception as e:
         print("An error occurred:", e)
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
 
 
 def get_all_incidents():
@@ -356,17 +1386,12 @@ def get_all_incidents():
         list: A list of tuples representing the incidents.
     """
     try:
-        conn = psycopg2.connect(**params)
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM Incidents")
-        incidents = cursor.fetchall()
-        return incidents
+        with connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT * FROM Incidents")
+            incidents = cursor.fetchall()
+            return incidents
     except Exception as e:
         print("An error occurred:", e)
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
 
 
 def get_all_articles():
@@ -377,17 +1402,107 @@ def get_all_articles():
         list: A list of tuples representing the articles.
     """
     try:
-        conn = psycopg2.connect(**params)
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM articles")
-        articles = cursor.fetchall()
-        return articles
+        with connection() as conn, conn.cursor() as cursor:
+            cursor.execute(f"SELECT {', '.join(ARTICLES_COLUMNS)} FROM articles")
+            articles = cursor.fetchall()
+            return articles
     except Exception as e:
         print("An error occurred:", e)
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
+
+
+async def insert_article_async(article):
+    """
+    Insert an article into the 'articles' table, using the shared asyncpg pool.
+    Several calls can run concurrently, e.g. with `asyncio.gather`.
+
+    If the article is a duplicate of a stored article, it is recorded in 'article_duplicates' instead,
+    as by `insert_articles_rows`.
+
+    Args:
+        article (dict): A dictionary containing the article data.
+
+    Returns:
+        int: The article ID of the inserted record, or of the original of a duplicate.
+    """
+    fingerprint = dedup.fingerprint(article.get("website"), article.get("content"))
+    pool = await async_pool()
+    async with pool.acquire() as conn, conn.transaction():
+        await conn.execute("SELECT pg_advisory_xact_lock($1)", DEDUP_LOCK_ID)
+        index = dedup.DuplicateIndex()
+        for row in await conn.fetch(numbered_placeholders(DUPLICATE_CANDIDATES_SQL), *dedup.lookup_keys([fingerprint])):
+            index.add(row["article_id"], dict(row))
+        match = index.find(fingerprint)
+        if match is not None:
+            await conn.execute(
+                numbered_placeholders(INSERT_DUPLICATES_SQL),
+                [match[0]], [article.get("website")], [article.get("title")], async_values(article, ["date"]),
+                [match[1]], [match[2]],
+            )
+            return match[0]
+        article_id = await conn.fetchval(
+            numbered_placeholders(INSERT_ARTICLE_SQL) + " RETURNING article_id",
+            *async_values(article, ARTICLE_INSERT_COLUMNS), *(fingerprint[column] for column in FINGERPRINT_COLUMNS),
+        )
+        await notify_change_async(conn, "articles")
+    return article_id
+
+
+async def insert_incident_async(incident):
+    """
+    Insert an incident into the 'incidents' table, using the shared asyncpg pool.
+
+    Args:
+        incident (dict): A dictionary containing the details of the incident, see `insert_incident`.
+
+    Returns:
+        int: The incident ID of the inserted record.
+    """
+    pool = await async_pool()
+    async with pool.acquire() as conn, conn.transaction():
+        incident_id = await conn.fetchval(
+            numbered_placeholders(INSERT_INCIDENT_SQL), *async_values(incident, INCIDENT_INSERT_COLUMNS)
+        )
+        await notify_change_async(conn, "incidents")
+    return incident_id
+
+
+async def insert_mapping_async(incident_id, article_id):
+    """
+    Insert a mapping record into the 'mapping' table, using the shared asyncpg pool.
+
+    Args:
+        incident_id (int): The ID of the incident.
+        article_id (int): The ID of the article.
+
+    Returns:
+        None
+    """
+    pool = await async_pool()
+    async with pool.acquire() as conn, conn.transaction():
+        await conn.execute(numbered_placeholders(INSERT_MAPPING_SQL), incident_id, article_id)
+        await notify_change_async(conn, "mapping", incident_id)
+
+
+async def get_all_incidents_async():
+    """
+    Retrieve all incidents from the database, using the shared asyncpg pool.
+
+    Returns:
+        list: A list of records representing the incidents.
+    """
+    pool = await async_pool()
+    return await pool.fetch("SELECT * FROM incidents")
+
+
+async def get_all_articles_async():
+    """
+    Retrieve all articles from the database, using the shared asyncpg pool.
+
+    Returns:
+        list: A list of records representing the articles.
+    """
+    pool = await async_pool()
+    return await pool.fetch(f"SELECT {', '.join(ARTICLES_COLUMNS)} FROM articles")
 
 
 # dummy data for a single incident
@@ -446,25 +1561,36 @@ def days_between(d1, d2):
     return abs((d2 - d1).days)
 
 
-def is_close_location(
-    loc1, loc2, threshold=50
-):  # Dummy function, replace with real geospatial logic
-    pass  # future work: implement this function to check if two locations are close
+def is_close_location(loc1, loc2, threshold=grouping.DISTANCE_THRESHOLD_KM):
+    """
+    Check if two locations are close to each other.
+
+    Parameters:
+    loc1 (tuple): The (latitude, longitude) of the first location in degrees.
+    loc2 (tuple): The (latitude, longitude) of the second location in degrees.
+    threshold (float): The maximum distance in kilometres.
+
+    Returns:
+    bool: True if the great-circle distance between the locations is at most `threshold`.
+    """
+    return bool(grouping.haversine_km(loc1[0], loc1[1], loc2[0], loc2[1]) <= threshold)
 
 
 # Function to group similar articles
 def are_similar_articles(article1, article2):
-    date_similarity = days_between(article1[1], article2[1]) <= 3
-    return date_similarity
-
-    # future work:
-    # location_similarity = is_close_location(article1[3], article2[3])
-    # return date_similarity and location_similarity
+    date_similarity = days_between(article1[1], article2[1]) <= grouping.DATE_WINDOW_DAYS
+    loc1, loc2 = grouping.location_of(article1), grouping.location_of(article2)
+    if loc1 is None or loc2 is None:
+        # articles without coordinates are only compared with each other, by date
+        return date_similarity and loc1 is None and loc2 is None
+    location_similarity = is_close_location(loc1, loc2)
+    return date_similarity and location_similarity
 
 
 def group_articles(articles):
     """
     Groups similar articles together based on a similarity criterion.
+    See `grouping.group_articles` for the criterion.
 
     Args:
         articles (list): A list of articles to be grouped.
@@ -472,28 +1598,18 @@ def group_articles(articles):
     Returns:
         list: A list of groups, where each group is a list of article IDs.
     """
-    groups = []
-    used = set()
-    for i, article1 in enumerate(articles):
-        if i in used:
-            continue
-        current_group = [article1[0]]
-        for j, article2 in enumerate(articles[i + 1 :], start=i + 1):
-            if j in used:
-                continue
-            if are_similar_articles(article1, article2):
-                current_group.append(article2[0])
-                used.add(j)
-        groups.append(current_group)
-        used.add(i)
-    print(groups)
+    groups = grouping.group_articles(articles)
+    print(f"Grouped {len(articles)} articles into {len(groups)} groups")
     return groups
 
 
-def get_articles():
+def get_articles(after_id=0):
     """
     Retrieve all articles but only some attributes relevant for the grouping.
 
+    Args:
+        after_id (int): Only retrieve articles with a greater article ID.
+
     Returns:
         list: A list of tuples representing the articles. Each tuple contains the following information:
             - article_id: The ID of the article.
@@ -502,105 +1618,289 @@ def get_articles():
             - location_of_incident: The location of the incident mentioned in the article.
             - country_of_incident: The country of the incident mentioned in the article.
             - region_of_incident: The region of the incident mentioned in the article.
+            - latitude: The latitude of the incident mentioned in the article.
+            - longitude: The longitude of the incident mentioned in the article.
     """
     try:
-        conn = psycopg2.connect(**params)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT article_id, date, cause_of_death, location_of_incident, country_of_incident, region_of_incident FROM articles"
-        )
-        articles = cursor.fetchall()
-        print(articles)
-        return articles
+        with connection() as conn, conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT article_id, date, cause_of_death, location_of_incident, country_of_incident, region_of_incident, latitude, longitude FROM articles WHERE article_id > %s ORDER BY article_id",
+                (after_id,),
+            )
+            articles = cursor.fetchall()
+            print(f"Retrieved {len(articles)} articles")
+            return articles
+    except Exception as e:
+        print("An error occurred:", e)
+
+
+def get_unprocessed_articles():
+    """
+    Retrieve the articles not processed by `process_articles` yet, with the attributes of `get_articles`.
+
+    Returns:
+        list: A list of article tuples, see `get_articles`, in the order of their IDs.
+    """
+    try:
+        with connection() as conn, conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT article_id, date, cause_of_death, location_of_incident, country_of_incident, region_of_incident, latitude, longitude FROM unprocessed_articles JOIN articles USING (article_id) ORDER BY article_id"
+            )
+            articles = cursor.fetchall()
+            print(f"Retrieved {len(articles)} articles")
+            return articles
+    except Exception as e:
+        print("An error occurred:", e)
+
+
+def get_incidents_in(date_ranges):
+    """
+    Retrieve the incidents in date ranges, with the same attributes as `get_articles` retrieves for articles.
+
+    The ranges are joined with 'incidents' in one query, which looks up every range in the date index.
+
+    Args:
+        date_ranges (list): The disjoint (first, last) date ranges, see `grouping.date_windows`.
+
+    Returns:
+        list: A list of tuples (incident_id, date, cause_of_death, location_of_incident, country_of_incident,
+              region_of_incident, latitude, longitude).
+    """
+    try:
+        with connection() as conn, conn.cursor() as cursor:
+            cursor.execute(INCIDENTS_IN_RANGES_SQL, ([first for first, _ in date_ranges], [last for _, last in date_ranges]))
+            return cursor.fetchall()
     except Exception as e:
         print("An error occurred:", e)
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
+
+
+def mark_processed(cursor, article_ids):
+    """
+    Remove processed articles from the queue of `process_articles` as part of the caller's transaction.
+
+    Args:
+        cursor: The cursor of the transaction.
+        article_ids (list): The IDs of the processed articles.
+
+    Returns:
+        None
+    """
+    cursor.execute("DELETE FROM unprocessed_articles WHERE article_id = ANY(%s)", (article_ids,))
+
+
+def attach_articles(matches):
+    """
+    Maps articles to existing incidents.
+
+    Args:
+        matches (dict): A mapping of article IDs to the ID of their incident.
+
+    Returns:
+        None
+    """
+    with connection() as conn, conn.cursor() as cursor:
+        attach_articles_rows(cursor, matches)
+        notify_change(cursor, "mapping")
+        conn.commit()
+
+
+def attach_articles_rows(cursor, matches):
+    """
+    Maps articles to existing incidents as part of the caller's transaction.
+
+    Args:
+        cursor: The cursor of the transaction.
+        matches (dict): A mapping of article IDs to the ID of their incident.
+
+    Returns:
+        None
+    """
+    if matches:
+        cursor.execute(
+            """
+            INSERT INTO mapping (article_id, incident_id)
+            SELECT * FROM unnest(%s::int[], %s::int[])
+            ON CONFLICT DO NOTHING
+            """,
+            (list(matches.keys()), list(matches.values())),
+        )
 
 
 def update_incident_mappings(grouped_articles, articles):
     """
     Updates the incident mappings in the database based on the provided grouped articles.
 
+    Creates one incident per group, copying the details of the group's first article, and maps all
+    articles of the group to it, in a single transaction.
+
     Args:
         grouped_articles (list): A list of lists, where each inner list represents a group of article IDs.
         articles (list): A list of article IDs.
 
     Returns:
-        None
+        list: The IDs of the new incidents, one per group.
     """
-    conn = psycopg2.connect(**params)
-    cursor = conn.cursor(cursor_factory=DictCursor)
     try:
-        for group in grouped_articles:
-            cursor.execute(
-                "SELECT * FROM articles where article_id = %s", (str(group[0]),)
-            )
-            first = cursor.fetchone()
-            first_dict = dict(first)
-            incident = {
-                "title": first_dict["title"],
-                "verified": True,
-                "date": first_dict["date"],
-                "number_dead": first_dict["number_dead"],
-                "number_missing": first_dict["number_missing"],
-                "number_survivors": first_dict["number_survivors"],
-                "country_of_origin": first_dict["country_of_origin"],
-                "region_of_origin": first_dict["region_of_origin"],
-                "cause_of_death": first_dict["cause_of_death"],
-                "region_of_incident": first_dict["region_of_incident"],
-                "country_of_incident": first_dict["country_of_incident"],
-                "location_of_incident": first_dict["location_of_incident"],
-                "latitude": first_dict["latitude"],
-                "longitude": first_dict["longitude"],
-            }
-            incident_id = insert_incident(incident)
-            print("New incident ID:", incident_id)
-            for article_id in group:
-                cursor.execute(
-                    "INSERT INTO mapping (article_id, incident_id) VALUES (%s, %s)",
-                    (article_id, incident_id),
-                )
-        conn.commit()
+        with connection() as conn, conn.cursor() as cursor:
+            incident_ids = insert_incidents_rows(cursor, grouped_articles)
+            notify_change(cursor, "mapping")
+            conn.commit()
+            return incident_ids
     except Exception as e:
         print("Database update failed:", e)
-        conn.rollback()
-    finally:
-        cursor.close()
-        conn.close()
+        raise
+
+
+def insert_incidents_rows(cursor, grouped_articles):
+    """
+    Creates the incidents of groups of articles as part of the caller's transaction.
+
+    All incidents are inserted with one INSERT ... SELECT that copies the details of the first article
+    of every group, and all mappings with one more INSERT, regardless of the number of groups.
+
+    Args:
+        cursor: The cursor of the transaction.
+        grouped_articles (list): A list of lists, where each inner list represents a group of article IDs.
 
+    Returns:
+        list: The IDs of the new incidents, one per group.
 
-def process_articles():
+    Raises:
+        Exception: If the first article of a group does not exist.
+    """
+    if not grouped_articles:
+        return []
+    leaders = [group[0] for group in grouped_articles]
+    copied_columns = ", ".join("TRUE" if column == "verified" else f"a.{column}" for column in INCIDENT_INSERT_COLUMNS)
+    cursor.execute(
+        f"""
+        INSERT INTO incidents ({", ".join(INCIDENT_INSERT_COLUMNS)})
+        SELECT {copied_columns}
+        FROM unnest(%s::int[]) WITH ORDINALITY AS leader (article_id, position)
+        JOIN articles a ON a.article_id = leader.article_id
+        ORDER BY leader.position
+        RETURNING incident_id
+        """,
+        (leaders,),
+    )
+    # serial IDs are assigned in insertion order, i.e. in the order of the groups
+    incident_ids = sorted(row[0] for row in cursor.fetchall())
+    if len(incident_ids) != len(grouped_articles):
+        raise Exception("The first article of a group does not exist")
+    mapping_incidents = [incident_id for incident_id, group in zip(incident_ids, grouped_articles) for _ in group]
+    mapping_articles = [article_id for group in grouped_articles for article_id in group]
+    cursor.execute(
+        "INSERT INTO mapping (incident_id, article_id) SELECT * FROM unnest(%s::int[], %s::int[])",
+        (mapping_incidents, mapping_articles),
+    )
+    print(f"Created {len(incident_ids)} incidents")
+    return incident_ids
+
+
+def process_articles(full=False, progress=None):
     """
     Process articles by retrieving them, grouping them, and updating incident mappings.
-    For now this function deletes all mappings before creating new ones.
 
-    This function performs the following steps:
-    1. Retrieves articles using the `get_articles` function.
-    2. Groups the articles using the `group_articles` function.
-    3. Updates incident mappings using the `update_incident_mappings` function.
+    By default only the articles queued since the last run are processed, see `ARTICLE_QUEUE_SQL`: articles
+    matching an existing incident in time and space (see `grouping.match_articles_to_incidents`) are mapped
+    to it, and the remaining ones are grouped into new incidents. The cost of a run therefore depends on the number of
+    new articles only. With `full=True`, all incidents and mappings are deleted and every article is regrouped.
+    All changes of a run are written in a single transaction, and only one run happens at a time
+    (see `processing_lock`).
+
+    This function performs the following steps (`PROCESSING_STEPS`):
+    1. fetch: Fingerprints the articles bulk loaded without looking for duplicates (`fingerprint_articles`),
+       and retrieves the queued articles using the `get_unprocessed_articles` function.
+    2. match: Matches them against existing incidents using `grouping.match_articles_to_incidents`.
+    3. group: Groups the other articles using the `group_articles` function.
+    4. write: Maps the matching articles, creates the incidents of the groups and removes the processed
+       articles from the queue.
+
+    Args:
+        full (bool): Whether to delete all incidents and regroup all articles.
+        progress (callable, optional): Called after each step with the name of the step and the
+            statistics so far.
+
+    Returns:
+        dict: The statistics of the run: the number of `fingerprinted_articles`, of processed `articles`,
+              of `matched_articles` mapped to existing incidents, of `grouped_articles` and of
+              `incidents_created`, and the `seconds` taken by each step.
+
+    Raises:
+        ProcessingLocked: If another run is in progress.
+    """
+    stats = {"full": full, "fingerprinted_articles": 0, "articles": 0, "matched_articles": 0, "grouped_articles": 0, "incidents_created": 0,
+             "seconds": {}}
+    started = time.perf_counter()
+
+    def finish(step):
+        nonlocal started
+        now = time.perf_counter()
+        stats["seconds"][step] = round(now - started, 3)
+        started = now
+        if progress is not None:
+            progress(step, stats)
+
+    with processing_lock():
+        stats["fingerprinted_articles"] = fingerprint_articles()
+        articles = get_articles() if full else get_unprocessed_articles()
+        stats["articles"] = len(articles)
+        if not articles and not full:
+            finish("fetch")
+            print("No new articles to process")
+            return stats
+        # Only the incidents near the date of an article can match, so a batch with a backdated article
+        # fetches two short ranges instead of all incidents in between
+        date_ranges = grouping.date_windows(articles)
+        incidents = []
+        if date_ranges and not full:
+            incidents = get_incidents_in(date_ranges)
+        finish("fetch")
+        matches, unmatched = grouping.match_articles_to_incidents(articles, incidents)
+        stats["matched_articles"] = len(matches)
+        finish("match")
+        grouped_articles = group_articles(unmatched)
+        stats["grouped_articles"] = len(unmatched)
+        stats["incidents_created"] = len(grouped_articles)
+        finish("group")
+        with connection() as conn, conn.cursor() as cursor:
+            if full:
+                cursor.execute(DELETE_INCIDENTS_SQL)
+            attach_articles_rows(cursor, matches)
+            insert_incidents_rows(cursor, grouped_articles)
+            mark_processed(cursor, [article[0] for article in articles])
+            notify_change(cursor, "incidents")
+            conn.commit()
+        finish("write")
+    print(f"Mapped {len(matches)} articles to existing incidents and {len(unmatched)} articles to new incidents")
+    return stats
+
+
+def delete_incidents():
+    """
+    Deletes all incidents and their mappings to articles.
 
-    This function does not return any value.
+    Returns:
+        None
     """
-    delete_table("mapping")
-    create_mapping_table()
-    articles = get_articles()
-    grouped_articles = group_articles(articles)
-    update_incident_mappings(grouped_articles, articles)
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute(DELETE_INCIDENTS_SQL)
+        notify_change(cursor, "incidents")
+        conn.commit()
 
 
-# Call this function to process the articles
+# Call this function to process the articles, or start a job with `POST /jobs/reprocess` of the API
 # process_articles()
 
 
 def delete_entries():
     """
-    To reset the database, this function deletes entries from the 'mapping', 'articles', and 'incidents' tables.
-    Then recreates the 'articles', 'incidents', and 'mapping' tables.
+    To reset the database, this function deletes entries from the 'mapping', 'article_duplicates', 'articles', and 'incidents' tables.
+    Then recreates the 'articles', 'incidents', and 'mapping' tables and the queue of `process_articles`.
     """
     delete_table("mapping")
+    delete_table("unprocessed_articles")
+    delete_table("article_duplicates")
     delete_table("articles")
     delete_table("incidents")
     create_articles_table()
@@ -0,0 +1,313 @@
+import hashlib
+import os
+import re
+import zlib
+from collections import defaultdict
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import numpy as np
+
+"""
+This file contains the engine that detects duplicate and near-duplicate articles at ingestion.
+
+Every article gets a fingerprint of three parts:
+- `website_key`, its URL without scheme, 'www.', default port, fragment, trailing slash and tracking
+  parameters, so that the same page scraped under different URLs has the same key;
+- `content_hash`, a hash of the words of its content, ignoring case, punctuation and whitespace;
+- `minhash`, a MinHash signature of the word shingles of its content, whose share of equal values
+  estimates the Jaccard similarity of the contents of two articles. The signature is cut into `BANDS`
+  bands, and every band is hashed into one of the `lsh_buckets` of the article. Articles whose
+  similarity reaches `NEAR_DUPLICATE_THRESHOLD` share a bucket with high probability, so near-duplicates
+  are found by looking up the buckets of an article in an index instead of comparing it to every article.
+
+Contents shorter than `MIN_CONTENT_WORDS` words, e.g. teasers of paywalled pages, are too alike to tell
+apart, so they only get a `website_key`.
+"""
+
+# Number of values of a MinHash signature, and how they are cut into bands of the LSH index.
+# With 16 bands of 8 values, articles of similarity 0.8 share a bucket with probability 0.95,
+# articles of similarity 0.5 with probability 0.06.
+NUM_PERMUTATIONS = 128
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+# Number of consecutive words of a shingle
+SHINGLE_SIZE = 5
+# Minimum estimated similarity of the contents of near-duplicates
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", 0.8))
+# Minimum number of words of a content to be compared
+MIN_CONTENT_WORDS = int(os.environ.get("DEDUP_MIN_WORDS", 50))
+# Query parameters that only track where a visitor came from
+TRACKING_PARAMETERS = re.compile(r"^(utm_.*|fbclid|gclid|dclid|msclkid|mc_cid|mc_eid|ref|ref_src|cmpid|at_medium|at_campaign)$")
+
+# Multiplier combining the hashes of the words of a shingle
+SHINGLE_BASE = 1000003
+# Number of shingles permuted at once by `minhashes`, which takes NUM_PERMUTATIONS * 4 bytes per shingle
+MINHASH_SLICE_SHINGLES = 16384
+# A word of a content
+WORD = re.compile(r"\w+")
+
+
+def hash_coefficients(count, size=4, prefix="minhash"):
+    """
+    Derive the coefficients of the hash functions of the signature and of its bands.
+
+    Signatures and buckets are stored, so the coefficients must never change; they are derived from a
+    fixed string instead of a random generator, whose streams may differ between NumPy versions.
+
+    Returns:
+        numpy.ndarray: `count` unsigned integers of `size` bytes.
+    """
+    return np.array([int.from_bytes(hashlib.blake2b(f"{prefix}-{i}".encode(), digest_size=size).digest(), "little")
+                     for i in range(count)], dtype=np.dtype(f"u{size}"))
+
+
+# Hash function i of the signature maps a 32-bit shingle hash x to (A[i] * x + B[i]) mod 2**32, which is a
+# permutation of the 32-bit integers for odd A[i]. Wrapping 32-bit arithmetic keeps the signature cheap.
+A = hash_coefficients(NUM_PERMUTATIONS) | np.uint32(1)
+B = hash_coefficients(2 * NUM_PERMUTATIONS)[NUM_PERMUTATIONS:]
+# The bucket of a band is hashed from the values of the band, starting from the seed of the band and
+# mixing in one value after the other with a wrapping 64-bit multiplication.
+BAND_SEEDS = hash_coefficients(BANDS, size=8, prefix="band")
+BUCKET_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def normalize_url(url):
+    """
+    Reduce a URL to the key under which duplicates of its page are found.
+
+    Args:
+        url (str): The URL, with or without scheme.
+
+    Returns:
+        str: The key, e.g. 'example.org/news/a?id=1' for 'https://www.Example.org/news/a/?utm_source=x&id=1#top',
+             or None if the URL is empty.
+    """
+    url = (url or "").strip()
+    if not url:
+        return None
+    parts = urlsplit(url if re.match(r"^([a-z][a-z0-9+.-]*:)?//", url, re.IGNORECASE) else "//" + url)
+    host = (parts.hostname or "").rstrip(".")
+    if host.startswith("www."):
+        host = host[len("www."):]
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and port not in (80, 443):
+        host = f"{host}:{port}"
+    path = re.sub(r"/+", "/", parts.path).rstrip("/")
+    query = sorted((name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if not TRACKING_PARAMETERS.match(name.lower()))
+    return host + path + ("?" + urlencode(query) if query else "")
+
+
+def content_words(content):
+    """
+    Returns:
+        list: The lowercase words of a content.
+    """
+    return WORD.findall((content or "").lower())
+
+
+def content_hash(words):
+    """
+    Returns:
+        bytes: A 16-byte hash of the words of a content.
+    """
+    return hashlib.blake2b(" ".join(words).encode(), digest_size=16).digest()
+
+
+class WordHashes(dict):
+    """
+    The CRC-32 of words, calculated once per distinct word. Contents share most of their words, so a batch of
+    articles mostly looks its words up instead of hashing them.
+    """
+
+    def __missing__(self, word):
+        self[word] = value = zlib.crc32(word.encode())
+        return value
+
+
+def minhashes(word_lists):
+    """
+    Calculate the MinHash signatures of the shingles of several contents at once.
+
+    The hash of a shingle is combined from the CRC-32 of its words, so every word is hashed once and the
+    shingles of all contents are hashed and permuted together with NumPy, in slices of about
+    `MINHASH_SLICE_SHINGLES` shingles.
+
+    Args:
+        word_lists (list): The words of every content, at least `SHINGLE_SIZE` per content.
+
+    Returns:
+        numpy.ndarray: One row per content, its signature of `NUM_PERMUTATIONS` unsigned 32-bit integers.
+    """
+    signatures = np.empty((len(word_lists), NUM_PERMUTATIONS), dtype="<u4")
+    word_hashes = WordHashes()
+    first = 0
+    while first < len(word_lists):
+        last = first + 1
+        total = len(word_lists[first])
+        while last < len(word_lists) and total + len(word_lists[last]) <= MINHASH_SLICE_SHINGLES:
+            total += len(word_lists[last])
+            last += 1
+        words = [word for word_list in word_lists[first:last] for word in word_list]
+        hashes = np.fromiter(map(word_hashes.__getitem__, words), dtype=np.uint32, count=len(words))
+        # Shingles start at every word, those crossing into the next content are skipped
+        count = len(words) - SHINGLE_SIZE + 1
+        shingles = np.zeros(count, dtype=np.uint32)
+        for offset in range(SHINGLE_SIZE):
+            shingles = shingles * np.uint32(SHINGLE_BASE) + hashes[offset:offset + count]
+        lengths = np.array([len(word_list) for word_list in word_lists[first:last]])
+        ends = np.cumsum(lengths)
+        keep = np.concatenate([np.arange(end - length, end - SHINGLE_SIZE + 1) for end, length in zip(ends, lengths)])
+        permuted = np.multiply.outer(A, shingles[keep])
+        permuted += B[:, None]
+        starts = np.concatenate(([0], np.cumsum(lengths - SHINGLE_SIZE + 1)[:-1]))
+        signatures[first:last] = np.minimum.reduceat(permuted, starts, axis=1).T
+        first = last
+    return signatures
+
+
+def lsh_buckets(signatures):
+    """
+    Hash the bands of signatures into buckets. Every band starts from its own seed, so buckets of
+    different bands practically never collide and all buckets can be kept in one index.
+
+    Args:
+        signatures (numpy.ndarray): One signature per row, see `minhashes`.
+
+    Returns:
+        numpy.ndarray: One row per signature, a signed 64-bit bucket per band.
+    """
+    bands = signatures.reshape(len(signatures), BANDS, ROWS_PER_BAND).astype(np.uint64)
+    buckets = np.repeat(BAND_SEEDS[None, :], len(signatures), axis=0)
+    for row in range(ROWS_PER_BAND):
+        buckets = (buckets + bands[:, :, row]) * BUCKET_MULTIPLIER
+        buckets ^= buckets >> np.uint64(29)
+    return buckets.view(np.int64)
+
+
+def similarity(signature1, signature2):
+    """
+    Returns:
+        float: The estimated Jaccard similarity of the shingles of two signatures.
+    """
+    return float(np.mean(signature1 == signature2))
+
+
+def fingerprints(articles):
+    """
+    Calculate the fingerprints of articles.
+
+    Args:
+        articles (iterable): Pairs of the URL and the content of every article.
+
+    Returns:
+        list: For every article a dict of its `website_key`, `content_hash` and `minhash`, with the keys of
+              their columns in the 'articles' table, and its `lsh_buckets`. Parts that do not apply are None,
+              the buckets an empty list.
+    """
+    results = []
+    compared = []
+    for website, content in articles:
+        words = content_words(content)
+        results.append({"website_key": normalize_url(website), "content_hash": None, "minhash": None,
+                        "lsh_buckets": []})
+        if len(words) >= MIN_CONTENT_WORDS:
+            results[-1]["content_hash"] = content_hash(words)
+            compared.append((results[-1], words))
+    signatures = minhashes([words for _, words in compared])
+    for (result, _), signature, buckets in zip(compared, signatures, lsh_buckets(signatures).tolist()):
+        result["minhash"] = signature.tobytes()
+        result["lsh_buckets"] = buckets
+    return results
+
+
+def fingerprint(website, content):
+    """
+    Calculate the fingerprint of an article, see `fingerprints`.
+
+    Args:
+        website (str): The URL of the article.
+        content (str): The content of the article.
+
+    Returns:
+        dict: The fingerprint of the article.
+    """
+    return fingerprints([(website, content)])[0]
+
+
+def lookup_keys(fingerprints):
+    """
+    Collect what to look up in the index of the stored articles to find the candidates for duplicates.
+
+    Returns:
+        tuple: The lists of distinct website keys, content hashes and LSH buckets of the fingerprints.
+    """
+    return (
+        list({item["website_key"] for item in fingerprints if item["website_key"] is not None}),
+        list({item["content_hash"] for item in fingerprints if item["content_hash"] is not None}),
+        list({bucket for item in fingerprints for bucket in item["lsh_buckets"]}),
+    )
+
+
+class DuplicateIndex:
+    """
+    An in-memory index of the fingerprints of articles, by website key, content hash and LSH bucket.
+
+    It is filled with the candidates found in the database for a batch of new articles, and with the
+    new articles themselves as they are accepted, so that duplicates within a batch are found as well.
+    """
+
+    def __init__(self):
+        self.websites = {}
+        self.contents = {}
+        self.buckets = defaultdict(list)
+        self.signatures = {}
+
+    def add(self, article_id, fingerprint):
+        """
+        Add an article. Of several articles with the same key, the first one added stays the original.
+
+        Args:
+            article_id (int): The ID of the article.
+            fingerprint (dict): The fingerprint of the article, see `fingerprint`.
+
+        Returns:
+            None
+        """
+        if fingerprint["website_key"] is not None:
+            self.websites.setdefault(fingerprint["website_key"], article_id)
+        if fingerprint["content_hash"] is not None:
+            self.contents.setdefault(bytes(fingerprint["content_hash"]), article_id)
+        if fingerprint["minhash"] is not None:
+            self.signatures[article_id] = np.frombuffer(fingerprint["minhash"], dtype="<u4")
+            for bucket in fingerprint["lsh_buckets"] or ():
+                self.buckets[bucket].append(article_id)
+
+    def find(self, fingerprint):
+        """
+        Find the original of an article among the indexed articles.
+
+        Args:
+            fingerprint (dict): The fingerprint of the article, see `fingerprint`.
+
+        Returns:
+            tuple: The ID of the original, how it matched ('website', 'content' or 'near') and the estimated
+                   similarity of the contents, or None if the article is no duplicate.
+        """
+        if fingerprint["website_key"] in self.websites:
+            return self.websites[fingerprint["website_key"]], "website", 1.0
+        if fingerprint["content_hash"] is not None and fingerprint["content_hash"] in self.contents:
+            return self.contents[fingerprint["content_hash"]], "content", 1.0
+        if fingerprint["minhash"] is None:
+            return None
+        candidates = {article_id for bucket in fingerprint["lsh_buckets"] for article_id in self.buckets.get(bucket, ())}
+        signature = np.frombuffer(fingerprint["minhash"], dtype="<u4")
+        best = None
+        for article_id in sorted(candidates):
+            score = similarity(signature, self.signatures[article_id])
+            if score >= NEAR_DUPLICATE_THRESHOLD and (best is None or score > best[2]):
+                best = (article_id, "near", score)
+        return best
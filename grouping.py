@@ -0,0 +1,282 @@
+import os
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+import numpy as np
+
+"""
+This file contains the engine that groups articles reporting on the same incident.
+
+Articles are tuples as returned by `db_operations.get_articles`:
+(article_id, date, cause_of_death, location_of_incident, country_of_incident, region_of_incident, latitude, longitude).
+Only the ID and date are required; articles without a latitude/longitude are grouped by date alone.
+"""
+
+# Articles dated at most this many days after the first article of a group belong to the group
+DATE_WINDOW_DAYS = int(os.environ.get("GROUPING_WINDOW_DAYS", 3))
+# ... and, if both have coordinates, must be at most this far away from it
+DISTANCE_THRESHOLD_KM = float(os.environ.get("GROUPING_DISTANCE_KM", 50))
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Offsets of a grid cell and its 26 neighbours
+NEIGHBOUR_OFFSETS = [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)]
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Calculate the great-circle distance between points, element-wise over NumPy arrays.
+
+    Parameters:
+    lat1, lon1: The latitude and longitude of the first point(s) in degrees.
+    lat2, lon2: The latitude and longitude of the second point(s) in degrees.
+
+    Returns:
+    numpy.ndarray: The distances in kilometres.
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=float)) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def location_of(article):
+    """
+    Returns:
+        tuple: The (latitude, longitude) of an article as floats, or None if it has no coordinates.
+    """
+    if len(article) < 8 or article[6] is None or article[7] is None:
+        return None
+    return float(article[6]), float(article[7])
+
+
+def grid_cells(lat, lon, cell_km):
+    """
+    Assign points to the cells of a cubic grid over their 3D positions on the earth's surface.
+
+    Two points at most `cell_km` apart along the surface are at most `cell_km` apart in a straight line,
+    so they are in the same or in neighbouring cells. Unlike a latitude/longitude grid,
+    this holds near the poles and across the antimeridian as well.
+
+    Args:
+        lat (numpy.ndarray): The latitudes in degrees.
+        lon (numpy.ndarray): The longitudes in degrees.
+        cell_km (float): The edge length of a cell.
+
+    Returns:
+        list: The cell of every point, as a tuple of three integers.
+    """
+    lat, lon = np.radians(lat), np.radians(lon)
+    xyz = EARTH_RADIUS_KM * np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+    return [tuple(cell) for cell in np.floor(xyz / cell_km).astype(np.int64).tolist()]
+
+
+def sweep_by_date(articles, window):
+    """
+    Groups articles by date alone.
+
+    Args:
+        articles (list): Article tuples sorted by (date, article_id).
+        window (timedelta): The maximum time between the first and any other article of a group.
+
+    Returns:
+        list: The groups, as lists of articles.
+    """
+    groups = []
+    start = 0
+    while start < len(articles):
+        last_date = articles[start][1] + window
+        end = start + 1
+        while end < len(articles) and articles[end][1] <= last_date:
+            end += 1
+        groups.append(articles[start:end])
+        start = end
+    return groups
+
+
+def sweep_by_date_and_location(articles, window, distance_km):
+    """
+    Groups articles by date and location.
+
+    The articles are swept in date order while a grid index holds the ungrouped articles inside the
+    date window of the current one. The earliest ungrouped article opens a group; its candidates are
+    looked up in the neighbouring grid cells only, and their distances are computed in one NumPy batch.
+
+    Args:
+        articles (list): Article tuples with coordinates, sorted by (date, article_id).
+        window (timedelta): The maximum time between the first and any other article of a group.
+        distance_km (float): The maximum distance between the first and any other article of a group.
+
+    Returns:
+        list: The groups, as lists of articles.
+    """
+    n = len(articles)
+    if n == 0:
+        return []
+    coordinates = np.array([location_of(article) for article in articles], dtype=float)
+    lat, lon = coordinates[:, 0], coordinates[:, 1]
+    cells = grid_cells(lat, lon, distance_km)
+    grid = {}
+    used = np.zeros(n, dtype=bool)
+    entered = 0
+    groups = []
+    for i in range(n):
+        if used[i]:
+            continue
+        used[i] = True
+        last_date = articles[i][1] + window
+        while entered < n and articles[entered][1] <= last_date:
+            if not used[entered]:
+                grid.setdefault(cells[entered], set()).add(entered)
+            entered += 1
+        grid.get(cells[i], set()).discard(i)
+        x, y, z = cells[i]
+        candidates = [j for dx, dy, dz in NEIGHBOUR_OFFSETS for j in grid.get((x + dx, y + dy, z + dz), ())]
+        group = [articles[i]]
+        if candidates:
+            candidates = np.array(candidates)
+            close = candidates[haversine_km(lat[i], lon[i], lat[candidates], lon[candidates]) <= distance_km]
+            for j in np.sort(close).tolist():
+                used[j] = True
+                grid[cells[j]].discard(j)
+                group.append(articles[j])
+        groups.append(group)
+    return groups
+
+
+def group_articles(articles, window_days=DATE_WINDOW_DAYS, distance_km=DISTANCE_THRESHOLD_KM):
+    """
+    Groups articles reporting on the same incident.
+
+    The articles are sorted by date (ties broken by article ID) and swept once: the earliest article
+    that is not grouped yet opens a group, which takes every following ungrouped article dated at most
+    `window_days` after it and located at most `distance_km` away from it. This runs in O(n log n)
+    and the result does not depend on the order of the input.
+    Articles without coordinates are only grouped with each other, by date alone, and articles
+    without a date each form a group of their own.
+
+    Args:
+        articles (list): A list of article tuples, see the top of this file.
+        window_days (int): The maximum number of days between the first and any other article of a group.
+        distance_km (float, optional): The maximum distance between the first and any other article of
+            a group. None groups by date alone.
+
+    Returns:
+        list: A list of groups, where each group is a list of article IDs in date order,
+              ordered by the date of their first article.
+    """
+    window = timedelta(days=window_days)
+    dated = sorted((article for article in articles if article[1] is not None), key=lambda a: (a[1], a[0]))
+    if distance_km is None:
+        groups = sweep_by_date(dated, window)
+    else:
+        located = [article for article in dated if location_of(article) is not None]
+        unlocated = [article for article in dated if location_of(article) is None]
+        groups = sweep_by_date_and_location(located, window, distance_km) + sweep_by_date(unlocated, window)
+        groups.sort(key=lambda group: (group[0][1], group[0][0]))
+    undated = sorted(article[0] for article in articles if article[1] is None)
+    return [[article[0] for article in group] for group in groups] + [[article_id] for article_id in undated]
+
+
+def date_windows(articles, window_days=DATE_WINDOW_DAYS):
+    """
+    Calculates the date ranges holding the incidents that articles may match.
+
+    Every article may match incidents dated at most `window_days` before or after it. The windows of the
+    articles are merged where they overlap or touch, so the ranges are disjoint and an incident lies in at
+    most one of them, while a batch spanning years but dated on a few days only spans a few short ranges.
+
+    Args:
+        articles (list): A list of article tuples, see the top of this file.
+        window_days (int): The maximum number of days between an article and its incident.
+
+    Returns:
+        list: The (first, last) dates of the ranges, in date order. Articles without a date have none.
+    """
+    window = timedelta(days=window_days)
+    ranges = []
+    for day in sorted({article[1] for article in articles if article[1] is not None}):
+        if ranges and day - window <= ranges[-1][1] + timedelta(days=1):
+            ranges[-1][1] = day + window
+        else:
+            ranges.append([day - window, day + window])
+    return [(first, last) for first, last in ranges]
+
+
+def match_articles_to_incidents(articles, incidents, window_days=DATE_WINDOW_DAYS, distance_km=DISTANCE_THRESHOLD_KM):
+    """
+    Matches new articles against existing incidents.
+
+    An article matches an incident dated at most `window_days` before or after it and located at most
+    `distance_km` away from it; articles without coordinates match incidents without coordinates by date alone.
+    Of several matching incidents the closest one wins, then the one closest in time.
+    The incidents are indexed by grid cell and date, so each article only looks at the incidents of its
+    neighbouring cells inside its date window.
+
+    Args:
+        articles (list): The new article tuples, see the top of this file.
+        incidents (list): The incident tuples, shaped like article tuples with the incident ID first.
+        window_days (int): The maximum number of days between an article and its incident.
+        distance_km (float, optional): The maximum distance between an article and its incident.
+            None matches by date alone.
+
+    Returns:
+        tuple: A dict mapping article IDs to the ID of their incident, and the list of articles without a match.
+    """
+    window = timedelta(days=window_days)
+
+    def location(item):
+        return None if distance_km is None else location_of(item)
+
+    # date-sorted incidents per grid cell, with the incidents without coordinates under the key None
+    index = {}
+    dated = [incident for incident in incidents if incident[1] is not None]
+    located = [incident for incident in dated if location(incident) is not None]
+    if located:
+        coordinates = np.array([location(incident) for incident in located], dtype=float)
+        for incident, cell in zip(located, grid_cells(coordinates[:, 0], coordinates[:, 1], distance_km)):
+            index.setdefault(cell, []).append(incident)
+    index[None] = [incident for incident in dated if location(incident) is None]
+    for cell_incidents in index.values():
+        cell_incidents.sort(key=lambda incident: (incident[1], incident[0]))
+    index_dates = {cell: [incident[1] for incident in cell_incidents] for cell, cell_incidents in index.items()}
+
+    def in_window(cell, day):
+        if cell not in index:
+            return []
+        dates = index_dates[cell]
+        return index[cell][bisect_left(dates, day - window):bisect_right(dates, day + window)]
+
+    matches = {}
+    unmatched = []
+    for article in articles:
+        day = article[1]
+        point = location(article)
+        best = None
+        if day is None:
+            pass
+        elif point is None:
+            candidates = in_window(None, day)
+            if candidates:
+                best = min(candidates, key=lambda incident: (abs((incident[1] - day).days), incident[0]))[0]
+        else:
+            x, y, z = grid_cells(np.array([point[0]]), np.array([point[1]]), distance_km)[0]
+            candidates = [
+                incident
+                for dx, dy, dz in NEIGHBOUR_OFFSETS
+                for incident in in_window((x + dx, y + dy, z + dz), day)
+            ]
+            if candidates:
+                coordinates = np.array([location(incident) for incident in candidates], dtype=float)
+                distances = haversine_km(point[0], point[1], coordinates[:, 0], coordinates[:, 1]).tolist()
+                close = [
+                    (distance, abs((incident[1] - day).days), incident[0])
+                    for incident, distance in zip(candidates, distances)
+                    if distance <= distance_km
+                ]
+                if close:
+                    best = min(close)[2]
+        if best is None:
+            unmatched.append(article)
+        else:
+            matches[article[0]] = best
+    return matches, unmatched
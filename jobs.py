@@ -0,0 +1,169 @@
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import db_operations
+
+"""
+Background jobs of the API.
+
+Jobs run in a worker process, so that neither their database calls block the event loop of the API nor
+their computations (the grouping of articles) compete with requests for the GIL. The state of every job,
+its progress and its result are stored in the 'jobs' table, so any instance of the API can report on a
+job started by another one.
+
+A job is 'queued' when it is created, 'running' while the worker runs it, and 'succeeded' or 'failed'
+once it is done. At most one job of a kind is queued or running at a time, see `jobs_active_idx`.
+
+The worker also rebuilds the snapshots after changes, see `run`; these runs are not recorded as jobs.
+"""
+
+# Kind of the jobs running `db_operations.process_articles`
+REPROCESS = "reprocess"
+# Seconds after which a running job not holding its lock is considered lost, e.g. because its instance stopped
+STALE_JOB_SECONDS = 60
+# Seconds after which a queued job is considered lost. Jobs wait in the worker behind snapshot builds, so this
+# is much longer than these take; a job started after it expired is skipped, see `run_reprocess`
+QUEUED_JOB_SECONDS = 3600
+
+JOBS_SQL = """
+    CREATE TABLE IF NOT EXISTS jobs (
+    job_id SERIAL PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params JSON NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'queued',
+    step TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    stats JSON,
+    error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    started_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ
+);
+CREATE UNIQUE INDEX IF NOT EXISTS jobs_active_idx ON jobs (kind) WHERE status IN ('queued', 'running');
+"""
+
+_executor = None
+
+
+def executor():
+    """
+    Returns:
+        ProcessPoolExecutor: The worker process of the jobs, started on first use. Jobs run one at a time.
+    """
+    global _executor
+    if _executor is None:
+        # A spawned worker opens its own connections instead of inheriting those of the API process
+        _executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def run(function, *args):
+    """
+    Run a function in the worker process, after the jobs and runs submitted before it.
+
+    If the worker dies, e.g. killed for its memory use, it is replaced for the next run.
+
+    Args:
+        function (callable): A module-level function, e.g. `snapshots.build`.
+        *args: The arguments of the function.
+
+    Returns:
+        concurrent.futures.Future: The result of the function.
+    """
+    def done(future):
+        global _executor
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            _executor = None
+
+    future = executor().submit(function, *args)
+    future.add_done_callback(done)
+    return future
+
+
+def submit(function, job_id, *args):
+    """
+    Start a job in the worker process.
+
+    If the job dies with the worker, it is marked as failed, see `run`.
+
+    Args:
+        function (callable): The job function, e.g. `run_reprocess`, taking the job ID and `args`.
+        job_id (int): The ID of the job.
+        *args: The further arguments of the job function.
+
+    Returns:
+        None
+    """
+    def done(future):
+        error = future.exception() if not future.cancelled() else None
+        if error is not None:
+            update_job(job_id, "status = 'failed', error = %s, finished_at = now()", (f"{type(error).__name__}: {error}",))
+
+    run(function, job_id, *args).add_done_callback(done)
+
+
+def shutdown():
+    """
+    Stop the worker process once the running job is done; queued jobs are not started.
+
+    Returns:
+        None
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def update_job(job_id, assignments, values=(), status=None):
+    """
+    Update a job in its own transaction, so that the change is visible to the API right away.
+
+    Args:
+        job_id (int): The ID of the job.
+        assignments (str): The SET clause of the update.
+        values (tuple): The values of the %s placeholders of `assignments`.
+        status (str, optional): Only update the job if it has this status.
+
+    Returns:
+        bool: Whether the job was updated.
+    """
+    condition, condition_values = ("job_id = %s", (job_id,)) if status is None else \
+        ("job_id = %s AND status = %s", (job_id, status))
+    with db_operations.connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"UPDATE jobs SET {assignments} WHERE {condition}", (*values, *condition_values))
+        conn.commit()
+        return cursor.rowcount > 0
+
+
+def run_reprocess(job_id, full):
+    """
+    Run `db_operations.process_articles` as a job, recording its progress after every step.
+
+    Runs in the worker process. Errors are recorded in the job instead of being raised. A job that is no
+    longer queued when the worker gets to it, because it expired in the meantime (see `QUEUED_JOB_SECONDS`),
+    is skipped.
+
+    Args:
+        job_id (int): The ID of the job.
+        full (bool): Whether to regroup all articles, see `db_operations.process_articles`.
+
+    Returns:
+        None
+    """
+    if not update_job(job_id, "status = 'running', started_at = now()", status="queued"):
+        return
+    steps = db_operations.PROCESSING_STEPS
+
+    def progress(step, stats):
+        update_job(job_id, "step = %s, progress = %s, stats = %s",
+                   (step, (steps.index(step) + 1) / len(steps), json.dumps(stats)))
+
+    try:
+        stats = db_operations.process_articles(full=full, progress=progress)
+    except Exception as e:
+        update_job(job_id, "status = 'failed', error = %s, finished_at = now()", (f"{type(e).__name__}: {e}",))
+        return
+    update_job(job_id, "status = 'succeeded', progress = 1, stats = %s, finished_at = now()", (json.dumps(stats),))
@@ -1,6 +1,31 @@
 import os
+import asyncio
+import base64
+import binascii
+import csv
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import AsyncExitStack, asynccontextmanager
+from decimal import Decimal
+import re
 import asyncpg
-from fastapi import FastAPI, HTTPException
+import orjson
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, RedirectResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+import jobs
+import snapshots
+
+from db_operations import (
+    ARTICLES_COLUMNS, CHANGES_CHANNEL, CLUSTER_MAX_ZOOM, INCIDENT_ARTICLES_SQL, INCIDENTS_COLUMNS, PROCESSING_LOCK_ID,
+    SEARCH_CONFIG, STATS_DIMENSIONS, STATS_MEASURES, grid_cell_size,
+)
 
 app = FastAPI()
 
@@ -10,57 +35,1383 @@ params = {
     'user': os.environ.get('PGUSER'),
     'password': os.environ.get('PGPASSWORD'),
     'port': os.environ.get('PGPORT'),
+    'database': os.environ.get('PGDATABASE'),
+}
+
+# Settings of the connection pool of the API, see `asyncpg.create_pool`. Connections are closed after
+# `max_queries` queries or when idle for `max_inactive_connection_lifetime` seconds, and reopened on demand.
+# Set API_STATEMENT_CACHE_SIZE to 0 behind a transaction-pooling proxy such as PgBouncer.
+POOL_SETTINGS = {
+    'min_size': int(os.environ.get('API_POOL_MIN_SIZE', 10)),
+    'max_size': int(os.environ.get('API_POOL_MAX_SIZE', 10)),
+    'max_queries': int(os.environ.get('API_POOL_MAX_QUERIES', 50000)),
+    'max_inactive_connection_lifetime': float(os.environ.get('API_POOL_MAX_INACTIVE_LIFETIME', 300)),
+    'timeout': float(os.environ.get('API_CONNECT_TIMEOUT', 60)),
+    'command_timeout': float(os.environ['API_COMMAND_TIMEOUT']) if os.environ.get('API_COMMAND_TIMEOUT') else None,
+    'statement_cache_size': int(os.environ.get('API_STATEMENT_CACHE_SIZE', 100)),
 }
+# Seconds a request waits for a pool connection before it is answered with 503
+POOL_ACQUIRE_TIMEOUT = float(os.environ.get('API_POOL_ACQUIRE_TIMEOUT', 10))
+# Seconds within which '/readyz' must get a connection and a reply from the database
+READY_TIMEOUT = float(os.environ.get('API_READY_TIMEOUT', 1))
+
+# Page sizes for the keyset-paginated list endpoints
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Streaming exports: content types per format, rows fetched per cursor round trip and rows per chunk sent
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+EXPORT_PREFETCH = 1000
+EXPORT_CHUNK_ROWS = 500
+
+# Columns of the incidents returned by the map viewport endpoint
+MAP_INCIDENT_COLUMNS = "incident_id, title, date, verified, number_dead, number_missing, latitude, longitude"
+# The clusters of a viewport: a zoom level, the range of cell rows, two ranges of cell columns and a limit
+MAP_CLUSTERS_SQL = (
+    'SELECT incidents, number_dead, number_missing, '
+    'sum_latitude / incidents AS latitude, sum_longitude / incidents AS longitude '
+    'FROM incident_grid WHERE zoom = $1 AND cell_y BETWEEN $2 AND $3 '
+    'AND (cell_x BETWEEN $4 AND $5 OR cell_x BETWEEN $6 AND $7) LIMIT $8'
+)
+# The incidents of a viewport: the range of latitudes, two ranges of longitudes and a limit
+MAP_INCIDENTS_SQL = (
+    f'SELECT {MAP_INCIDENT_COLUMNS} FROM incidents WHERE latitude BETWEEN $1 AND $2 '
+    'AND (longitude BETWEEN $3 AND $4 OR longitude BETWEEN $5 AND $6) '
+    'ORDER BY incident_id LIMIT $7'
+)
+# Maximum number of clusters or incidents returned for a map viewport
+MAX_MAP_ITEMS = 2000
+
+# Ranked article search: the matching IDs are ranked on the index, and only the page is joined back to
+# the articles for its snippets, since ts_headline re-parses the documents.
+SEARCH_ARTICLES_SQL = f"""
+    WITH query AS (SELECT websearch_to_tsquery('{SEARCH_CONFIG}', $1) AS q),
+    hits AS (
+        SELECT a.article_id, ts_rank(a.search_vector, query.q) AS rank
+        FROM articles a, query
+        WHERE a.search_vector @@ query.q
+          AND ($2::boolean IS NULL OR a.relevant = $2)
+          AND ($3::date IS NULL OR a.date >= $3)
+          AND ($4::date IS NULL OR a.date <= $4)
+        ORDER BY rank DESC, a.article_id
+        LIMIT $5 OFFSET $6
+    )
+    SELECT a.article_id, a.title, a.date, a.website, a.relevant, hits.rank,
+           ts_headline('{SEARCH_CONFIG}', COALESCE(a.title, ''), query.q, 'HighlightAll=true') AS title_highlight,
+           ts_headline('{SEARCH_CONFIG}', concat_ws(' ', a.summary, a.content), query.q,
+                       'MaxFragments=2, MinWords=10, MaxWords=30') AS snippet
+    FROM hits JOIN articles a USING (article_id), query
+    ORDER BY hits.rank DESC, a.article_id
+"""
+
+# The change counters of a list of tables, read by every conditional GET
+TABLE_VERSIONS_SQL = 'SELECT table_name, version FROM table_versions WHERE table_name = ANY($1::text[])'
+
+# Totals of the incident stats of a list of dimensions, optionally including the unverified incidents
+STATS_SQL = f"""
+    SELECT dimension, NULLIF(value, '') AS value, sum(incidents)::bigint AS incidents,
+           {', '.join(f'sum({measure})::bigint AS {measure}' for measure in STATS_MEASURES)}
+    FROM incident_stats WHERE dimension = ANY($1) AND (verified OR $2)
+    GROUP BY dimension, value ORDER BY dimension, value
+"""
+
+# Fail the active jobs of a kind that were lost with their instance: running jobs started long ago whose run
+# does not hold its advisory lock, and queued jobs the worker has not started for much longer than it takes
+EXPIRE_JOBS_SQL = """
+    UPDATE jobs SET status = 'failed', error = 'Interrupted', finished_at = now()
+    WHERE kind = $1 AND (
+        status = 'running' AND started_at < now() - make_interval(secs => $2)
+        AND NOT EXISTS (
+            SELECT FROM pg_locks
+            WHERE locktype = 'advisory' AND classid = 0 AND objid = $4 AND objsubid = 1 AND granted
+        )
+        OR status = 'queued' AND created_at < now() - make_interval(secs => $3)
+    )
+"""
+# Create a job unless one of its kind is queued or running
+INSERT_JOB_SQL = """
+    INSERT INTO jobs (kind, params) VALUES ($1, $2)
+    ON CONFLICT (kind) WHERE status IN ('queued', 'running') DO NOTHING
+    RETURNING job_id
+"""
+JOB_SQL = """
+    SELECT job_id, kind, params, status, step, progress, stats, error, created_at, started_at, finished_at,
+           EXTRACT(EPOCH FROM COALESCE(finished_at, now()) - started_at) AS seconds
+    FROM jobs WHERE job_id = $1
+"""
+
+# Maximum number of IDs accepted by the bulk update endpoints
+MAX_BULK_IDS = 10000
+
+# Size and lifetime of the in-process response cache
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+CACHE_TTL_SECONDS = float(os.environ.get('CACHE_TTL_SECONDS', 60))
+# Seconds between the checks of the connection listening for change notifications, and the bounds of the
+# exponential backoff of its reconnects
+LISTENER_CHECK_INTERVAL = float(os.environ.get('LISTENER_CHECK_INTERVAL', 10))
+LISTENER_RECONNECT_MIN_DELAY = 0.5
+LISTENER_RECONNECT_MAX_DELAY = 30
+
+# Seconds without changes before the snapshots are rebuilt, so that a burst of changes causes one rebuild,
+# and the longest a rebuild is put off by changes that keep coming
+SNAPSHOT_REBUILD_DELAY = float(os.environ.get('SNAPSHOT_REBUILD_DELAY', 5))
+SNAPSHOT_REBUILD_MAX_DELAY = float(os.environ.get('SNAPSHOT_REBUILD_MAX_DELAY', 60))
+# Seconds a request for a snapshot file that is missing locally waits for the local snapshots to be built
+SNAPSHOT_MISS_TIMEOUT = float(os.environ.get('SNAPSHOT_MISS_TIMEOUT', 10))
+# Cache headers of the snapshot files, whose names change with their contents, and of the redirects to them
+SNAPSHOT_FILE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+SNAPSHOT_REDIRECT_CACHE_CONTROL = "no-cache"
+# Size of the chunks of a snapshot decompressed for clients that accept no compression
+SNAPSHOT_CHUNK_BYTES = 64 * 1024
+
+
+class ResponseCache:
+    """
+    A bounded LRU cache with a time to live for the responses of the read endpoints.
+
+    Keys are tuples starting with the table name and the primary key of the requested row
+    (None for list responses), followed by whatever else identifies the response and ending with
+    its ETag, so that a response is never served with the ETag of newer data.
+    Entries are invalidated by the write endpoints and by change notifications from the
+    ingestion side; the TTL only bounds staleness if a notification is ever missed.
+    While no notifications can be received, the cache is disabled, see `listen_for_changes`.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = False
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """
+        Look up a response.
+
+        Args:
+            key (tuple): The cache key.
+
+        Returns:
+            The cached response, or None if it is missing, expired or the cache is disabled.
+        """
+        entry = self.entries.get(key) if self.enabled else None
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value):
+        """
+        Store a response, evicting the least recently used entry if the cache is full.
+
+        Args:
+            key (tuple): The cache key.
+            value: The response to cache.
+        """
+        if not self.enabled:
+            return
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, table, item_id=None):
+        """
+        Drop the responses affected by a change of a table.
+
+        Args:
+            table (str): The changed table.
+            item_id (int, optional): The primary key of the changed row. If given, only the detail
+                response of that row and the list responses of the table are dropped.
+        """
+        stale = [
+            key for key in self.entries
+            if key[0] == table and (item_id is None or key[1] is None or key[1] == item_id)
+        ]
+        for key in stale:
+            del self.entries[key]
+        self.invalidations += len(stale)
+
+    def clear(self):
+        """
+        Drop all responses, e.g. when changes may have been missed.
+        """
+        self.invalidations += len(self.entries)
+        self.entries.clear()
+
+    def stats(self):
+        """
+        Returns:
+            dict: The hit/miss counters and the current size of the cache.
+        """
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+        }
+
+
+response_cache = ResponseCache(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS)
+
+
+class TableVersions:
+    """
+    The change counters of the tables (see `table_versions`) the ETags are derived from.
+
+    While change notifications are received, the counters are kept in memory, and every notification
+    drops them, so that they are read again by the next conditional GET only. Without notifications,
+    every conditional GET reads them from the database.
+    """
+
+    def __init__(self):
+        self.versions = {}
+        self.generation = 0
+
+    def clear(self):
+        """
+        Drop the counters, after a change or when changes may have been missed.
+        """
+        self.versions.clear()
+        self.generation += 1
+
+    async def get(self, tables):
+        """
+        Look up the change counters of tables.
+
+        Args:
+            tables (tuple): The names of the tables.
+
+        Returns:
+            dict: The counter of every table, 0 for tables that never changed.
+
+        Raises:
+            asyncpg.UndefinedTableError: If the counters are not installed.
+        """
+        listening = app.state.listener is not None
+        if listening and all(table in self.versions for table in tables):
+            return self.versions
+        # Counters read while a change is announced are outdated, and not kept
+        generation = self.generation
+        async with app.state.pool.acquire() as connection:
+            rows = await connection.fetch(TABLE_VERSIONS_SQL, list(tables))
+        versions = {table: 0 for table in tables}
+        versions.update(rows)
+        if listening and generation == self.generation:
+            self.versions.update(versions)
+        return versions
+
+
+table_versions = TableVersions()
+
+# Upper bounds in seconds of the latency histograms exposed on '/metrics'
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Maximum number of distinct SQL statements timed; further statements are counted as "other"
+MAX_TRACKED_STATEMENTS = 200
+# Length to which statements are shortened in the labels of the metrics
+STATEMENT_LABEL_LENGTH = 160
+
+
+class Histogram:
+    """
+    A Prometheus histogram with labels, of `LATENCY_BUCKETS`.
+    """
+
+    def __init__(self, name, documentation, label_names):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        # labels -> [bucket counts..., count, sum]
+        self.series = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS) + 1) + [0.0])
+
+    def observe(self, labels, seconds):
+        """
+        Record a duration.
+
+        Args:
+            labels (tuple): The values of the labels, in the order of `label_names`.
+            seconds (float): The duration.
+        """
+        series = self.series[labels]
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                series[index] += 1
+                break
+        series[-2] += 1
+        series[-1] += seconds
+
+    def render(self):
+        """
+        Returns:
+            list: The lines of the histogram in the Prometheus text format.
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self.series.items()):
+            label_text = "".join(f'{name}="{escape_label(value)}",' for name, value in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label_text}le="+Inf"}} {series[-2]}')
+            label_set = f"{{{label_text.rstrip(',')}}}" if label_text else ""
+            lines.append(f"{self.name}_count{label_set} {series[-2]}")
+            lines.append(f"{self.name}_sum{label_set} {series[-1]}")
+        return lines
+
+
+def escape_label(value):
+    """
+    Escape a label value for the Prometheus text format.
+    """
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def counter_lines(name, documentation, label_names, values):
+    """
+    Render a labelled counter in the Prometheus text format.
+
+    Args:
+        name (str): The name of the metric.
+        documentation (str): The help text of the metric.
+        label_names (tuple): The names of the labels.
+        values (dict): The values, by tuple of label values.
+
+    Returns:
+        list: The lines of the counter.
+    """
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} counter"]
+    for labels, value in sorted(values.items()):
+        label_text = ",".join(f'{label}="{escape_label(item)}"' for label, item in zip(label_names, labels))
+        lines.append(f"{name}{{{label_text}}} {value}")
+    return lines
+
+
+request_latency = Histogram("http_request_duration_seconds", "Latency of the HTTP requests by route.",
+                            ("method", "route", "status"))
+pool_wait = Histogram("db_pool_acquire_duration_seconds", "Time spent waiting for a pool connection.", ())
+query_latency = Histogram("db_query_duration_seconds", "Execution time of the SQL statements.", ("statement",))
+request_errors = defaultdict(int)
+query_errors = defaultdict(int)
+
+
+def statement_label(query):
+    """
+    Shorten an SQL statement into a label of the query metrics.
+
+    Returns:
+        str: The statement with collapsed whitespace, cut at `STATEMENT_LABEL_LENGTH` characters, or
+             "other" once `MAX_TRACKED_STATEMENTS` distinct statements are tracked.
+    """
+    label = re.sub(r"\s+", " ", query).strip()[:STATEMENT_LABEL_LENGTH]
+    if (label,) not in query_latency.series and len(query_latency.series) >= MAX_TRACKED_STATEMENTS:
+        return "other"
+    return label
+
+
+def log_query(record):
+    """
+    Query logger of the pool connections, recording the execution time of every statement.
+
+    Args:
+        record: The `asyncpg` LoggedQuery of the statement.
+    """
+    label = statement_label(record.query)
+    query_latency.observe((label,), record.elapsed)
+    if record.exception is not None:
+        query_errors[(label, type(record.exception).__name__)] += 1
+
+
+class MeteredPool:
+    """
+    Wrapper of the asyncpg pool measuring the time requests wait for a connection.
+
+    All other attributes are those of the wrapped pool.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.waiting = 0
+
+    def __getattr__(self, name):
+        return getattr(self.pool, name)
+
+    def status(self):
+        """
+        Returns:
+            dict: The open, idle, busy and maximum connections of the pool, the number of requests
+                  waiting for one, and the share of the maximum in use.
+        """
+        size, idle, max_size = self.pool.get_size(), self.pool.get_idle_size(), self.pool.get_max_size()
+        return {
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "max_size": max_size,
+            "waiting": self.waiting,
+            "saturation": round((size - idle) / max_size, 3),
+        }
+
+    @asynccontextmanager
+    async def acquire(self, timeout=POOL_ACQUIRE_TIMEOUT):
+        """
+        Acquire a connection, waiting at most `timeout` seconds.
+
+        Raises:
+            HTTPException: 503 if no connection became available in time.
+        """
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            connection = await self.pool.acquire(timeout=timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail="No database connection available", headers={"Retry-After": "1"})
+        finally:
+            self.waiting -= 1
+        pool_wait.observe((), time.perf_counter() - started)
+        try:
+            yield connection
+        finally:
+            await self.pool.release(connection)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency and the server errors of every request by route template.
+
+    The latency runs until the last chunk of the response is sent, so it includes serialization and,
+    for the streaming exports, the whole transfer.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            request_errors[(route_label(scope), type(e).__name__)] += 1
+            raise
+        finally:
+            request_latency.observe((scope["method"], route_label(scope), str(status)), time.perf_counter() - started)
+
+
+def route_label(scope):
+    """
+    Returns:
+        str: The path template of the route that handled a request, or "unmatched".
+    """
+    route = scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(asyncpg.DataError)
+async def data_error_handler(request: Request, exc: asyncpg.DataError):
+    """
+    Answer 400 to requests with values the database rejects, such as out-of-range numbers.
+    """
+    return JSONResponse({"detail": str(exc)}, status_code=400)
+
+
+@app.exception_handler(Exception)
+async def server_error_handler(request: Request, exc: Exception):
+    """
+    Answer 500 to unhandled exceptions without exposing their details; the exception is logged by the server.
+    """
+    return JSONResponse({"detail": "Internal Server Error"}, status_code=500)
+
+
+class ArticleRelevanceUpdate(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=MAX_BULK_IDS)
+    relevant: bool
+
+
+class ReprocessJob(BaseModel):
+    full: bool = False
+
+
+class IncidentVerificationUpdate(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=MAX_BULK_IDS)
+    verified: bool
+
+
+def encode_cursor(last_id):
+    """
+    Encode the last primary key of a page into an opaque cursor.
+
+    Args:
+        last_id (int): The primary key of the last row on the current page.
+
+    Returns:
+        str: A URL-safe cursor to pass as `cursor` to fetch the next page.
+    """
+    payload = json.dumps({"after": last_id}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by `encode_cursor`.
+
+    Args:
+        cursor (str | None): The cursor sent by the client, or None for the first page.
+
+    Returns:
+        int: The primary key to continue after (0 for the first page).
+
+    Raises:
+        HTTPException: If the cursor is malformed.
+    """
+    if cursor is None:
+        return 0
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        after = json.loads(base64.urlsafe_b64decode(padded))["after"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # bool is a subclass of int, and primary keys are never negative
+    if type(after) is not int or after < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return after
+
+
+def select_list(columns, fields, key):
+    """
+    Turn a `fields` query parameter into the SELECT list of a query.
+
+    Args:
+        columns (dict): The column definitions of the table, see `db_operations`.
+        fields (str | None): A comma-separated list of column names, or None for all columns.
+        key (str): The primary key column, which is always selected.
+
+    Returns:
+        str: The comma-separated column list to put into the SELECT statement.
+
+    Raises:
+        HTTPException: If `fields` names a column that does not exist.
+    """
+    if fields is None:
+        return ", ".join(columns)
+    names = [key]
+    for name in fields.split(","):
+        name = name.strip()
+        if not name or name in names:
+            continue
+        if name not in columns:
+            raise HTTPException(status_code=400, detail=f"Unknown field: {name}")
+        names.append(name)
+    return ", ".join(names)
+
+
+def parse_ids(ids):
+    """
+    Parse a comma-separated list of IDs from a query parameter.
+
+    Args:
+        ids (str): The IDs, e.g. `1,2,3`.
+
+    Returns:
+        list: The distinct IDs, in the order given.
+
+    Raises:
+        HTTPException: If an ID is not an integer or too many IDs are given.
+    """
+    parsed = []
+    for item in ids.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            value = int(item)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid id: {item}")
+        if value not in parsed:
+            parsed.append(value)
+    if len(parsed) > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PAGE_SIZE} ids can be requested at once")
+    return parsed
+
+
+def longitude_ranges(west, east):
+    """
+    Split the longitude range of a map viewport at the antimeridian.
+
+    Args:
+        west (float): The western edge of the viewport.
+        east (float): The eastern edge of the viewport, smaller than `west` if the viewport crosses the antimeridian.
+
+    Returns:
+        list: One or two (min, max) longitude ranges.
+    """
+    if west <= east:
+        return [(west, east)]
+    return [(west, 180.0), (-180.0, east)]
+
+
+def location_filters(date_from, date_to, country, region, cause_of_death):
+    """
+    Collect the filters shared by articles and incidents, see `filter_conditions`.
+
+    Returns:
+        list: The (condition, value) pairs of the given filters.
+    """
+    filters = [
+        ("date >= {}", date_from),
+        ("date <= {}", date_to),
+        ("country_of_incident = {}", country),
+        ("region_of_incident = {}", region),
+        ("cause_of_death = {}", cause_of_death),
+    ]
+    return [(condition, value) for condition, value in filters if value is not None]
+
+
+def article_filters(date_from: datetime.date | None = None, date_to: datetime.date | None = None,
+                    country: str | None = None, region: str | None = None, cause_of_death: str | None = None,
+                    relevant: bool | None = None):
+    """
+    Dependency collecting the filter parameters of the article list.
+
+    Returns:
+        tuple: The (condition, value) pairs of the given filters, see `filter_conditions`.
+    """
+    filters = location_filters(date_from, date_to, country, region, cause_of_death)
+    if relevant is not None:
+        # Literal, so that the planner can match the partial index on irrelevant articles
+        filters.append(("relevant" if relevant else "NOT relevant", None))
+    return tuple(filters)
+
+
+def incident_filters(date_from: datetime.date | None = None, date_to: datetime.date | None = None,
+                     country: str | None = None, region: str | None = None, cause_of_death: str | None = None,
+                     verified: bool | None = None):
+    """
+    Dependency collecting the filter parameters of the incident list.
+
+    Returns:
+        tuple: The (condition, value) pairs of the given filters, see `filter_conditions`.
+    """
+    filters = location_filters(date_from, date_to, country, region, cause_of_death)
+    if verified is not None:
+        # Literal, so that the planner can match the partial index on unverified incidents
+        filters.append(("verified" if verified else "NOT verified", None))
+    return tuple(filters)
+
+
+def filter_conditions(filters, args):
+    """
+    Turn filters into conditions of a WHERE clause.
+
+    Args:
+        filters (tuple): (condition, value) pairs. The '{}' in a condition is replaced by the placeholder
+            of its value; conditions without '{}' take no value.
+        args (list): The arguments of the query, to which the values are appended.
+
+    Returns:
+        str: The conditions, each prefixed with ' AND '.
+    """
+    conditions = []
+    for condition, value in filters:
+        if "{}" in condition:
+            args.append(value)
+            condition = condition.format(f"${len(args)}")
+        conditions.append(f" AND {condition}")
+    return "".join(conditions)
+
+
+def page_sql(table, columns, key, conditions=""):
+    """
+    The query of a page of a list endpoint, taking the key after which the page starts and the limit.
+
+    Args:
+        table (str): The table to read.
+        columns (str): The SELECT list, see `select_list`.
+        key (str): The primary key column, which orders the pages.
+        conditions (str): The filter conditions, see `filter_conditions`.
+
+    Returns:
+        str: The query.
+    """
+    return f'SELECT {columns} FROM {table} WHERE {key} > $1{conditions} ORDER BY {key} LIMIT $2'
+
+
+def incidents_sql(columns, condition):
+    """
+    The query of incidents together with the stubs of their articles, ordered by incident ID.
+
+    Args:
+        columns (str): The SELECT list, see `select_list`.
+        condition (str): The WHERE condition selecting the incidents.
+
+    Returns:
+        str: The query.
+    """
+    return f'SELECT {columns}, {INCIDENT_ARTICLES_SQL} FROM incidents i WHERE {condition} ORDER BY incident_id'
+
+
+def paginate(rows, limit, key):
+    """
+    Split a result fetched with `LIMIT limit + 1` into a page and the cursor of the next page.
+
+    Args:
+        rows (list): The rows fetched from the database, at most `limit + 1`.
+        limit (int): The requested page size.
+        key (str): The name of the primary key column used for keyset pagination.
+
+    Returns:
+        tuple: The rows of the page and the cursor of the next page (None on the last page).
+    """
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(page[-1][key])
+
+def on_table_change(connection, pid, channel, payload):
+    """
+    Listener for `CHANGES_CHANNEL`, dropping the cached responses of the announced change.
+
+    Args:
+        connection: The listening connection.
+        pid (int): The PID of the backend that sent the notification.
+        channel (str): The channel name.
+        payload (str): The changed table, optionally followed by ':' and the primary key of the changed row.
+    """
+    table_versions.clear()
+    table, _, item_id = payload.partition(":")
+    if item_id.isdigit():
+        response_cache.invalidate(table, int(item_id))
+    else:
+        response_cache.invalidate(table)
+    schedule_snapshot_build()
+
+
+async def listen_for_changes():
+    """
+    Keep a dedicated connection listening on `CHANGES_CHANNEL`, reconnecting with exponential backoff.
+
+    Changes made while no connection listens are never announced, so the response cache is cleared and
+    disabled as soon as the connection is lost, and only enabled again once a new connection listens.
+    A connection that dies without closing its socket is found by a query every `LISTENER_CHECK_INTERVAL`
+    seconds.
+    """
+    delay = LISTENER_RECONNECT_MIN_DELAY
+    while True:
+        connection = None
+        try:
+            connection = await asyncpg.connect(**params)
+            lost = asyncio.Event()
+            connection.add_termination_listener(lambda _: lost.set())
+            await connection.add_listener(CHANGES_CHANNEL, on_table_change)
+            app.state.listener = connection
+            response_cache.clear()
+            table_versions.clear()
+            response_cache.enabled = True
+            delay = LISTENER_RECONNECT_MIN_DELAY
+            while not lost.is_set():
+                try:
+                    await asyncio.wait_for(lost.wait(), LISTENER_CHECK_INTERVAL)
+                except asyncio.TimeoutError:
+                    await connection.fetchval('SELECT 1', timeout=LISTENER_CHECK_INTERVAL)
+            print("The connection listening for changes was closed")
+        except (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+            print(f"The connection listening for changes failed: {e!r}")
+        finally:
+            response_cache.enabled = False
+            response_cache.clear()
+            app.state.listener = None
+            table_versions.clear()
+            if connection is not None:
+                connection.terminate()
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, LISTENER_RECONNECT_MAX_DELAY)
+
+
+def schedule_snapshot_build():
+    """
+    Rebuild the snapshots once no change was announced for `SNAPSHOT_REBUILD_DELAY` seconds, but at the
+    latest `SNAPSHOT_REBUILD_MAX_DELAY` seconds after the first change, unless a rebuild is already scheduled.
+
+    Changes announced while a rebuild runs schedule another one, which `snapshots.build` skips if the
+    rebuild already saw them.
+    """
+    now = asyncio.get_running_loop().time()
+    if not app.state.snapshots_stale:
+        app.state.snapshots_stale_since = now
+    app.state.snapshots_stale = True
+    app.state.snapshots_changed_at = now
+    task = app.state.snapshot_task
+    if task is None or task.done():
+        app.state.snapshot_task = asyncio.get_running_loop().create_task(rebuild_snapshots())
+
+
+async def rebuild_snapshots():
+    """
+    Rebuild the snapshots while they are stale, see `schedule_snapshot_build`.
+
+    The rebuild runs in the worker process of the jobs, so that encoding and compressing the snapshots
+    neither blocks the event loop nor competes with requests for the GIL.
+    """
+    loop = asyncio.get_running_loop()
+    while app.state.snapshots_stale:
+        due = min(app.state.snapshots_changed_at + SNAPSHOT_REBUILD_DELAY,
+                  app.state.snapshots_stale_since + SNAPSHOT_REBUILD_MAX_DELAY)
+        if loop.time() < due:
+            await asyncio.sleep(due - loop.time())
+            continue
+        app.state.snapshots_stale = False
+        try:
+            await build_snapshots()
+        except Exception as e:
+            print(f"Building the snapshots failed: {e!r}")
+
+
+def build_snapshots():
+    """
+    Build the snapshots whose tables changed, in the worker process of the jobs.
+
+    Returns:
+        asyncio.Future: The build, shared with the callers that ask for one while it runs.
+    """
+    build = app.state.snapshot_build
+    if build is None or build.done():
+        build = app.state.snapshot_build = asyncio.wrap_future(jobs.run(snapshots.build))
+    return build
+
+
+async def build_stale_snapshot(name):
+    """
+    Build the local snapshot of a dataset if it is older than the data, and wait for it.
+
+    Every instance of the API builds its own snapshots. A client redirected by an instance whose snapshot
+    is newer than the local one asks for a file this instance does not have yet; since the same data
+    always gives the same file, building the local snapshot gives it. A build that started before the
+    data changed is waited for and followed by another one.
+
+    Args:
+        name (str): The name of the dataset, one of `snapshots.DATASETS`.
+
+    Returns:
+        None
+
+    Raises:
+        HTTPException: 503 if the build takes longer than `SNAPSHOT_MISS_TIMEOUT` seconds.
+    """
+    tables = list(snapshots.DATASETS[name][0])
+    async with app.state.pool.acquire() as connection:
+        versions = dict(await connection.fetch(TABLE_VERSIONS_SQL, tables))
+    versions = {table: versions.get(table, 0) for table in tables}
+    deadline = asyncio.get_running_loop().time() + SNAPSHOT_MISS_TIMEOUT
+    for _ in range(2):
+        snapshot = snapshots.read_manifest().get(name)
+        if snapshot is not None and snapshot["versions"] == versions:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(build_snapshots()),
+                                   max(deadline - asyncio.get_running_loop().time(), 0))
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail="Snapshots are being built", headers={"Retry-After": "10"})
+
+
+async def update_flag(connection, table, key, column, value, ids):
+    """
+    Set a boolean flag on a batch of rows in a single round trip.
+
+    The UPDATE returns the IDs it touched and announces the change on `CHANGES_CHANNEL` in the same
+    statement; the cached responses of the touched rows are dropped locally right away. The rows are
+    locked in key order first, so that concurrent updates of overlapping batches cannot deadlock.
+
+    Args:
+        connection: The connection to run the update on.
+        table (str): The table to update.
+        key (str): The primary key column of the table.
+        column (str): The boolean column to set.
+        value (bool): The new value of the flag.
+        ids (list): The primary keys of the rows to update.
+
+    Returns:
+        list: The primary keys of the rows that exist and were updated.
+    """
+    item_id = ids[0] if len(ids) == 1 else None
+    payload = table if item_id is None else f"{table}:{item_id}"
+    updated = await connection.fetchval(
+        f'''
+        WITH locked AS (
+            SELECT {key} FROM {table} WHERE {key} = ANY($2::int[]) ORDER BY {key} FOR UPDATE
+        ), updated AS (
+            UPDATE {table} t SET {column} = $1 FROM locked WHERE t.{key} = locked.{key} RETURNING t.{key}
+        )
+        SELECT array_agg({key} ORDER BY {key}) FROM updated, pg_notify($3, $4)
+        ''',
+        value, ids, CHANGES_CHANNEL, payload)
+    table_versions.clear()
+    response_cache.invalidate(table, item_id)
+    return updated or []
+
+
+def conditional_get(*tables):
+    """
+    Create a dependency implementing conditional GET for an endpoint reading the given tables.
+
+    The dependency derives a strong ETag from the change counters of the tables (see `TableVersions`)
+    and the request URL. If it matches `If-None-Match`, the request is answered with 304 before the
+    endpoint runs its query; otherwise the ETag is set on the response.
+
+    Args:
+        *tables (str): The tables the response of the endpoint is built from.
+
+    Returns:
+        The dependency, which returns the ETag (or None if the counters are not installed).
+    """
+    async def dependency(request: Request, response: Response):
+        try:
+            versions = await table_versions.get(tables)
+        except asyncpg.UndefinedTableError:
+            return None
+        state = ";".join(f"{table}={versions.get(table, 0)}" for table in tables)
+        digest = hashlib.sha1(f"{state}|{request.url.path}?{request.url.query}".encode()).hexdigest()
+        etag = f'"{digest}"'
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+            raise HTTPException(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        return etag
+    return dependency
+
+
+# Tables the read endpoints depend on; incident responses include the stubs of their articles
+articles_etag = conditional_get("articles")
+incidents_etag = conditional_get("incidents", "mapping", "articles")
+
+
+def orjson_default(value):
+    """
+    Encode the values orjson does not know: database rows and the `Decimal` of DECIMAL columns.
+
+    Args:
+        value: A value that `orjson.dumps` could not encode.
+
+    Returns:
+        The JSON-compatible representation of the value.
+
+    Raises:
+        TypeError: If the value has no JSON representation.
+    """
+    if isinstance(value, asyncpg.Record):
+        return dict(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_json(content):
+    """
+    Encode a response body, which may contain asyncpg records, with orjson.
+
+    Returns:
+        bytes: The JSON document.
+    """
+    return orjson.dumps(content, default=orjson_default)
+
+
+class RecordJSONResponse(Response):
+    """
+    JSON response encoded with `encode_json`, or sent as is if the content is already encoded.
+
+    Endpoints return it directly, so FastAPI skips its `jsonable_encoder` pass over the result.
+    """
+    media_type = "application/json"
+
+    def render(self, content):
+        if isinstance(content, bytes):
+            return content
+        return encode_json(content)
+
+
+def json_response(body, etag=None):
+    """
+    Build the response of a read endpoint.
+
+    Args:
+        body (bytes): The encoded JSON body, as returned by `encode_json` and stored in the response cache.
+        etag (str, optional): The ETag of the response, see `conditional_get`. A returned response does not
+            inherit the headers set by dependencies, so it is set here.
+
+    Returns:
+        RecordJSONResponse: The response.
+    """
+    return RecordJSONResponse(body, headers={"ETag": etag} if etag is not None else None)
+
+
+def csv_value(value):
+    """
+    Flatten a database value into a single CSV cell.
+
+    Args:
+        value: A column value of a row.
+
+    Returns:
+        The value itself, or the elements joined by ';' for arrays such as `keywords`.
+    """
+    if isinstance(value, list):
+        return ";".join(str(item) for item in value)
+    return value
+
+
+async def stream_table(cursor, names, fmt):
+    """
+    Stream the rows of an export cursor as NDJSON or CSV.
+
+    The rows are read in batches of `EXPORT_PREFETCH`, so memory use is constant regardless of the table
+    size, and are sent in chunks of `EXPORT_CHUNK_ROWS` rows. The CSV header, or the first NDJSON row, is
+    sent right away, so that the download starts without waiting for a full chunk.
+
+    Args:
+        cursor (asyncpg.cursor.Cursor): The cursor over the rows to export.
+        names (list): The names of the exported columns.
+        fmt (str): The export format, one of `EXPORT_FORMATS`.
+
+    Yields:
+        str: Chunks of the encoded export.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    chunk_rows = EXPORT_CHUNK_ROWS
+    if fmt == "csv":
+        writer.writerow(names)
+        yield flush()
+    else:
+        chunk_rows = 1
+    rows_in_buffer = 0
+    while rows := await cursor.fetch(EXPORT_PREFETCH):
+        for row in rows:
+            if fmt == "csv":
+                writer.writerow([csv_value(value) for value in row.values()])
+            else:
+                buffer.write(encode_json(row).decode())
+                buffer.write("\n")
+            rows_in_buffer += 1
+            if rows_in_buffer >= chunk_rows:
+                yield flush()
+                chunk_rows = EXPORT_CHUNK_ROWS
+                rows_in_buffer = 0
+    yield flush()
+
+
+class ExportResponse(StreamingResponse):
+    """
+    Streaming response of an export, which releases the connection of the export once it is sent, or
+    once the client disconnected, even before the first chunk.
+    """
+
+    def __init__(self, content, stack, **kwargs):
+        super().__init__(content, **kwargs)
+        self.stack = stack
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.body_iterator.aclose()
+            await self.stack.aclose()
+
+
+async def export_response(table, columns, key, fmt, etag=None):
+    """
+    Build the streaming response of an export endpoint.
+
+    The connection is acquired and the query started before the response, so that a saturated pool or a
+    failing query is answered with an error status instead of a truncated download. The connection is
+    released once the export is sent, see `ExportResponse`.
+
+    Args:
+        table (str): The name of the table to export.
+        columns (str): The SELECT list, as returned by `select_list`.
+        key (str): The primary key column, used to order the export.
+        fmt (str): The export format, one of `EXPORT_FORMATS`.
+        etag (str, optional): The ETag of the export.
+
+    Returns:
+        ExportResponse: The response streaming the table.
+
+    Raises:
+        HTTPException: If the format is not supported, or 503 if no connection is available.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {fmt}")
+    stack = AsyncExitStack()
+    try:
+        connection = await stack.enter_async_context(app.state.pool.acquire())
+        # A server-side cursor only lives as long as its transaction
+        await stack.enter_async_context(connection.transaction())
+        cursor = await connection.cursor(f"SELECT {columns} FROM {table} ORDER BY {key}")
+    except BaseException:
+        await stack.aclose()
+        raise
+    headers = {"Content-Disposition": f'attachment; filename="{table}.{fmt}"'}
+    if etag is not None:
+        headers["ETag"] = etag
+    return ExportResponse(stream_table(cursor, columns.split(", "), fmt), stack, media_type=EXPORT_FORMATS[fmt],
+                          headers=headers)
+
 
 @app.get("/")
 async def root():
     return {"message": "Hello World"}
 
+def warmup_queries():
+    """
+    The hot statements of the API, in the form their endpoints send them without `fields` and filters,
+    with arguments that match no rows.
+
+    Returns:
+        list: (query, args) pairs.
+    """
+    articles = select_list(ARTICLES_COLUMNS, None, "article_id")
+    incidents = select_list(INCIDENTS_COLUMNS, None, "incident_id")
+    return [
+        (TABLE_VERSIONS_SQL, ([],)),
+        (page_sql("articles", articles, "article_id"), (0, 0)),
+        (page_sql("incidents", incidents, "incident_id"), (0, 0)),
+        (f'SELECT {articles} FROM articles where article_id = $1', (0,)),
+        (incidents_sql(incidents, 'incident_id = $1'), (0,)),
+        (incidents_sql(incidents, 'incident_id = ANY($1::int[])'), ([],)),
+        (SEARCH_ARTICLES_SQL, ("", None, None, None, 0, 0)),
+        (MAP_CLUSTERS_SQL, (0, 0, 0, 0, 0, 0, 0, 0)),
+        (MAP_INCIDENTS_SQL, (0, 0, 0, 0, 0, 0, 0)),
+        (STATS_SQL, ([], False)),
+    ]
+
+
+async def init_connection(connection):
+    """
+    Set up a new pool connection: decode JSON results (such as aggregated article stubs) into Python objects,
+    time every statement for '/metrics', and prepare the hot statements.
+
+    Running a statement once puts it into the statement cache of the connection, so the first requests
+    served by a new connection do not wait for the statement to be parsed and its types introspected.
+    A statement whose table is not migrated yet is skipped.
+    """
+    await connection.set_type_codec('json', encoder=json.dumps, decoder=orjson.loads, schema='pg_catalog')
+    connection.add_query_logger(log_query)
+    for query, args in warmup_queries():
+        try:
+            await connection.execute(query, *args)
+        except (asyncpg.UndefinedTableError, asyncpg.UndefinedColumnError) as e:
+            print(f"Skipping the warmup of a statement: {e}")
+
 @app.on_event("startup")
 async def startup():
-    app.state.pool = await asyncpg.create_pool(**params)
+    app.state.pool = MeteredPool(await asyncpg.create_pool(**params, **POOL_SETTINGS, init=init_connection))
+    app.state.snapshot_task = None
+    app.state.snapshot_build = None
+    app.state.snapshots_stale = False
+    app.state.listener = None
+    app.state.listener_task = asyncio.get_running_loop().create_task(listen_for_changes())
+    # Build the snapshots that are missing or older than the data
+    schedule_snapshot_build()
 
 @app.on_event("shutdown")
 async def shutdown():
+    if app.state.snapshot_task is not None:
+        app.state.snapshot_task.cancel()
+    app.state.listener_task.cancel()
+    await asyncio.gather(app.state.listener_task, return_exceptions=True)
     await app.state.pool.close()
+    jobs.shutdown()
+
+@app.get("/healthz")
+async def healthz():
+    """
+    Liveness probe: answers as long as the process serves requests, without querying the database.
+
+    Returns:
+        dict: The status, the occupancy of the connection pool, see `MeteredPool.status`, and whether
+              change notifications are received.
+    """
+    return {"status": "ok", "pool": app.state.pool.status(), "listening": app.state.listener is not None}
+
+@app.get("/readyz")
+async def readyz():
+    """
+    Readiness probe: the pool, whose connections are warmed when they open, answers a query in time.
+
+    A saturated pool makes the probe wait for a connection like any request, so an instance that cannot
+    serve more traffic within `READY_TIMEOUT` seconds reports itself as not ready.
+
+    Returns:
+        Response: 200 with the occupancy of the pool if ready, otherwise 503 with the reason.
+    """
+    pool = app.state.pool
+    try:
+        async with pool.acquire(timeout=READY_TIMEOUT) as connection:
+            await connection.fetchval('SELECT 1', timeout=READY_TIMEOUT)
+    except HTTPException:
+        return JSONResponse({"status": "saturated", "pool": pool.status()}, status_code=503)
+    except (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+        return JSONResponse({"status": "unavailable", "detail": str(e), "pool": pool.status()}, status_code=503)
+    return {"status": "ready", "pool": pool.status()}
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """
+    Report the hit/miss counters of the response cache.
+
+    Returns:
+        dict: The statistics of the response cache.
+    """
+    return response_cache.stats()
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Expose the metrics of the API in the Prometheus text format.
+
+    Returns:
+        Response: The request latencies by route, the pool wait time and occupancy, the execution time
+                  of the SQL statements, and the exceptions of the requests and the statements.
+    """
+    pool = app.state.pool.status()
+    lines = request_latency.render() + pool_wait.render() + query_latency.render()
+    for name, documentation, value in (
+        ("db_pool_size", "Open connections of the pool.", pool["size"]),
+        ("db_pool_idle", "Idle connections of the pool.", pool["idle"]),
+        ("db_pool_max", "Maximum number of connections of the pool.", pool["max_size"]),
+        ("db_pool_waiting", "Requests waiting for a pool connection.", pool["waiting"]),
+        ("change_listener_connected", "Whether change notifications are received.", int(app.state.listener is not None)),
+    ):
+        lines += [f"# HELP {name} {documentation}", f"# TYPE {name} gauge", f"{name} {value}"]
+    lines += counter_lines("http_request_exceptions_total", "Unhandled exceptions of the requests by route.",
+                           ("route", "exception"), request_errors)
+    lines += counter_lines("db_query_errors_total", "Failed SQL statements.", ("statement", "exception"), query_errors)
+    cache = response_cache.stats()
+    lines += counter_lines("response_cache_requests_total", "Lookups of the response cache by result.",
+                           ("result",), {("hit",): cache["hits"], ("miss",): cache["misses"]})
+    return Response("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
 
 @app.get("/articles")
-async def get_articles():
+async def get_articles(limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: str | None = None,
+                       fields: str | None = None, filters: tuple = Depends(article_filters), etag: str | None = Depends(articles_etag)):
     """
-    Retrieve all articles from the database.
+    Retrieve a page of articles from the database, ordered by article ID.
+
+    Args:
+        limit (int): The maximum number of articles to return.
+        cursor (str, optional): The `next` cursor of the previous page. Omit for the first page.
+        fields (str, optional): A comma-separated list of columns to return, e.g. `title,date,website`.
+            The article ID is always included. Omit to return all columns.
+        filters (tuple): The optional `date_from`, `date_to`, `country`, `region`, `cause_of_death`
+            and `relevant` filters, see `article_filters`.
 
     Returns:
-        dict: A dictionary containing the articles retrieved from the database.
+        dict: A dictionary containing the articles of the page and the `next` cursor,
+              which is None on the last page.
               Each article is represented as a dictionary.
-        dict: A dictionary containing an error message if an exception occurs.
     """
-    try:
-        async with app.state.pool.acquire() as connection:
-            rows = await connection.fetch('SELECT * FROM articles')
-            return {"articles": [dict(row) for row in rows]}
-    except Exception as e:
-        return {"error": str(e)}
+    after = decode_cursor(cursor)
+    columns = select_list(ARTICLES_COLUMNS, fields, "article_id")
+    cache_key = ("articles", None, columns, after, limit, filters, etag)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return json_response(cached, etag)
+    args = [after, limit + 1]
+    conditions = filter_conditions(filters, args)
+    async with app.state.pool.acquire() as connection:
+        rows = await connection.fetch(page_sql("articles", columns, "article_id", conditions), *args)
+        page, next_cursor = paginate(rows, limit, "article_id")
+        body = encode_json({"articles": page, "next": next_cursor})
+        response_cache.set(cache_key, body)
+        return json_response(body, etag)
+
+@app.get("/articles/search")
+async def search_articles(q: str = Query(min_length=1), limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                          cursor: str | None = None, relevant: bool | None = None,
+                          date_from: datetime.date | None = None, date_to: datetime.date | None = None, etag: str | None = Depends(articles_etag)):
+    """
+    Search the title, summary, content and keywords of the articles, best matches first.
+
+    Args:
+        q (str): The search query, in web search syntax: words, "quoted phrases", `or` and `-excluded` words.
+        limit (int): The maximum number of articles to return.
+        cursor (str, optional): The `next` cursor of the previous page. Omit for the first page.
+        relevant (bool, optional): Only return articles with this relevance flag.
+        date_from (date, optional): Only return articles published on or after this date.
+        date_to (date, optional): Only return articles published on or before this date.
+
+    Returns:
+        dict: A dictionary containing the matching articles of the page, with their rank, the highlighted
+              title and a highlighted snippet of the summary and content, and the `next` cursor,
+              which is None on the last page.
+    """
+    # Ranks are not unique, so the cursor holds the number of hits already returned
+    offset = decode_cursor(cursor)
+    cache_key = ("articles", None, "search", q, relevant, date_from, date_to, offset, limit, etag)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return json_response(cached, etag)
+    async with app.state.pool.acquire() as connection:
+        rows = await connection.fetch(SEARCH_ARTICLES_SQL, q, relevant, date_from, date_to, limit + 1, offset)
+        next_cursor = encode_cursor(offset + limit) if len(rows) > limit else None
+        body = encode_json({"articles": rows[:limit], "next": next_cursor})
+        response_cache.set(cache_key, body)
+        return json_response(body, etag)
 
 @app.get("/articles/{article_id}")
-async def get_articles_by_id(article_id: int):
+async def get_articles_by_id(article_id: int, fields: str | None = None, etag: str | None = Depends(articles_etag)):
     """
     Retrieve articles from the database by their ID.
 
     Args:
         article_id (int): The ID of the article to retrieve.
+        fields (str, optional): A comma-separated list of columns to return. Omit to return all columns.
 
     Returns:
         dict: A dictionary containing the retrieved articles.
-
-    Raises:
-        Exception: If there is an error while retrieving the articles.
     """
-    try:
-        async with app.state.pool.acquire() as connection:
-            rows = await connection.fetch('SELECT * FROM articles where article_id = $1', article_id)
-            return {"articles": [dict(row) for row in rows]}
-    except Exception as e:
-        return {"error": str(e)}
+    columns = select_list(ARTICLES_COLUMNS, fields, "article_id")
+    cache_key = ("articles", article_id, columns, etag)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return json_response(cached, etag)
+    async with app.state.pool.acquire() as connection:
+        rows = await connection.fetch(f'SELECT {columns} FROM articles where article_id = $1', article_id)
+        body = encode_json({"articles": rows})
+        response_cache.set(cache_key, body)
+        return json_response(body, etag)
 
 @app.get("/articles/{article_id}/relevant")
 async def set_relevant_article(article_id: int):
@@ -71,17 +1422,13 @@ async def set_relevant_article(article_id: int):
     - article_id (int): The ID of the article to update.
 
     Returns:
-    - dict: A dictionary with the key "ok" if the update is successful, or a dictionary with the key "error" if an exception occurs.
+    - dict: A dictionary with the key "ok" if the update is successful.
     """
-    try:
-        async with app.state.pool.acquire() as connection:
-            await connection.execute('UPDATE articles SET relevant = TRUE WHERE article_id = $1', article_id)
-            row = await connection.fetchrow('SELECT * FROM articles WHERE article_id = $1', article_id)
-            if row is None:
-                raise HTTPException(status_code=404, detail="Article not found")
-            return {"ok"}
-    except Exception as e:
-        return {"error": str(e)}
+    async with app.state.pool.acquire() as connection:
+        updated = await update_flag(connection, "articles", "article_id", "relevant", True, [article_id])
+        if not updated:
+            raise HTTPException(status_code=404, detail="Article not found")
+        return {"ok"}
 
 @app.get("/articles/{article_id}/irrelevant")
 async def set_irrelevant_article(article_id: int):
@@ -92,42 +1439,151 @@ async def set_irrelevant_article(article_id: int):
         article_id (int): The ID of the article to mark as irrelevant.
 
     Returns:
-        dict: A dictionary with the key "ok" if the operation was successful, or a dictionary with the key "error" if an exception occurred.
+        dict: A dictionary with the key "ok" if the operation was successful.
     """
-    try:
-        async with app.state.pool.acquire() as connection:
-            await connection.execute('UPDATE articles SET relevant = FALSE WHERE article_id = $1', article_id)
-            row = await connection.fetchrow('SELECT * FROM articles WHERE article_id = $1', article_id)
-            if row is None:
-                raise HTTPException(status_code=404, detail="Article not found")
-            return {"ok"}
-    except Exception as e:
-        return {"error": str(e)}
+    async with app.state.pool.acquire() as connection:
+        updated = await update_flag(connection, "articles", "article_id", "relevant", False, [article_id])
+        if not updated:
+            raise HTTPException(status_code=404, detail="Article not found")
+        return {"ok"}
+
+@app.post("/articles/relevance")
+async def set_articles_relevance(update: ArticleRelevanceUpdate):
+    """
+    Sets the 'relevant' flag of many articles at once.
+
+    Args:
+        update (ArticleRelevanceUpdate): The IDs of the articles and the new value of the flag.
+
+    Returns:
+        dict: A dictionary with the IDs that were updated and the IDs that do not exist.
+    """
+    async with app.state.pool.acquire() as connection:
+        updated = await update_flag(connection, "articles", "article_id", "relevant", update.relevant, update.ids)
+        missing = sorted(set(update.ids) - set(updated))
+        return {"updated": updated, "not_found": missing}
 
 @app.get("/incidents")
-async def get_incidents():
+async def get_incidents(limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: str | None = None,
+                        fields: str | None = None, ids: str | None = None, filters: tuple = Depends(incident_filters), etag: str | None = Depends(incidents_etag)):
     """
-    Retrieve all incidents from the database.
+    Retrieve a page of incidents from the database, ordered by incident ID.
+
+    Args:
+        limit (int): The maximum number of incidents to return.
+        cursor (str, optional): The `next` cursor of the previous page. Omit for the first page.
+        fields (str, optional): A comma-separated list of columns to return, e.g. `title,date,latitude,longitude`.
+            The incident ID is always included. Omit to return all columns.
+        ids (str, optional): A comma-separated list of incident IDs. If given, exactly these incidents are
+            returned together with the stubs of their articles, and `limit`, `cursor` and the filters are ignored.
+        filters (tuple): The optional `date_from`, `date_to`, `country`, `region`, `cause_of_death`
+            and `verified` filters, see `incident_filters`.
 
     Returns:
-        dict: A dictionary containing a list of incidents retrieved from the database.
+        dict: A dictionary containing a list of incidents of the page and the `next` cursor,
+              which is None on the last page.
               Each incident is represented as a dictionary.
-        dict: A dictionary containing an error message if an exception occurs during the retrieval.
     """
-    try:
-        async with app.state.pool.acquire() as connection:
-            rows = await connection.fetch('SELECT * FROM incidents')
-            return {"incidents": [dict(row) for row in rows]}
-    except Exception as e:
-        return {"error": str(e)}
-    
+    columns = select_list(INCIDENTS_COLUMNS, fields, "incident_id")
+    if ids is not None:
+        return await get_incidents_by_ids(parse_ids(ids), columns, etag)
+    after = decode_cursor(cursor)
+    cache_key = ("incidents", None, columns, after, limit, filters, etag)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return json_response(cached, etag)
+    args = [after, limit + 1]
+    conditions = filter_conditions(filters, args)
+    async with app.state.pool.acquire() as connection:
+        rows = await connection.fetch(page_sql("incidents", columns, "incident_id", conditions), *args)
+        page, next_cursor = paginate(rows, limit, "incident_id")
+        body = encode_json({"incidents": page, "next": next_cursor})
+        response_cache.set(cache_key, body)
+        return json_response(body, etag)
+
+
+async def get_incidents_by_ids(ids, columns, etag=None):
+    """
+    Retrieve many incidents with the stubs of their articles in a single query.
+
+    Args:
+        ids (list): The IDs of the incidents.
+        columns (str): The SELECT list of incident columns, as returned by `select_list`.
+        etag (str, optional): The ETag of the response.
+
+    Returns:
+        RecordJSONResponse: The incidents found, ordered by incident ID, each with an
+              "articles" list, and the IDs that were not found.
+    """
+    cache_key = ("incidents", None, columns, "ids", tuple(ids), etag)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return json_response(cached, etag)
+    async with app.state.pool.acquire() as connection:
+        rows = await connection.fetch(incidents_sql(columns, 'incident_id = ANY($1::int[])'), ids)
+        found = {row["incident_id"] for row in rows}
+        body = encode_json({"incidents": rows, "not_found": [incident_id for incident_id in ids if incident_id not in found]})
+        response_cache.set(cache_key, body)
+        return json_response(body, etag)
+
+
+@app.get("/incidents/bbox")
+async def get_incidents_in_bbox(west: float = Query(ge=-180, le=180), south: float = Query(ge=-90, le=90),
+                                east: float = Query(ge=-180, le=180), north: float = Query(ge=-90, le=90),
+                                zoom: int = Query(ge=0, le=22), etag: str | None = Depends(conditional_get("incidents"))):
+    """
+    Retrieve the incidents inside a map viewport.
+
+    Up to zoom level `CLUSTER_MAX_ZOOM` the incidents are returned as clusters, one per cell of the
+    incident grid, with the number of incidents, their totals and their centroid. The grid is kept
+    up to date by triggers on the 'incidents' table, so no incidents are read. At higher zoom levels the
+    individual incidents are returned. At most `MAX_MAP_ITEMS` items are returned in either case.
+
+    Args:
+        west (float): The western edge of the viewport in degrees; greater than `east` across the antimeridian.
+        south (float): The southern edge of the viewport in degrees.
+        east (float): The eastern edge of the viewport in degrees.
+        north (float): The northern edge of the viewport in degrees.
+        zoom (int): The zoom level of the map.
+
+    Returns:
+        dict: A dictionary containing either the clusters or the incidents in the viewport, and
+              whether the result was truncated to `MAX_MAP_ITEMS` items.
+    """
+    if south > north:
+        raise HTTPException(status_code=400, detail="south must not be greater than north")
+    cache_key = ("incidents", None, "bbox", west, south, east, north, zoom, etag)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return json_response(cached, etag)
+    ranges = longitude_ranges(west, east)
+    if len(ranges) == 1:
+        ranges.append(ranges[0])
+    async with app.state.pool.acquire() as connection:
+        if zoom <= CLUSTER_MAX_ZOOM:
+            size = grid_cell_size(zoom)
+            cells = [int((value + offset) // size) for value, offset in (
+                (south, 90), (north, 90), (ranges[0][0], 180), (ranges[0][1], 180), (ranges[1][0], 180), (ranges[1][1], 180)
+            )]
+            rows = await connection.fetch(MAP_CLUSTERS_SQL, zoom, *cells, MAX_MAP_ITEMS + 1)
+            key = "clusters"
+        else:
+            rows = await connection.fetch(
+                MAP_INCIDENTS_SQL, south, north, ranges[0][0], ranges[0][1], ranges[1][0], ranges[1][1], MAX_MAP_ITEMS + 1)
+            key = "incidents"
+        body = encode_json({"zoom": zoom, key: rows[:MAX_MAP_ITEMS], "truncated": len(rows) > MAX_MAP_ITEMS})
+        response_cache.set(cache_key, body)
+        return json_response(body, etag)
+
+
 @app.get("/incidents/{incident_id}")
-async def get_incident_by_id(incident_id: int):
+async def get_incident_by_id(incident_id: int, fields: str | None = None, etag: str | None = Depends(incidents_etag)):
     """
     Retrieve an incident by its ID.
 
     Parameters:
     - incident_id (int): The ID of the incident to retrieve.
+    - fields (str, optional): A comma-separated list of incident columns to return. Omit to return all columns.
 
     Returns:
     - dict: A dictionary containing the incident details and associated articles, if any.
@@ -136,18 +1592,20 @@ async def get_incident_by_id(incident_id: int):
             "incident": [dict(row) for row in rows],
             "articles": [dict(row) for row in articles]
         }
-    - If the incident is not found or an error occurs, the dictionary will have the following structure:
-        {
-            "error": str(e)
-        }
+    - If the incident is not found, both lists are empty.
     """
-    try:
-        async with app.state.pool.acquire() as connection:
-            rows = await connection.fetch('SELECT * FROM incidents where incident_id = $1', incident_id)
-            articles = await connection.fetch('SELECT article_id, website, title, date FROM articles WHERE article_id IN (SELECT article_id FROM mapping WHERE incident_id = $1)', incident_id)
-            return {"incident": [dict(row) for row in rows], "articles": [dict(row) for row in articles]}
-    except Exception as e:
-        return {"error": str(e)}
+    columns = select_list(INCIDENTS_COLUMNS, fields, "incident_id")
+    cache_key = ("incidents", incident_id, columns, etag)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return json_response(cached, etag)
+    async with app.state.pool.acquire() as connection:
+        row = await connection.fetchrow(incidents_sql(columns, 'incident_id = $1'), incident_id)
+        incident = dict(row) if row is not None else None
+        articles = incident.pop("articles") if incident is not None else []
+        body = encode_json({"incident": [incident] if incident is not None else [], "articles": articles})
+        response_cache.set(cache_key, body)
+        return json_response(body, etag)
 
 @app.get("/incidents/{incident_id}/verified")
 async def set_verified_incident(incident_id: int):
@@ -158,21 +1616,19 @@ async def set_verified_incident(incident_id: int):
     - incident_id (int): The ID of the incident to be verified.
 
     Returns:
-    - dict: A dictionary with the key "ok" if the incident was successfully verified,
-            or a dictionary with the key "error" and the error message if an exception occurred.
+    - dict: A dictionary with the key "ok" if the incident was successfully verified.
+
+    Raises:
+    - HTTPException: 404 if the incident does not exist.
     """
-    try:
-        async with app.state.pool.acquire() as connection:
-            await connection.execute('UPDATE incidents SET verified = TRUE WHERE incident_id = $1', incident_id)
-            row = await connection.fetchrow('SELECT * FROM incidents WHERE incident_id = $1', incident_id)
-            if row is None:
-                raise HTTPException(status_code=404, detail="Incident not found")
-            return {"ok"}
-    except Exception as e:
-        return {"error": str(e)}
+    async with app.state.pool.acquire() as connection:
+        updated = await update_flag(connection, "incidents", "incident_id", "verified", True, [incident_id])
+        if not updated:
+            raise HTTPException(status_code=404, detail="Incident not found")
+        return {"ok"}
     
 @app.get("/incidents/{incident_id}/unverified")
-async def set_verified_incident(incident_id: int):
+async def set_unverified_incident(incident_id: int):
     """
     Sets the 'verified' status of an incident to False.
 
@@ -180,14 +1636,240 @@ async def set_verified_incident(incident_id: int):
     - incident_id (int): The ID of the incident to update.
     
     Returns:
-    - dict: A dictionary with the key "ok" if the update was successful, or a dictionary with the key "error" if an exception occurred.
+    - dict: A dictionary with the key "ok" if the update was successful.
     """
-    try:
-        async with app.state.pool.acquire() as connection:
-            await connection.execute('UPDATE incidents SET verified = FALSE WHERE incident_id = $1', incident_id)
-            row = await connection.fetchrow('SELECT * FROM incidents WHERE incident_id = $1', incident_id)
-            if row is None:
-                raise HTTPException(status_code=404, detail="Incident not found")
-            return {"ok"}
-    except Exception as e:
-        return {"error": str(e)}
+    async with app.state.pool.acquire() as connection:
+        updated = await update_flag(connection, "incidents", "incident_id", "verified", False, [incident_id])
+        if not updated:
+            raise HTTPException(status_code=404, detail="Incident not found")
+        return {"ok"}
+
+
+@app.post("/incidents/verification")
+async def set_incidents_verification(update: IncidentVerificationUpdate):
+    """
+    Sets the 'verified' status of many incidents at once.
+
+    Args:
+        update (IncidentVerificationUpdate): The IDs of the incidents and the new verification status.
+
+    Returns:
+        dict: A dictionary with the IDs that were updated and the IDs that do not exist.
+    """
+    async with app.state.pool.acquire() as connection:
+        updated = await update_flag(connection, "incidents", "incident_id", "verified", update.verified, update.ids)
+        missing = sorted(set(update.ids) - set(updated))
+        return {"updated": updated, "not_found": missing}
+
+@app.get("/stats")
+async def get_stats(by: str | None = None, include_unverified: bool = False, etag: str | None = Depends(conditional_get("incidents"))):
+    """
+    Retrieve the totals of the incidents grouped by month, region, country and cause of death.
+
+    The totals are read from the 'incident_stats' rollup, which triggers on the 'incidents' table keep
+    up to date, so no incidents are read.
+
+    Args:
+        by (str, optional): A comma-separated list of dimensions to group by, all of `STATS_DIMENSIONS` if omitted.
+        include_unverified (bool): Whether to count the unverified incidents as well.
+
+    Returns:
+        dict: For each dimension, the number of incidents and the totals of `STATS_MEASURES` per value.
+              Incidents without a value are grouped under null.
+    """
+    dimensions = list(STATS_DIMENSIONS) if by is None else [name.strip() for name in by.split(",") if name.strip()]
+    unknown = [name for name in dimensions if name not in STATS_DIMENSIONS]
+    if unknown or not dimensions:
+        raise HTTPException(status_code=400, detail=f"Unknown dimension: {', '.join(unknown)}")
+    cache_key = ("incidents", None, "stats", tuple(dimensions), include_unverified, etag)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return json_response(cached, etag)
+    async with app.state.pool.acquire() as connection:
+        rows = await connection.fetch(STATS_SQL, dimensions, include_unverified)
+        result = {name: [] for name in dimensions}
+        for row in rows:
+            entry = dict(row)
+            result[entry.pop("dimension")].append(entry)
+        body = encode_json(result)
+        response_cache.set(cache_key, body)
+        return json_response(body, etag)
+
+@app.get("/export/articles")
+async def export_articles(format: str = "ndjson", fields: str | None = None, etag: str | None = Depends(articles_etag)):
+    """
+    Export all articles as a stream, for bulk downloads by analysts.
+
+    Args:
+        format (str): The export format, either `ndjson` (one JSON object per line) or `csv`.
+        fields (str, optional): A comma-separated list of columns to export. Omit to export all columns.
+
+    Returns:
+        ExportResponse: The articles, ordered by article ID.
+    """
+    columns = select_list(ARTICLES_COLUMNS, fields, "article_id")
+    return await export_response("articles", columns, "article_id", format, etag)
+
+
+@app.get("/export/incidents")
+async def export_incidents(format: str = "ndjson", fields: str | None = None,
+                           etag: str | None = Depends(conditional_get("incidents"))):
+    """
+    Export all incidents as a stream, for bulk downloads by analysts.
+
+    Args:
+        format (str): The export format, either `ndjson` (one JSON object per line) or `csv`.
+        fields (str, optional): A comma-separated list of columns to export. Omit to export all columns.
+
+    Returns:
+        ExportResponse: The incidents, ordered by incident ID.
+    """
+    columns = select_list(INCIDENTS_COLUMNS, fields, "incident_id")
+    return await export_response("incidents", columns, "incident_id", format, etag)
+
+
+def accepted_encodings(accept_encoding):
+    """
+    Parse an Accept-Encoding header.
+
+    Args:
+        accept_encoding (str): The header value, e.g. `gzip, deflate, br;q=0.9`.
+
+    Returns:
+        set: The content codings the client accepts, without those it refuses with `q=0`.
+    """
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, _, parameters = part.partition(";")
+        parameter = parameters.strip().replace(" ", "")
+        if parameter.startswith("q="):
+            try:
+                if float(parameter[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+@app.get("/snapshots")
+async def get_snapshots():
+    """
+    List the current snapshots of the full incident and article lists.
+
+    Returns:
+        dict: For every dataset, the URL of its current file, the number of rows, the size in bytes per
+              encoding, the change counters of its tables and when it was built.
+    """
+    manifest = snapshots.read_manifest()
+    if not manifest:
+        raise HTTPException(status_code=503, detail="Snapshots are being built", headers={"Retry-After": "10"})
+    return JSONResponse(
+        {name: {"url": f"/snapshots/{name}.{snapshot['hash']}.json", **snapshot} for name, snapshot in manifest.items()},
+        headers={"Cache-Control": SNAPSHOT_REDIRECT_CACHE_CONTROL},
+    )
+
+
+@app.get("/snapshots/{file_name}")
+async def get_snapshot_file(file_name: str, request: Request):
+    """
+    Serve a snapshot file, or redirect to the current one.
+
+    `/snapshots/incidents.json` redirects to the current file of the dataset, e.g.
+    `/snapshots/incidents.3f2a9c0d41b7e865.json`, which is sent as stored: brotli or gzip compressed,
+    depending on Accept-Encoding, and cacheable forever. Files are sent without a database query and
+    without compressing anything per request. A file missing locally, e.g. because another instance
+    redirected to it, is built first if the local snapshot is older than the data, see
+    `build_stale_snapshot`.
+
+    Args:
+        file_name (str): `<dataset>.json`, or `<dataset>.<hash>.json` for the file of a given content.
+
+    Returns:
+        Response: The redirect, or the file.
+    """
+    match = re.fullmatch(r"(\w+)(?:\.([0-9a-f]+))?\.json", file_name)
+    if match is None or match.group(1) not in snapshots.DATASETS:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    name, digest = match.groups()
+    if digest is None:
+        snapshot = snapshots.read_manifest().get(name)
+        if snapshot is None:
+            raise HTTPException(status_code=503, detail="Snapshots are being built", headers={"Retry-After": "10"})
+        return RedirectResponse(f"/snapshots/{name}.{snapshot['hash']}.json", status_code=307,
+                                headers={"Cache-Control": SNAPSHOT_REDIRECT_CACHE_CONTROL})
+    if not any(os.path.exists(snapshots.snapshot_path(snapshots.SNAPSHOT_DIR, name, digest, encoding))
+               for encoding in snapshots.ENCODINGS):
+        await build_stale_snapshot(name)
+    headers = {"Cache-Control": SNAPSHOT_FILE_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+    for encoding in snapshots.ENCODINGS:
+        path = snapshots.snapshot_path(snapshots.SNAPSHOT_DIR, name, digest, encoding)
+        if (encoding in accepted or "*" in accepted) and os.path.exists(path):
+            return FileResponse(path, media_type="application/json",
+                                headers={**headers, "Content-Encoding": encoding, "ETag": f'"{digest}-{encoding}"'})
+    # Clients that accept no compression are rare; decompress the gzip file for them
+    path = snapshots.snapshot_path(snapshots.SNAPSHOT_DIR, name, digest, "gzip")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    return StreamingResponse(decompressed_chunks(path), media_type="application/json",
+                             headers={**headers, "ETag": f'"{digest}"'})
+
+
+def decompressed_chunks(path):
+    """
+    Yield the decompressed contents of a gzip file in chunks; iterated in a worker thread by Starlette.
+    """
+    with gzip.open(path, "rb") as file:
+        while chunk := file.read(SNAPSHOT_CHUNK_BYTES):
+            yield chunk
+
+
+@app.post("/jobs/reprocess", status_code=202)
+async def start_reprocess_job(job: ReprocessJob | None = None):
+    """
+    Start processing the articles in the background, see `db_operations.process_articles`.
+
+    The processing runs in a worker process, so requests are served as usual while it runs.
+    Only one processing job runs at a time.
+
+    Args:
+        job (ReprocessJob, optional): Whether to regroup all articles (`full`) instead of the new ones only.
+
+    Returns:
+        Response: 202 with the ID and the URL of the job, or 409 with the ID of the job that is already
+                  queued or running.
+    """
+    job = job or ReprocessJob()
+    async with app.state.pool.acquire() as connection:
+        async with connection.transaction():
+            await connection.execute(EXPIRE_JOBS_SQL, jobs.REPROCESS, jobs.STALE_JOB_SECONDS, jobs.QUEUED_JOB_SECONDS,
+                                     PROCESSING_LOCK_ID)
+            job_id = await connection.fetchval(INSERT_JOB_SQL, jobs.REPROCESS, job.model_dump())
+            if job_id is None:
+                active = await connection.fetchval(
+                    "SELECT job_id FROM jobs WHERE kind = $1 AND status IN ('queued', 'running')", jobs.REPROCESS)
+                return JSONResponse({"detail": "Articles are already being processed", "job_id": active}, status_code=409)
+    jobs.submit(jobs.run_reprocess, job_id, job.full)
+    return JSONResponse({"job_id": job_id, "status": "queued", "url": f"/jobs/{job_id}"}, status_code=202,
+                        headers={"Location": f"/jobs/{job_id}"})
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: int):
+    """
+    Report the state of a background job.
+
+    Args:
+        job_id (int): The ID of the job.
+
+    Returns:
+        dict: The `status` of the job ('queued', 'running', 'succeeded' or 'failed'), its last completed
+              `step` and `progress` from 0 to 1, the statistics of the run so far (row counts and the
+              seconds of each step), the `error` of a failed job, its timestamps and its duration in `seconds`.
+    """
+    async with app.state.pool.acquire() as connection:
+        row = await connection.fetchrow(JOB_SQL, job_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return json_response(encode_json(row))
@@ -0,0 +1,437 @@
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+import psycopg2
+
+import db_operations
+import jobs
+from db_operations import (
+    ARTICLE_DEDUP_INDEXES, ARTICLE_DEDUP_SQL, ARTICLE_QUEUE_SQL, ARTICLE_SEARCH_INDEXES, ARTICLE_SEARCH_SQL,
+    ARTICLES_COLUMNS, INCIDENT_GRID_SQL, INCIDENT_STATS_SQL, INCIDENTS_COLUMNS, MAPPING_TABLE_SQL,
+    PROCESSING_LOCK_ID, PROCESSING_STATE_SQL, TABLE_INDEXES, create_table_sql, incident_grid_delta_sql,
+    incident_grid_sql, incident_stats_delta_sql, incident_stats_sql, install_version_trigger, signed_rows_sql,
+    store_fingerprints,
+)
+
+"""
+Versioned schema migrations.
+
+`MIGRATIONS` is the ordered list of changes to the schema. `migrate` applies the ones that are not yet
+recorded in the 'schema_migrations' table, in order. Every migration is idempotent, so a migration that
+failed halfway, or a database created with the create_*_table functions, is brought up to date by
+running `migrate` again.
+
+Migrations run online next to the API: indexes are built with CREATE INDEX CONCURRENTLY, backfills
+update `BACKFILL_BATCH_SIZE` rows per transaction, and DDL gives up after `LOCK_TIMEOUT` instead of
+queueing the API's queries behind it (see `ddl`). Index builds, backfills and the migration lock wait
+as long as they need, as they do not block the API while they wait.
+
+Usage:
+    python migrations.py           apply the pending migrations
+    python migrations.py status    list the migrations and whether they are applied
+"""
+
+# Number of rows updated per transaction by a backfill
+BACKFILL_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "5000"))
+# Maximum time a DDL statement waits for a table lock
+LOCK_TIMEOUT = os.getenv("MIGRATION_LOCK_TIMEOUT", "5s")
+# Key of the advisory lock held while migrating, so that only one process migrates at a time
+MIGRATION_LOCK_ID = 7310
+
+SCHEMA_MIGRATIONS_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    duration_ms INTEGER NOT NULL
+);
+"""
+
+
+@contextmanager
+def transaction(conn):
+    """
+    Run statements in a transaction, committed on success and rolled back on error.
+
+    Args:
+        conn: The migration connection.
+
+    Yields:
+        cursor: A cursor of the transaction.
+    """
+    try:
+        with conn.cursor() as cursor:
+            yield cursor
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+@contextmanager
+def ddl(conn):
+    """
+    Run DDL statements in a transaction, giving up after `LOCK_TIMEOUT` if a table lock is not granted.
+
+    A DDL statement waiting for a table lock blocks every query on the table queued behind it, so it
+    fails instead, and the migration is run again later.
+
+    Args:
+        conn: The migration connection.
+
+    Yields:
+        cursor: A cursor of the transaction.
+    """
+    with transaction(conn) as cursor:
+        cursor.execute("SET LOCAL lock_timeout = %s", (LOCK_TIMEOUT,))
+        yield cursor
+
+
+def create_indexes_concurrently(conn, table_name, indexes):
+    """
+    Build indexes without blocking writes to the table.
+
+    CREATE INDEX CONCURRENTLY cannot run in a transaction, and leaves an invalid index behind if it fails.
+    Invalid indexes are dropped and built again.
+
+    Args:
+        conn: The migration connection.
+        table_name (str): The name of the table.
+        indexes (dict): A mapping of index name to index definition, see `db_operations.TABLE_INDEXES`.
+
+    Returns:
+        None
+    """
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            for name, definition in indexes.items():
+                cursor.execute(
+                    "SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)", (name,)
+                )
+                row = cursor.fetchone()
+                if row and row[0]:
+                    print(f"Dropping invalid index {name}")
+                    cursor.execute(f"DROP INDEX CONCURRENTLY {name}")
+                cursor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table_name} {definition}")
+    finally:
+        conn.autocommit = False
+
+
+def backfill(conn, table_name, key, update_sql, batch_size=BACKFILL_BATCH_SIZE):
+    """
+    Run an UPDATE over a table in batches of primary keys, one transaction per batch.
+
+    Only a batch of rows is locked at a time, so the API keeps writing to the table, and an interrupted
+    backfill resumes where it stopped if `update_sql` skips the rows that are already done.
+
+    Args:
+        conn: The migration connection.
+        table_name (str): The name of the table.
+        key (str): The integer primary key column of the table.
+        update_sql (str): The UPDATE statement, with two %s placeholders for the exclusive lower and
+            inclusive upper bound of the keys of a batch.
+        batch_size (int): The number of keys per batch.
+
+    Returns:
+        int: The number of updated rows.
+    """
+    with transaction(conn) as cursor:
+        cursor.execute(f"SELECT COALESCE(min({key}), 1) - 1, COALESCE(max({key}), 0) FROM {table_name}")
+        first, last = cursor.fetchone()
+    updated = 0
+    for lower in range(first, last, batch_size):
+        with transaction(conn) as cursor:
+            cursor.execute(update_sql, (lower, lower + batch_size))
+            updated += cursor.rowcount
+    print(f"Backfilled {updated} rows of {table_name}")
+    return updated
+
+
+def create_tables(conn):
+    """
+    The tables of the API, with their change counters, and the state of `process_articles`.
+    """
+    with ddl(conn) as cursor:
+        cursor.execute(create_table_sql("articles", ARTICLES_COLUMNS))
+        cursor.execute(create_table_sql("incidents", INCIDENTS_COLUMNS))
+        cursor.execute(MAPPING_TABLE_SQL)
+        cursor.execute(PROCESSING_STATE_SQL)
+        for table_name in ("articles", "incidents", "mapping"):
+            install_version_trigger(cursor, table_name)
+
+
+def create_secondary_indexes(conn):
+    """
+    The indexes of the filter parameters and of the reverse mapping.
+    """
+    for table_name, indexes in TABLE_INDEXES.items():
+        create_indexes_concurrently(conn, table_name, indexes)
+
+
+def create_article_search(conn):
+    """
+    The full-text search over the articles.
+    """
+    with ddl(conn) as cursor:
+        cursor.execute(ARTICLE_SEARCH_SQL)
+    # Touching a searched column fires the trigger that computes the search vector
+    backfill(conn, "articles", "article_id", """
+        UPDATE articles SET title = title
+        WHERE article_id > %s AND article_id <= %s AND search_vector IS NULL
+    """)
+    create_indexes_concurrently(conn, "articles", ARTICLE_SEARCH_INDEXES)
+
+
+# Highest incident ID included in a rollup, per rollup being backfilled, see `backfill_rollup`
+ROLLUP_BACKFILLS_SQL = """
+    CREATE TABLE IF NOT EXISTS rollup_backfills (
+    rollup TEXT PRIMARY KEY,
+    incident_id INTEGER NOT NULL
+);
+"""
+
+
+def backfill_rollup(conn, table_name, rollup_sql, delta_sql):
+    """
+    Create a rollup of the 'incidents' table with its triggers, and fill it from the existing incidents.
+
+    The triggers are created first, then the incidents are added in batches of `BACKFILL_BATCH_SIZE` IDs,
+    so that writes to 'incidents' are only blocked for one batch at a time. Until the backfill is done,
+    the triggers ignore the incidents above the last batch, which a later batch adds. Every batch takes a
+    SHARE lock on 'incidents', so no incident of the batch is written while it is added, or was written
+    without being seen by it. The last batch installs the triggers without the filter. An interrupted
+    backfill resumes from its last batch.
+
+    Args:
+        conn: The migration connection.
+        table_name (str): The name of the rollup table.
+        rollup_sql (callable): Builds the rollup table and its triggers, e.g. `incident_grid_sql`.
+        delta_sql (callable): Builds the statement applying signed incidents, e.g. `incident_grid_delta_sql`.
+
+    Returns:
+        None
+    """
+    backfilled = f"(SELECT incident_id FROM rollup_backfills WHERE rollup = '{table_name}')"
+    with ddl(conn) as cursor:
+        cursor.execute(ROLLUP_BACKFILLS_SQL)
+        cursor.execute(f"SELECT {backfilled}")
+        if cursor.fetchone()[0] is None:
+            cursor.execute(rollup_sql(backfilled))
+            cursor.execute(f"TRUNCATE {table_name}")
+            cursor.execute(
+                "INSERT INTO rollup_backfills (rollup, incident_id) "
+                "SELECT %s, COALESCE(min(incident_id), 1) - 1 FROM incidents",
+                (table_name,),
+            )
+    while True:
+        with ddl(conn) as cursor:
+            cursor.execute("LOCK TABLE incidents IN SHARE MODE")
+            cursor.execute(f"SELECT {backfilled}, (SELECT COALESCE(max(incident_id), 0) FROM incidents)")
+            lower, last = cursor.fetchone()
+            if lower >= last:
+                cursor.execute(rollup_sql())
+                cursor.execute("DELETE FROM rollup_backfills WHERE rollup = %s", (table_name,))
+                cursor.execute("SELECT NOT EXISTS (SELECT FROM rollup_backfills)")
+                if cursor.fetchone()[0]:
+                    cursor.execute("DROP TABLE rollup_backfills")
+                break
+            upper = min(lower + BACKFILL_BATCH_SIZE, last)
+            cursor.execute(delta_sql(signed_rows_sql(
+                f"(SELECT * FROM incidents WHERE incident_id > {lower} AND incident_id <= {upper})", 1)))
+            cursor.execute("UPDATE rollup_backfills SET incident_id = %s WHERE rollup = %s", (upper, table_name))
+    print(f"Backfilled {table_name} with incident IDs up to {last}")
+
+
+def create_incident_grid(conn):
+    """
+    The incident grid used for map clustering.
+    """
+    backfill_rollup(conn, "incident_grid", incident_grid_sql, incident_grid_delta_sql)
+
+
+def create_incident_stats(conn):
+    """
+    The incident statistics served by the '/stats' endpoint.
+    """
+    backfill_rollup(conn, "incident_stats", incident_stats_sql, incident_stats_delta_sql)
+
+
+def order_rollup_updates(conn):
+    """
+    Rollup triggers that apply each statement in one upsert in key order, which cannot deadlock.
+    """
+    with ddl(conn) as cursor:
+        cursor.execute(INCIDENT_GRID_SQL)
+        cursor.execute(INCIDENT_STATS_SQL)
+
+
+def create_jobs(conn):
+    """
+    The background jobs of the API.
+    """
+    with ddl(conn) as cursor:
+        cursor.execute(jobs.JOBS_SQL)
+
+
+def create_article_dedup(conn):
+    """
+    The fingerprints of the articles, for the detection of duplicates at ingestion.
+
+    The fingerprints are calculated in Python, so the backfill copies them batch by batch into a temporary
+    table and updates the articles from it. Articles are never fingerprinted with NULL buckets, which marks
+    the ones still to do. Duplicates among the existing articles are indexed, but not removed.
+    """
+    with ddl(conn) as cursor:
+        cursor.execute(ARTICLE_DEDUP_SQL)
+    with transaction(conn) as cursor:
+        cursor.execute("SELECT COALESCE(min(article_id), 1) - 1, COALESCE(max(article_id), 0) FROM articles")
+        first, last = cursor.fetchone()
+    updated = 0
+    for lower in range(first, last, BACKFILL_BATCH_SIZE):
+        with transaction(conn) as cursor:
+            cursor.execute(
+                "SELECT article_id, website, content FROM articles "
+                "WHERE article_id > %s AND article_id <= %s AND lsh_buckets IS NULL",
+                (lower, lower + BACKFILL_BATCH_SIZE),
+            )
+            updated += store_fingerprints(cursor, cursor.fetchall())
+    print(f"Backfilled {updated} rows of articles")
+    for table_name, indexes in ARTICLE_DEDUP_INDEXES.items():
+        create_indexes_concurrently(conn, table_name, indexes)
+
+
+def create_article_queue(conn):
+    """
+    The queue of the articles not processed yet, which replaces the high-water mark of `process_articles`.
+
+    The trigger filling the queue is created first, so the articles inserted during the backfill are queued
+    by it. The backfill then queues the articles without a mapping, batch by batch, including the ones the
+    high-water mark skipped. Every batch holds the lock of `process_articles`, so that no run maps the
+    articles of a batch while it queues them.
+    """
+    with ddl(conn) as cursor:
+        cursor.execute(ARTICLE_QUEUE_SQL)
+    with transaction(conn) as cursor:
+        cursor.execute("SELECT COALESCE(min(article_id), 1) - 1, COALESCE(max(article_id), 0) FROM articles")
+        first, last = cursor.fetchone()
+    queued = 0
+    for lower in range(first, last, BACKFILL_BATCH_SIZE):
+        with transaction(conn) as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (PROCESSING_LOCK_ID,))
+            cursor.execute(
+                """
+                INSERT INTO unprocessed_articles (article_id)
+                SELECT article_id FROM articles a WHERE article_id > %s AND article_id <= %s
+                AND NOT EXISTS (SELECT FROM mapping m WHERE m.article_id = a.article_id)
+                ON CONFLICT DO NOTHING
+                """,
+                (lower, lower + BACKFILL_BATCH_SIZE),
+            )
+            queued += cursor.rowcount
+    print(f"Queued {queued} unprocessed articles")
+    with ddl(conn) as cursor:
+        cursor.execute("DROP TABLE IF EXISTS processing_state")
+
+
+def index_unfingerprinted_articles(conn):
+    """
+    The partial index of the articles inserted without fingerprints, which `fingerprint_articles` reads.
+    """
+    create_indexes_concurrently(conn, "articles", {
+        "articles_unfingerprinted_idx": ARTICLE_DEDUP_INDEXES["articles"]["articles_unfingerprinted_idx"],
+    })
+
+
+# Version, name and function of every migration, in the order they are applied.
+# Append new migrations with the next version; never change or reorder applied ones.
+MIGRATIONS = [
+    (1, "create_tables", create_tables),
+    (2, "create_secondary_indexes", create_secondary_indexes),
+    (3, "create_article_search", create_article_search),
+    (4, "create_incident_grid", create_incident_grid),
+    (5, "create_incident_stats", create_incident_stats),
+    (6, "order_rollup_updates", order_rollup_updates),
+    (7, "create_jobs", create_jobs),
+    (8, "create_article_dedup", create_article_dedup),
+    (9, "create_article_queue", create_article_queue),
+    (10, "index_unfingerprinted_articles", index_unfingerprinted_articles),
+]
+
+
+def applied_migrations(conn):
+    """
+    Retrieve the versions of the applied migrations.
+
+    Args:
+        conn: The migration connection.
+
+    Returns:
+        set: The versions recorded in the 'schema_migrations' table.
+    """
+    with transaction(conn) as cursor:
+        cursor.execute(SCHEMA_MIGRATIONS_SQL)
+        cursor.execute("SELECT version FROM schema_migrations")
+        return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(target=None):
+    """
+    Apply the pending migrations in order.
+
+    Args:
+        target (int, optional): The version to migrate up to. Omit to apply all migrations.
+
+    Returns:
+        list: The versions of the migrations that were applied.
+    """
+    conn = psycopg2.connect(**db_operations.params)
+    try:
+        with transaction(conn) as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        applied = applied_migrations(conn)
+        newly_applied = []
+        for version, name, migration in MIGRATIONS:
+            if version in applied or (target is not None and version > target):
+                continue
+            print(f"Applying migration {version} {name}")
+            start = time.perf_counter()
+            migration(conn)
+            duration_ms = round((time.perf_counter() - start) * 1000)
+            with transaction(conn) as cursor:
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, name, duration_ms) VALUES (%s, %s, %s)",
+                    (version, name, duration_ms),
+                )
+            print(f"Applied migration {version} {name} in {duration_ms} ms")
+            newly_applied.append(version)
+        if not newly_applied:
+            print("Schema is up to date")
+        return newly_applied
+    finally:
+        conn.close()
+
+
+def status():
+    """
+    Print every migration and whether it is applied.
+
+    Returns:
+        None
+    """
+    conn = psycopg2.connect(**db_operations.params)
+    try:
+        applied = applied_migrations(conn)
+    finally:
+        conn.close()
+    for version, name, _ in MIGRATIONS:
+        print(f"{version:>4} {name:<32} {'applied' if version in applied else 'pending'}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["status"]:
+        status()
+    else:
+        migrate()
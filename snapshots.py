@@ -0,0 +1,261 @@
+import gzip
+import hashlib
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import brotli
+import orjson
+
+import db_operations
+from db_operations import ARTICLES_COLUMNS, INCIDENT_ARTICLES_SQL, INCIDENTS_COLUMNS
+
+"""
+Precomputed snapshots of the full incident and article lists, served as static files by the API.
+
+`build` writes every dataset of `DATASETS` as JSON, compressed once with gzip and once with brotli, to
+files named after the hash of their contents, e.g. 'incidents.3f2a9c0d41b7e865.json.br'. Since a name
+always denotes the same bytes, the files can be cached forever. The 'manifest.json' of the directory
+records the current file of every dataset and the change counters of the tables it was built from
+(see `table_versions`), so a dataset is only rebuilt when one of its tables changed.
+
+The API rebuilds the snapshots in the worker process of its jobs once the changes it is notified of
+settle, which includes the runs of `process_articles`. Every instance of the API builds the snapshots
+in its own `SNAPSHOT_DIR`, unless the directory is a volume shared by all of them.
+
+Usage:
+    python snapshots.py            build the snapshots whose tables changed
+    python snapshots.py --force    rebuild all snapshots
+"""
+
+# Directory of the snapshot files
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", "snapshots")
+# Seconds the replaced files of a dataset are kept, so that clients redirected to them can still download them
+SNAPSHOT_RETENTION_SECONDS = float(os.environ.get("SNAPSHOT_RETENTION_SECONDS", 3600))
+# Compression settings; the files are built once and downloaded many times, so compression is strong
+GZIP_LEVEL = 9
+BROTLI_QUALITY = int(os.environ.get("SNAPSHOT_BROTLI_QUALITY", 9))
+# Rows fetched per round trip of the server-side cursor
+FETCH_SIZE = 5000
+# Number of hex digits of the content hash in the file names
+HASH_LENGTH = 16
+# File suffix of every Content-Encoding
+ENCODINGS = {
+    "br": ".json.br",
+    "gzip": ".json.gz",
+}
+MANIFEST = "manifest.json"
+
+# The tables every snapshot is built from and its query. The rows are ordered, so that the same data
+# always gives the same file. The documents have the shape of the list endpoints, without `next`.
+DATASETS = {
+    "incidents": (
+        ("incidents", "mapping", "articles"),
+        f"SELECT {', '.join(INCIDENTS_COLUMNS)}, {INCIDENT_ARTICLES_SQL} FROM incidents i ORDER BY incident_id",
+    ),
+    "articles": (
+        ("articles",),
+        f"SELECT {', '.join(column for column in ARTICLES_COLUMNS if column != 'content')} "
+        "FROM articles ORDER BY article_id",
+    ),
+}
+
+
+def encode_default(value):
+    """
+    Encode the DECIMAL coordinates, which orjson does not know, as numbers.
+    """
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def read_manifest(directory=SNAPSHOT_DIR):
+    """
+    Read the manifest of a snapshot directory.
+
+    Args:
+        directory (str): The snapshot directory.
+
+    Returns:
+        dict: The current snapshot of every built dataset, by name, or an empty dict if nothing was built yet.
+              A snapshot has the `hash` of its file names, the number of `rows`, the size in `bytes` per
+              encoding, the `versions` of its tables and the time it was `built_at`.
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST), "rb") as manifest:
+            return orjson.loads(manifest.read())
+    except FileNotFoundError:
+        return {}
+
+
+def snapshot_path(directory, name, digest, encoding):
+    """
+    Returns:
+        str: The path of the file of a dataset with the given content hash and Content-Encoding.
+    """
+    return os.path.join(directory, f"{name}.{digest}{ENCODINGS[encoding]}")
+
+
+def replace_atomically(directory, path, content):
+    """
+    Write a file under a temporary name and move it into place, so that readers never see a partial file.
+    """
+    descriptor, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(descriptor, "wb") as file:
+        file.write(content)
+    os.chmod(temporary, 0o644)
+    os.replace(temporary, path)
+
+
+def write_snapshot(conn, directory, name, query):
+    """
+    Stream the rows of a query into the compressed files of a dataset.
+
+    The JSON is written to both compressors and hashed chunk by chunk, so the uncompressed document
+    is never held in memory.
+
+    Args:
+        conn: The connection, in the transaction the snapshot is read in.
+        directory (str): The snapshot directory.
+        name (str): The name of the dataset, which is also the key of the row list in the document.
+        query (str): The query of the rows.
+
+    Returns:
+        dict: The `hash`, the number of `rows` and the size in `bytes` per encoding of the snapshot.
+    """
+    digest = hashlib.sha256()
+    temporaries = {}
+    for encoding in ENCODINGS:
+        descriptor, temporaries[encoding] = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        os.close(descriptor)
+    sizes = {"identity": 0}
+    rows = 0
+    try:
+        with open(temporaries["gzip"], "wb") as gzip_file, open(temporaries["br"], "wb") as brotli_file:
+            # mtime=0 keeps the gzip header, and so the file, the same for the same data
+            gzip_stream = gzip.GzipFile(fileobj=gzip_file, mode="wb", compresslevel=GZIP_LEVEL, mtime=0)
+            compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+            def write(chunk):
+                digest.update(chunk)
+                sizes["identity"] += len(chunk)
+                gzip_stream.write(chunk)
+                brotli_file.write(compressor.process(chunk))
+
+            write(b'{"' + name.encode() + b'":[')
+            with conn.cursor(name=f"snapshot_{name}") as cursor:
+                cursor.itersize = FETCH_SIZE
+                cursor.execute(query)
+                columns = None
+                while True:
+                    batch = cursor.fetchmany(FETCH_SIZE)
+                    if not batch:
+                        break
+                    if columns is None:
+                        columns = [column.name for column in cursor.description]
+                    encoded = b",".join(
+                        orjson.dumps(dict(zip(columns, row)), default=encode_default) for row in batch)
+                    write((b"," if rows else b"") + encoded)
+                    rows += len(batch)
+            write(b"]}")
+            gzip_stream.close()
+            brotli_file.write(compressor.finish())
+        content_hash = digest.hexdigest()[:HASH_LENGTH]
+        for encoding, temporary in temporaries.items():
+            sizes[encoding] = os.path.getsize(temporary)
+            # mkstemp creates files readable by the owner only
+            os.chmod(temporary, 0o644)
+            os.replace(temporary, snapshot_path(directory, name, content_hash, encoding))
+    finally:
+        for temporary in temporaries.values():
+            if os.path.exists(temporary):
+                os.remove(temporary)
+    return {"hash": content_hash, "rows": rows, "bytes": sizes}
+
+
+def mark_replaced(directory, name, snapshot):
+    """
+    Set the modification time of the files of a snapshot that is being replaced to now, so that
+    `remove_expired` keeps them for `SNAPSHOT_RETENTION_SECONDS` from now on instead of from when they were
+    built.
+
+    Returns:
+        None
+    """
+    for encoding in ENCODINGS:
+        try:
+            os.utime(snapshot_path(directory, name, snapshot["hash"], encoding))
+        except FileNotFoundError:
+            pass
+
+
+def remove_expired(directory, manifest):
+    """
+    Delete the files of replaced snapshots once they were replaced more than `SNAPSHOT_RETENTION_SECONDS`
+    ago, see `mark_replaced`, as well as temporary files left behind by interrupted builds.
+
+    Returns:
+        None
+    """
+    current = {os.path.basename(snapshot_path(directory, name, snapshot["hash"], encoding))
+               for name, snapshot in manifest.items() for encoding in ENCODINGS}
+    expired_before = time.time() - SNAPSHOT_RETENTION_SECONDS
+    for entry in os.scandir(directory):
+        if entry.name in current or entry.name == MANIFEST:
+            continue
+        if entry.name.endswith(".tmp") or entry.name.endswith(tuple(ENCODINGS.values())):
+            if entry.stat().st_mtime < expired_before:
+                os.remove(entry.path)
+
+
+def build(directory=SNAPSHOT_DIR, force=False):
+    """
+    Rebuild the snapshots whose tables changed since they were built.
+
+    All snapshots are read in one REPEATABLE READ transaction, so they are consistent with each other
+    and with the change counters recorded in the manifest.
+
+    Args:
+        directory (str): The snapshot directory, created if missing.
+        force (bool): Whether to rebuild the snapshots whose tables did not change as well.
+
+    Returns:
+        dict: The rebuilt snapshots by dataset name, see `read_manifest`.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = read_manifest(directory)
+    rebuilt = {}
+    with db_operations.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+            cursor.execute("SELECT table_name, version FROM table_versions")
+            versions = dict(cursor.fetchall())
+        for name, (tables, query) in DATASETS.items():
+            table_versions = {table: versions.get(table, 0) for table in tables}
+            current = manifest.get(name)
+            if (not force and current is not None and current["versions"] == table_versions
+                    and all(os.path.exists(snapshot_path(directory, name, current["hash"], encoding))
+                            for encoding in ENCODINGS)):
+                continue
+            started = time.perf_counter()
+            snapshot = write_snapshot(conn, directory, name, query)
+            snapshot["versions"] = table_versions
+            snapshot["built_at"] = datetime.now(timezone.utc).isoformat()
+            rebuilt[name] = snapshot
+            if current is not None and current["hash"] != snapshot["hash"]:
+                mark_replaced(directory, name, current)
+            print(f"Built snapshot {name}.{snapshot['hash']} of {snapshot['rows']} rows "
+                  f"in {time.perf_counter() - started:.2f} s")
+    if rebuilt:
+        manifest = {**manifest, **rebuilt}
+        replace_atomically(directory, os.path.join(directory, MANIFEST), orjson.dumps(manifest, option=orjson.OPT_INDENT_2))
+    remove_expired(directory, manifest)
+    return rebuilt
+
+
+if __name__ == "__main__":
+    build(force=sys.argv[1:] == ["--force"])
@@ -0,0 +1,40 @@
+from datetime import date, timedelta
+
+import grouping
+
+
+def article(article_id, day, latitude=None, longitude=None):
+    return (article_id, day, None, None, None, None, latitude, longitude)
+
+
+def test_date_windows_of_a_batch_with_a_backdated_article():
+    batch = [article(1, date(2024, 5, 1)), article(2, date(2024, 5, 3)), article(3, date(2019, 1, 10)),
+             article(4, None)]
+
+    assert grouping.date_windows(batch, window_days=3) == [
+        (date(2019, 1, 7), date(2019, 1, 13)),
+        (date(2024, 4, 28), date(2024, 5, 6)),
+    ]
+
+
+def test_date_windows_merge_touching_windows():
+    batch = [article(1, date(2024, 5, 1)), article(2, date(2024, 5, 8))]
+
+    assert grouping.date_windows(batch, window_days=3) == [(date(2024, 4, 28), date(2024, 5, 11))]
+    assert grouping.date_windows([article(1, None)]) == []
+
+
+def test_incidents_in_the_date_windows_match_like_all_incidents():
+    # One incident a day for five years, alternating between two places
+    first = date(2019, 1, 1)
+    incidents = [article(100000 + day, first + timedelta(days=day), *((36.0, 15.0) if day % 2 else (35.5, 12.6)))
+                 for day in range(5 * 365)]
+    batch = [article(1, date(2023, 12, 20), 36.0, 15.0), article(2, date(2023, 12, 21), 35.5, 12.6),
+             article(3, date(2023, 12, 22)), article(4, date(2019, 3, 2), 36.01, 15.01)]
+
+    windows = grouping.date_windows(batch)
+    fetched = [incident for incident in incidents if any(low <= incident[1] <= high for low, high in windows)]
+
+    assert len(fetched) < 20
+    assert grouping.match_articles_to_incidents(batch, fetched) == grouping.match_articles_to_incidents(batch, incidents)
+    assert 4 in grouping.match_articles_to_incidents(batch, fetched)[0]